@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+成交推送断线补数
+==============================================================
+websocket 断开重连期间的成交推送会丢失。TradeGapFiller 记录每个数据流
+最后收到的成交 id，发现缺口后在后台线程中按 id 从 REST 接口补齐缺失的
+成交，补数期间收到的实时推送先缓存，补完后再按顺序交给回调，下游看到
+的始终是按 id 递增、不重复的连续成交序列。
+
+缺口的判断：
+    contiguous=True   成交 id 连续（Binance trade / aggTrade），id 跳跃即为缺口
+    contiguous=False  成交 id 递增但不连续（Huobi），调用 reconnected() 后
+                      收到的第一条推送与上次最后一条之间视为缺口
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class TradeGapFiller:
+    """单个成交数据流的去重与补数"""
+
+    def __init__(self, callback, fetch, id_of, contiguous=True, name=None,
+                 max_pages=20, retries=3):
+        """
+        :param callback: 回调，按 id 顺序接收成交事件（与推送格式相同）
+        :param fetch: fetch(after_id)，返回 id 大于 after_id 的一页成交事件，按 id 升序，
+                      None 表示不补数只去重
+        :param id_of: 取事件 id 的函数
+        :param contiguous: 成交 id 是否连续
+        :param name: 名称，用于日志
+        :param max_pages: 一次补数最多请求的页数，超过后放弃剩余部分
+        :param retries: 单页请求失败的重试次数
+        """
+        self.callback = callback
+        self.fetch = fetch
+        self.id_of = id_of
+        self.contiguous = contiguous
+        self.name = name
+        self.max_pages = max_pages
+        self.retries = retries
+        self.last_id = None
+        self.backfilled = 0     # 补回的成交数
+        self.duplicates = 0     # 丢弃的重复成交数
+        self.unfilled = 0       # 未能补齐的缺口数
+        self._pending = None    # 补数期间缓存的实时推送
+        self._reconnected = False
+        self._lock = threading.Lock()
+
+    def reconnected(self):
+        """连接重新建立，下一条推送之前可能有缺口"""
+        self._reconnected = True
+
+    def on_event(self, event):
+        """收到一条实时成交推送"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(event)
+                return
+            if self.fetch is not None and self._has_gap(self.id_of(event)):
+                self._pending = deque([event])
+                threading.Thread(target=self._drain, daemon=True,
+                                 name='TradeGapFiller-%s' % (self.name or '')).start()
+                return
+        self._deliver(event)
+
+    def _has_gap(self, event_id):
+        last_id = self.last_id
+        if last_id is None:
+            return False
+        if self._reconnected:
+            self._reconnected = False
+            return event_id > last_id + 1 if self.contiguous else event_id > last_id
+        return self.contiguous and event_id > last_id + 1
+
+    def _deliver(self, event):
+        event_id = self.id_of(event)
+        if self.last_id is not None and event_id <= self.last_id:
+            self.duplicates += 1
+            return
+        self.last_id = event_id
+        self.callback(event)
+
+    def _drain(self):
+        """补齐缺口后按顺序处理缓存的推送，全部处理完后恢复直接回调"""
+        first = True
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._pending = None
+                    return
+                event = self._pending.popleft()
+            event_id = self.id_of(event)
+            if first or (self.contiguous and self.last_id is not None
+                         and event_id > self.last_id + 1):
+                self._fill(event_id)
+                first = False
+            self._deliver(event)
+
+    def _fill(self, before_id):
+        """补齐 last_id 与 before_id 之间的成交"""
+        for _ in range(self.max_pages):
+            page = self._fetch_page(self.last_id)
+            progress = False
+            for event in page or ():
+                if self.id_of(event) >= before_id:
+                    return
+                if self.id_of(event) > self.last_id:
+                    self._deliver(event)
+                    self.backfilled += 1
+                    progress = True
+            if not self.contiguous:
+                # 接口只能取最近的成交，没有翻页
+                return
+            if self.last_id + 1 >= before_id:
+                return
+            if not progress:
+                break
+        self.unfilled += 1
+        print('%s 成交补数未完成：%s 到 %s' % (self.name or '', self.last_id, before_id))
+
+    def _fetch_page(self, after_id):
+        for attempt in range(self.retries):
+            try:
+                return self.fetch(after_id)
+            except Exception as e:
+                print('%s 成交补数请求失败：%r' % (self.name or '', e))
+                time.sleep(0.5 * (attempt + 1))
+        return None
+
+    def to_dict(self):
+        return {"name": self.name, "last_id": self.last_id, "backfilled": self.backfilled,
+                "duplicates": self.duplicates, "unfilled": self.unfilled,
+                "pending": len(self._pending) if self._pending is not None else 0}
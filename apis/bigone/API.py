@@ -3,10 +3,11 @@
 import requests
 import json
 import time
-import hmac
-import hashlib
 from retrying import retry
 
+from ..signing import HmacSigner, canonical_keys
+from ..metrics import record_request, endpoint_of
+
 
 BASE_URL = 'https://api.big.one/'
 
@@ -103,11 +104,23 @@ class BigoneClient:
             url = "%s%s?%s&signature=%s" % (BASE_URL, path, query, signature)
         else:
             url = "%s%s?" % (BASE_URL, path)
-        resp = requests.get(url, timeout=10)
+        t0 = time.perf_counter()
+        try:
+            resp = requests.get(url, timeout=10)
+        except Exception:
+            record_request('BigOne', endpoint_of(path), (time.perf_counter() - t0) * 1000, 'error')
+            raise
+        t1 = time.perf_counter()
         data = resp.text
 
-        if len(data):
-            return json.loads(data)
+        result = json.loads(data) if len(data) else None
+        t2 = time.perf_counter()
+        server = resp.elapsed.total_seconds() * 1000
+        record_request('BigOne', endpoint_of(path), (t2 - t0) * 1000,
+                       'ok' if resp.status_code == 200 else 'error',
+                       server=server, read=max((t1 - t0) * 1000 - server, 0.0),
+                       parse=(t2 - t1) * 1000)
+        return result
 
     def post(self, name, params=None):
         verb = "POST"
@@ -129,31 +142,23 @@ class Auth:
     def __init__(self, access_key, secret_key):
         self.access_key = access_key
         self.secret_key = secret_key
+        self._signer = HmacSigner(secret_key)
 
     def urlencode(self, params):
-        keys = params.keys()
-        keys = sorted(keys)
-        query = ''
-        for key in keys:
+        items = []
+        for key in canonical_keys(params):
             value = params[key]
             if key != "orders":
-                query = "%s&%s=%s" % (query, key, value) if len(query) else "%s=%s" % (key, value)
+                items.append(key + '=' + str(value))
             else:
-                d = {key: params[key]}
                 for v in value:
-                    ks = v.keys()
-                    ks = sorted(ks)
-                    for k in ks:
-                        item = "orders[][%s]=%s" % (k, v[k])
-                        query = "%s&%s" % (query, item) if len(query) else "%s" % item
-        return query
+                    for k in canonical_keys(v):
+                        items.append('orders[][' + k + ']=' + str(v[k]))
+        return '&'.join(items)
 
     def sign(self, verb, path, params=None):
         query = self.urlencode(params)
-        msg = ("|".join([verb, path, query])).encode('utf-8')
-        signature = hmac.new(self.secret_key.encode('utf-8'), msg=msg, digestmod=hashlib.sha256).hexdigest()
-
-        return signature
+        return self._signer.hexdigest("|".join([verb, path, query]))
 
     def sign_params(self, verb, path, params=None):
         if not params:
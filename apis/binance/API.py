@@ -3,11 +3,11 @@
 @author zengbin
 创建日期：2018-01-06
 """
-import hashlib
-import hmac
 import requests
 import time
-from operator import itemgetter
+from ..signing import HmacSigner, canonical_keys, encode_params
+from ..timesync import TimeSync
+from ..metrics import record_request, endpoint_of
 from .exceptions import BinanceAPIException, BinanceRequestException, BinanceWithdrawException
 
 
@@ -77,11 +77,19 @@ class BinanceAPI(object):
         self.name = "Binance"
         self.API_KEY = api_key
         self.API_SECRET = api_secret
+        self._signer = HmacSigner(api_secret) if api_secret else None
         self.session = self._init_session()
+        self.time_sync = TimeSync(lambda: self.get_server_time()['serverTime'],
+                                  name=self.name)
 
         # init DNS and SSL cert
         self.ping()
 
+        # signed requests are stamped with the server time offset, kept up to date in background;
+        # keyless clients start it once a socket manager needs it for feed latency
+        if api_key and api_secret:
+            self.time_sync.start()
+
     def _init_session(self):
 
         session = requests.session()
@@ -102,10 +110,8 @@ class BinanceAPI(object):
 
     def _generate_signature(self, data):
 
-        ordered_data = self._order_params(data)
-        query_string = '&'.join(["{}={}".format(d[0], d[1]) for d in ordered_data])
-        m = hmac.new(self.API_SECRET.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256)
-        return m.hexdigest()
+        query_string = encode_params(data, canonical_keys(data))
+        return self._signer.hexdigest(query_string)
 
     def _order_params(self, data):
         """Convert params to list with signature as last element
@@ -114,16 +120,9 @@ class BinanceAPI(object):
         :return:
 
         """
-        has_signature = False
-        params = []
-        for key, value in data.items():
-            if key == 'signature':
-                has_signature = True
-            else:
-                params.append((key, value))
-        # sort parameters by key
-        params.sort(key=itemgetter(0))
-        if has_signature:
+        # sort parameters by key, the sorted key order is cached per key set
+        params = [(key, data[key]) for key in canonical_keys(data) if key != 'signature']
+        if 'signature' in data:
             params.append(('signature', data['signature']))
         return params
 
@@ -134,7 +133,7 @@ class BinanceAPI(object):
             kwargs['data'] = data
         if signed:
             # generate signature
-            kwargs['data']['timestamp'] = int(time.time() * 1000)
+            kwargs['data']['timestamp'] = self.time_sync.now_ms()
             kwargs['data']['signature'] = self._generate_signature(kwargs['data'])
 
         # sort get and post params to match signature order
@@ -147,8 +146,24 @@ class BinanceAPI(object):
             kwargs['params'] = kwargs['data']
             del(kwargs['data'])
 
-        response = getattr(self.session, method)(uri, timeout=10, **kwargs)
-        return self._handle_response(response)
+        t0 = time.perf_counter()
+        response = None
+        result = 'error'
+        try:
+            response = getattr(self.session, method)(uri, timeout=10, **kwargs)
+            t1 = time.perf_counter()
+            data = self._handle_response(response)
+            result = 'ok'
+            return data
+        finally:
+            t2 = time.perf_counter()
+            if response is None:
+                record_request(self.name, endpoint_of(uri), (t2 - t0) * 1000, result)
+            else:
+                server = response.elapsed.total_seconds() * 1000
+                record_request(self.name, endpoint_of(uri), (t2 - t0) * 1000, result,
+                               server=server, read=max((t1 - t0) * 1000 - server, 0.0),
+                               parse=(t2 - t1) * 1000)
 
     def _request_api(self, method, path, signed=False, version=PUBLIC_API_VERSION, **kwargs):
         uri = self._create_api_uri(path, signed, version)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from operator import itemgetter
+import threading
 import time
 
 from .websockets import BinanceSocketManager
@@ -26,9 +27,12 @@ class DepthCache(object):
         :return:
 
         """
-        self._bids[bid[0]] = float(bid[1])
-        if bid[1] == "0.00000000":
-            del self._bids[bid[0]]
+        quantity = float(bid[1])
+        if quantity:
+            self._bids[bid[0]] = quantity
+        else:
+            # 数量为 0 表示删除该价位，不依赖 "0.00000000" 这一种写法
+            self._bids.pop(bid[0], None)
 
     def add_ask(self, ask):
         """Add an ask to the cache
@@ -37,9 +41,20 @@ class DepthCache(object):
         :return:
 
         """
-        self._asks[ask[0]] = float(ask[1])
-        if ask[1] == "0.00000000":
-            del self._asks[ask[0]]
+        quantity = float(ask[1])
+        if quantity:
+            self._asks[ask[0]] = quantity
+        else:
+            self._asks.pop(ask[0], None)
+
+    def clear(self):
+        """Remove all bids and asks
+
+        :return:
+
+        """
+        self._bids.clear()
+        self._asks.clear()
 
     def get_bids(self):
         """Get the current bids
@@ -107,22 +122,53 @@ class DepthCache(object):
         """
         return DepthCache.sort_depth(self._asks, reverse=False)
 
+    def get_best_bid(self):
+        """Get the highest bid without sorting the whole book
+
+        :return: [price, quantity] as floats, None if there are no bids
+
+        """
+        if not self._bids:
+            return None
+        price = max(self._bids, key=float)
+        return [float(price), self._bids[price]]
+
+    def get_best_ask(self):
+        """Get the lowest ask without sorting the whole book
+
+        :return: [price, quantity] as floats, None if there are no asks
+
+        """
+        if not self._asks:
+            return None
+        price = min(self._asks, key=float)
+        return [float(price), self._asks[price]]
+
     @staticmethod
     def sort_depth(vals, reverse=False):
         """Sort bids or asks by price
         """
         lst = [[float(price), quantity] for price, quantity in vals.items()]
-        lst = sorted(lst, key=itemgetter(0), reverse=reverse)
+        lst.sort(key=itemgetter(0), reverse=reverse)
         return lst
 
 
 class DepthCacheManager(object):
 
     _default_refresh = 60 * 30  # 30 minutes
+    _resync_attempts = 5  # snapshots fetched per resync while the REST book lags the stream
+    _resync_delay = 0.5  # seconds between those snapshots
+    _resync_backoff = 30  # seconds to wait after a resync gave up before trying again
+    _max_buffer = 10000  # depth events kept while waiting for a snapshot
 
     def __init__(self, client, symbol, callback=None, refresh_interval=_default_refresh):
         """Initialise the DepthCacheManager
 
+        The first snapshot is fetched on the calling thread. Later resyncs (after a
+        gap or every refresh_interval) fetch the snapshot on a background thread and
+        buffer depth events meanwhile, so the socket callback, which runs on the
+        shared dispatcher, never waits on REST.
+
         :param client: Binance API client
         :type client: binance.Client
         :param symbol: Symbol to create depth cache for
@@ -141,19 +187,79 @@ class DepthCacheManager(object):
         self._bm = None
         self._depth_cache = DepthCache(self._symbol)
         self._refresh_interval = refresh_interval
+        self._refresh_time = None
+        # the socket callback and the snapshot thread share the state below
+        self._lock = threading.RLock()
+        self._fetching = True   # buffer events until the first snapshot below
+        self._retry_at = 0
 
         self._start_socket()
-        self._init_cache()
+        self._fetch_snapshot()
 
-    def _init_cache(self):
-        """Initialise the depth cache calling REST endpoint
+    def _init_cache(self, pending=()):
+        """Drop the cache and fetch a new snapshot on a background thread
 
+        Depth events are buffered until the snapshot is applied.
+
+        :param pending: events to buffer right away, i.e. the event that revealed a gap
         :return:
         """
-        self._last_update_id = None
-        self._depth_message_buffer = []
+        with self._lock:
+            self._last_update_id = None
+            self._depth_message_buffer = list(pending)
+            self._start_fetch()
+
+    def _start_fetch(self):
+        if self._fetching:
+            return
+        self._fetching = True
+        threading.Thread(target=self._fetch_snapshot, daemon=True,
+                         name='DepthCacheManager ' + self._symbol).start()
+
+    def _fetch_snapshot(self):
+        """Fetch REST snapshots until one reaches the buffered events
+
+        The REST book can lag behind the stream; a snapshot older than the first
+        buffered event would leave a hole in the book, so it is fetched again, at
+        most _resync_attempts times. After that the next resync waits for
+        _resync_backoff seconds, events stay buffered meanwhile.
+
+        :return:
+        """
+        try:
+            for attempt in range(self._resync_attempts):
+                if attempt:
+                    time.sleep(self._resync_delay)
+                try:
+                    res = self._client.get_order_book(symbol=self._symbol, limit=500)
+                except Exception as e:
+                    print('Binance %s depth snapshot failed: %r' % (self._symbol, e))
+                    continue
+                with self._lock:
+                    if self._apply_snapshot(res):
+                        return
+            print('Binance %s depth snapshot still behind the stream after %d attempts' % (
+                self._symbol, self._resync_attempts))
+            self._retry_at = time.time() + self._resync_backoff
+        finally:
+            with self._lock:
+                self._fetching = False
+
+    def _apply_snapshot(self, res):
+        """Rebuild the cache from a snapshot and apply the buffered events
+
+        :returns: False if the snapshot is older than the buffered events or a gap
+            was found while applying them, the events are buffered again
+        """
+        last_update_id = res['lastUpdateId']
+        # ignore any updates before the snapshot
+        buffer = [msg for msg in self._depth_message_buffer if msg['u'] > last_update_id]
+        if buffer and buffer[0]['U'] > last_update_id + 1:
+            # the snapshot lags behind the stream
+            return False
 
-        res = self._client.get_order_book(symbol=self._symbol, limit=500)
+        # drop levels from the previous snapshot, they may no longer exist
+        self._depth_cache.clear()
 
         # process bid and asks from the order book
         for bid in res['bids']:
@@ -162,18 +268,20 @@ class DepthCacheManager(object):
             self._depth_cache.add_ask(ask)
 
         # set first update id
-        self._last_update_id = res['lastUpdateId']
+        self._last_update_id = last_update_id
+        self._depth_message_buffer = []
 
         # set a time to refresh the depth cache
         if self._refresh_interval:
             self._refresh_time = int(time.time()) + self._refresh_interval
 
         # Apply any updates from the websocket
-        for msg in self._depth_message_buffer:
-            self._process_depth_message(msg, buffer=True)
-
-        # clear the depth buffer
-        del self._depth_message_buffer
+        for i, msg in enumerate(buffer):
+            if not self._process_depth_message(msg):
+                # a gap inside the buffer, keep the rest for the next snapshot
+                self._depth_message_buffer.extend(buffer[i + 1:])
+                return False
+        return True
 
     def _start_socket(self):
         """Start the depth cache socket
@@ -197,28 +305,33 @@ class DepthCacheManager(object):
         :return:
 
         """
-
-        if self._last_update_id is None:
-            # Initial depth snapshot fetch not yet performed, buffer messages
-            self._depth_message_buffer.append(msg)
-        else:
-            self._process_depth_message(msg)
-
-    def _process_depth_message(self, msg, buffer=False):
+        with self._lock:
+            if self._last_update_id is None:
+                # snapshot not applied yet, buffer messages
+                buffer = self._depth_message_buffer
+                buffer.append(msg)
+                del buffer[:-self._max_buffer]
+                if not self._fetching and time.time() >= self._retry_at:
+                    self._start_fetch()
+            else:
+                self._process_depth_message(msg)
+
+    def _process_depth_message(self, msg):
         """Process a depth event message.
 
         :param msg: Depth event message.
-        :return:
+        :returns: False if updates were missed, the event is buffered for the resync
 
         """
 
-        if buffer and msg['u'] <= self._last_update_id:
-            # ignore any updates before the initial update id
-            return
-        elif msg['U'] != self._last_update_id + 1:
-            # if not buffered check we get sequential updates
-            # otherwise init cache again
-            self._init_cache()
+        if msg['u'] <= self._last_update_id:
+            # ignore any updates before the initial update id and duplicates
+            return True
+        elif msg['U'] > self._last_update_id + 1:
+            # updates were missed, never apply this event on top of the hole:
+            # buffer it and resync, the new snapshot usually already contains it
+            self._init_cache([msg])
+            return False
 
         # add any bid or ask values
         for bid in msg['b']:
@@ -235,6 +348,7 @@ class DepthCacheManager(object):
         # after processing event see if we need to refresh the depth cache
         if self._refresh_interval and int(time.time()) > self._refresh_time:
             self._init_cache()
+        return True
 
     def get_depth_cache(self):
         """Get the current depth cache
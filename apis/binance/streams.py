@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import itertools
+import json
+import math
+import threading
+
+from .websockets import BinanceSocketManager
+from ...concurrency import RateLimiter
+
+
+class _Shard(object):
+    """One combined stream connection and the streams assigned to it"""
+
+    def __init__(self, router, index):
+        self.router = router
+        self.name = 'shard-%d' % index
+        self.streams = set()
+        self.conn = None
+        # Binance accepts at most 5 incoming messages per second per connection
+        self.limiter = RateLimiter(router.MESSAGES_PER_SECOND)
+
+    def url_streams(self):
+        """Streams that fit into the connection url, the rest are subscribed after connecting"""
+        names, length = [], 0
+        for name in sorted(self.streams):
+            length += len(name) + 1
+            if length > self.router.max_url_length and names:
+                break
+            names.append(name)
+        return names
+
+    def url(self):
+        return self.router.STREAM_URL + 'stream?streams=' + '/'.join(self.url_streams())
+
+    def streams_in(self, url):
+        return set(url.split('streams=', 1)[1].split('/')) if url and 'streams=' in url else set()
+
+
+class StreamRouter(object):
+    """Subscribe to any number of Binance streams over sharded combined connections
+
+    Binance limits a combined connection to 1024 streams and 5 incoming
+    messages per second, and a very long url is rejected. The router packs
+    subscriptions into shards of at most ``streams_per_connection`` streams,
+    each shard being one connection on the shared websocket engine:
+
+    * streams that fit into ``max_url_length`` are put in the connection url,
+      the rest are added with a SUBSCRIBE message once connected
+    * ``subscribe`` fills the least loaded shard that has room and opens new
+      shards as needed, ``unsubscribe`` closes empty shards and merges shards
+      when fewer connections would do
+    * each shard reconnects on its own and re-subscribes its current streams,
+      a disconnect only affects the streams of that shard
+
+    .. code-block:: python
+
+        router = StreamRouter(client)
+        router.subscribe(['{}@depth'.format(s.lower()) for s in symbols], on_depth)
+        router.subscribe(['{}@trade'.format(s.lower()) for s in symbols], on_trade)
+        ...
+        router.unsubscribe(['ethbtc@trade'])
+        router.close()
+
+    Callbacks receive the unwrapped event, as with single stream sockets.
+    """
+
+    STREAM_URL = BinanceSocketManager.STREAM_URL
+
+    MAX_STREAMS_PER_CONNECTION = 1024
+    MESSAGES_PER_SECOND = 4
+    # seconds to wait for the SUBSCRIBE ack of moved streams before closing the old shard
+    MOVE_TIMEOUT = 10
+
+    def __init__(self, client=None, streams_per_connection=200, max_url_length=2000, engine=None,
+                 dispatcher=None):
+        """Initialise the StreamRouter
+
+        :param client: Binance API client, its time offset is used for feed latency
+        :type client: binance.Client
+        :param streams_per_connection: Maximum streams per shard, at most 1024
+        :type streams_per_connection: int
+        :param max_url_length: Maximum length of the stream list in a connection url
+        :type max_url_length: int
+        :param engine: Optional WebSocketEngine, defaults to the shared engine
+        :param dispatcher: Optional Dispatcher, see BinanceSocketManager
+
+        """
+        self.streams_per_connection = min(streams_per_connection, self.MAX_STREAMS_PER_CONNECTION)
+        self.max_url_length = max_url_length
+        self._manager = BinanceSocketManager(client, engine=engine, dispatcher=dispatcher)
+        self.latency = self._manager.latency
+        self._callbacks = {}
+        self._shard_of = {}
+        self._shards = []
+        self._index = itertools.count()
+        self._request_id = itertools.count(1)
+        self._lock = threading.RLock()
+        # streams being moved by rebalance -> the shard they are leaving
+        self._moving = {}
+        # SUBSCRIBE request id -> shard to close once every move request is acked
+        self._acks = {}
+
+    @property
+    def streams(self):
+        return list(self._callbacks)
+
+    def subscribe(self, streams, callback, with_stream=False):
+        """Subscribe to streams
+
+        :param streams: stream names in lower case, i.e. bnbbtc@aggTrade, neobtc@ticker
+        :type streams: list
+        :param callback: callback function to handle events of these streams
+        :type callback: function
+        :param with_stream: call ``callback(stream, event)`` instead of ``callback(event)``,
+            for events that do not carry their symbol such as partial book depth
+        :type with_stream: bool
+
+        :returns: list of streams that were not subscribed before
+        """
+        added, sends = {}, []
+        with self._lock:
+            for name in streams:
+                if name not in self._callbacks:
+                    shard = self._shard_with_room()
+                    shard.streams.add(name)
+                    self._shard_of[name] = shard
+                    added.setdefault(shard, []).append(name)
+                else:
+                    self._manager._unqueue(name)
+                self._callbacks[name] = self._manager._queued(
+                    name, functools.partial(callback, name) if with_stream else callback)
+            for shard, names in added.items():
+                self._update(shard, names, [], sends)
+        self._flush(sends)
+        return [name for names in added.values() for name in names]
+
+    def unsubscribe(self, streams):
+        """Unsubscribe from streams, empty shards are closed and sparse shards merged
+
+        :param streams: stream names
+        :type streams: list
+
+        """
+        removed, sends = {}, []
+        with self._lock:
+            for name in streams:
+                self._callbacks.pop(name, None)
+                self._moving.pop(name, None)
+                self._manager._unqueue(name)
+                shard = self._shard_of.pop(name, None)
+                if shard is not None:
+                    shard.streams.discard(name)
+                    removed.setdefault(shard, []).append(name)
+            for shard, names in removed.items():
+                if shard.streams:
+                    self._update(shard, [], names, sends)
+                else:
+                    self._close_shard(shard)
+        self._flush(sends)
+        self.rebalance()
+
+    def rebalance(self):
+        """Merge the least loaded shards into the others while fewer connections would do
+
+        Streams are subscribed on their new shard before the old connection is
+        closed, so no updates are missed while moving. Until the new shard acks
+        the SUBSCRIBE, events of a moved stream are taken from the old shard
+        only, afterwards from the new shard only, so none are delivered twice.
+        """
+        while True:
+            with self._lock:
+                source, sends = self._merge_one()
+                if source is None:
+                    return
+                ids = [next(self._request_id) for _ in sends]
+                for request_id in ids:
+                    self._acks[request_id] = source
+            if not ids:
+                # no target is connected yet, they subscribe in _on_open
+                self._finish_move(source)
+                continue
+            # subscribe on the new shards first, the old connection is dropped on the acks
+            for (shard, method, params), request_id in zip(sends, ids):
+                self._send(shard, method, params, request_id=request_id)
+            timer = threading.Timer(self.MOVE_TIMEOUT, self._finish_move, (source,))
+            timer.daemon = True
+            timer.start()
+
+    def _finish_move(self, source):
+        """Hand the moved streams over to their new shards and close the old one"""
+        with self._lock:
+            for request_id in [i for i, s in self._acks.items() if s is source]:
+                del self._acks[request_id]
+            for name in [n for n, s in self._moving.items() if s is source]:
+                del self._moving[name]
+        self._close_shard(source)
+
+    def _on_ack(self, request_id):
+        with self._lock:
+            source = self._acks.pop(request_id, None)
+            if source is None or source in self._acks.values():
+                return
+        self._finish_move(source)
+
+    def _merge_one(self):
+        """Move the streams of the least loaded shard into the others
+
+        :returns: (source shard or None, pending messages)
+        """
+        needed = math.ceil(len(self._shard_of) / float(self.streams_per_connection))
+        if len(self._shards) <= max(needed, 1):
+            return None, []
+        source = min(self._shards, key=lambda s: len(s.streams))
+        targets = [s for s in self._shards if s is not source]
+        room = sum(self.streams_per_connection - len(s.streams) for s in targets)
+        if room < len(source.streams):
+            return None, []
+        moved = {}
+        for name in sorted(source.streams):
+            target = max((s for s in targets if len(s.streams) < self.streams_per_connection),
+                         key=lambda s: len(s.streams))
+            target.streams.add(name)
+            self._shard_of[name] = target
+            self._moving[name] = source
+            moved.setdefault(target, []).append(name)
+        sends = []
+        for target, names in moved.items():
+            self._update(target, names, [], sends)
+        source.streams.clear()
+        self._shards.remove(source)
+        return source, sends
+
+    def close(self):
+        """Close all shards"""
+        with self._lock:
+            for shard in list(self._shards):
+                self._close_shard(shard)
+            for name in self._callbacks:
+                self._manager._unqueue(name)
+            self._callbacks = {}
+            self._shard_of = {}
+            sources = set(self._acks.values())
+            self._acks = {}
+            self._moving = {}
+            for source in sources:
+                self._close_shard(source)
+
+    def stats(self):
+        """Per shard state
+
+        :returns: list of dicts with name, streams, connected, connects and messages
+        """
+        with self._lock:
+            return [{"name": shard.name,
+                     "streams": len(shard.streams),
+                     "connected": bool(shard.conn and shard.conn.connected),
+                     "connects": shard.conn.connects if shard.conn else 0,
+                     "messages": shard.conn.messages if shard.conn else 0}
+                    for shard in self._shards]
+
+    def _shard_with_room(self):
+        open_shards = [s for s in self._shards if len(s.streams) < self.streams_per_connection]
+        if open_shards:
+            return min(open_shards, key=lambda s: len(s.streams))
+        shard = _Shard(self, next(self._index))
+        self._shards.append(shard)
+        return shard
+
+    def _update(self, shard, added, removed, sends):
+        """Apply a change of the shard's streams to its connection
+
+        SUBSCRIBE / UNSUBSCRIBE messages are appended to sends and sent by
+        _flush once the lock is released, since sending may wait for the rate limit.
+        """
+        if shard.conn is None:
+            shard.conn = self._manager._engine.connect(
+                shard.url(), self._manager._message_handler(shard.name,
+                                                            functools.partial(self._dispatch, shard)),
+                on_open=lambda conn, shard=shard: self._on_open(shard, conn),
+                name='Binance ' + shard.name)
+            return
+        # used by the next reconnect
+        shard.conn.url = shard.url()
+        if shard.conn.connected:
+            if added:
+                sends.append((shard, 'SUBSCRIBE', added))
+            if removed:
+                sends.append((shard, 'UNSUBSCRIBE', removed))
+
+    def _flush(self, sends):
+        for shard, method, params in sends:
+            self._send(shard, method, params)
+
+    def _on_open(self, shard, conn):
+        """Bring a (re)connected shard in line with its current streams"""
+        with self._lock:
+            in_url = shard.streams_in(conn.connected_url)
+            missing = sorted(shard.streams - in_url)
+            extra = sorted(in_url - shard.streams)
+        # called on the engine thread, these two messages are within the rate limit
+        if missing:
+            self._send(shard, 'SUBSCRIBE', missing, wait=False)
+        if extra:
+            self._send(shard, 'UNSUBSCRIBE', extra, wait=False)
+
+    def _send(self, shard, method, params, wait=True, request_id=None):
+        conn = shard.conn
+        if conn is None:
+            return
+        if wait:
+            shard.limiter.acquire()
+        if request_id is None:
+            request_id = next(self._request_id)
+        conn.send(json.dumps({"method": method, "params": params, "id": request_id}))
+
+    def _close_shard(self, shard):
+        if shard.conn is not None:
+            shard.conn.close()
+            shard.conn = None
+        if shard in self._shards:
+            self._shards.remove(shard)
+
+    def _dispatch(self, shard, msg, received):
+        stream = msg.get('stream') if isinstance(msg, dict) else None
+        if stream is None:
+            # SUBSCRIBE / UNSUBSCRIBE responses
+            if isinstance(msg, dict):
+                if msg.get('error'):
+                    print('Binance stream router: %s' % msg['error'])
+                if 'id' in msg:
+                    self._on_ack(msg['id'])
+            return
+        # while a stream is moving only its old shard delivers, afterwards only
+        # the shard it belongs to; events from the other connection are duplicates
+        if self._moving.get(stream, self._shard_of.get(stream)) is not shard:
+            return
+        callback = self._callbacks.get(stream)
+        if callback is not None:
+            callback(msg['data'], received)
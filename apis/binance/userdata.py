@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from .websockets import BinanceSocketManager
+from ...order_index import OrderIndex
+
+
+class UserDataCache(object):
+
+    def __init__(self, client, callback=None, max_terminal=1000):
+        """Keep a local, always-current copy of open orders and balances
+
+        Orders and balances are seeded from REST and then kept up to date from the
+        user data stream (executionReport, outboundAccountInfo and
+        outboundAccountPosition events). Orders are stored in the same shape as the
+        REST order endpoints return. After every reconnect of the user data socket
+        the cache is reconciled from REST again, since events sent while the socket
+        was down are not replayed.
+
+        :param client: Binance API client
+        :type client: BinanceAPI
+        :param callback: Optional function called with every user data event after it is applied
+        :type callback: function
+        :param max_terminal: Number of filled / canceled orders to keep
+        :type max_terminal: int
+
+        """
+        self._client = client
+        self._callback = callback
+        self._bm = None
+        self._orders = OrderIndex(max_terminal=max_terminal)
+        self._balances = {}
+        # asset -> time of the update the balance comes from, in ms
+        self._balance_time = {}
+        self._lock = threading.Lock()
+        self._opened = False
+        self._reconcile_thread = None
+
+    def start(self):
+        """Start the user data socket and seed the cache from REST
+
+        :return:
+        """
+        self._bm = BinanceSocketManager(self._client)
+        self._bm.start_user_socket(self._user_event, on_open=self._on_open)
+        self._bm.start()
+        self.reconcile()
+
+    def _on_open(self, conn):
+        """Reconcile from REST after a reconnect or a new listen key
+
+        Called on the websocket engine thread, so the REST calls run on their own thread.
+        """
+        opened, self._opened = self._opened, True
+        if not opened and conn.connects <= 1:
+            # first connection, start() reconciles
+            return
+        # a reconcile still running may have read REST before the disconnect, always run
+        # a new one; updates are ordered by time so overlapping runs are harmless
+        self._reconcile_thread = threading.Thread(target=self._safe_reconcile, daemon=True,
+                                                  name='UserDataCache reconcile')
+        self._reconcile_thread.start()
+
+    def _safe_reconcile(self):
+        try:
+            self.reconcile()
+        except Exception as e:
+            print('Binance user data reconcile failed: %r' % e)
+
+    def reconcile(self):
+        """Refresh open orders and balances from REST
+
+        Stream updates newer than the REST response are kept. Orders the cache
+        still considers open but REST no longer lists are queried individually.
+
+        :return:
+        """
+        open_orders = self._client.get_open_orders()
+        for order in open_orders:
+            self._apply_order(order, self._rest_time(order), rest=True)
+        listed = set(order['orderId'] for order in open_orders)
+        for record in self._orders.open_orders():
+            if record['id'] not in listed:
+                order = self._client.get_order(symbol=record['symbol'], orderId=record['id'])
+                self._apply_order(order, self._rest_time(order), rest=True)
+        account = self._client.get_account()
+        account_time = account.get('updateTime', 0)
+        with self._lock:
+            for b in account['balances']:
+                if self._balance_time.get(b['asset'], 0) >= account_time:
+                    # a stream update is at least as new as the REST account
+                    continue
+                self._set_balance(b['asset'], b['free'], b['locked'], account_time)
+
+    @staticmethod
+    def _rest_time(order):
+        # updateTime is the last change, time is only when the order was created
+        return order.get('updateTime', order.get('time', 0))
+
+    def _apply_order(self, order, event_time, rest=False):
+        """Store an order unless the cache already holds a newer version
+
+        The check and the update are done under the lock: REST reconciliation and
+        stream events run on different threads, a REST snapshot read before a
+        stream event must not overwrite it afterwards.
+
+        :param event_time: event time (stream) or updateTime (REST) in ms
+        :param rest: the order comes from REST, it only replaces strictly older records
+        """
+        with self._lock:
+            current = self._orders.get(order['orderId'])
+            if current is not None and (current['time'] > event_time or
+                                        (rest and current['time'] == event_time)):
+                return
+            self._orders.update(order['orderId'],
+                                symbol=order['symbol'],
+                                side=order['side'],
+                                state=order['status'],
+                                time=event_time,
+                                order=order)
+
+    def _set_balance(self, asset, free, locked, update_time):
+        self._balances[asset] = {'asset': asset, 'free': free, 'locked': locked}
+        self._balance_time[asset] = update_time
+
+    def _user_event(self, msg):
+        """Handle a user data stream event
+
+        :param msg:
+        :return:
+
+        """
+        event = msg.get('e')
+        if event == 'executionReport':
+            order = {
+                'symbol': msg['s'],
+                'orderId': msg['i'],
+                'clientOrderId': msg['c'],
+                'price': msg['p'],
+                'origQty': msg['q'],
+                'executedQty': msg['z'],
+                'status': msg['X'],
+                'timeInForce': msg['f'],
+                'type': msg['o'],
+                'side': msg['S'],
+                'stopPrice': msg['P'],
+                'time': msg['O'] if 'O' in msg else msg['T'],
+                'updateTime': msg['T'],
+            }
+            self._apply_order(order, msg['E'])
+        elif event in ('outboundAccountInfo', 'outboundAccountPosition'):
+            update_time = msg.get('u', msg['E'])
+            with self._lock:
+                for b in msg['B']:
+                    self._set_balance(b['a'], b['f'], b['l'], update_time)
+
+        if self._callback:
+            self._callback(msg)
+
+    def get_order(self, order_id):
+        """Get an order in REST format, None if it is not in the cache
+
+        :param order_id: The unique order id
+        :type order_id: int
+
+        """
+        record = self._orders.get(order_id)
+        return None if record is None else record['order']
+
+    def get_open_orders(self, symbol=None):
+        """Get open orders in REST format
+
+        :param symbol: optional
+        :type symbol: str
+
+        """
+        return [r['order'] for r in self._orders.open_orders(symbol)]
+
+    def get_account(self):
+        """Get balances in the same shape as BinanceAPI.get_account
+
+        .. code-block:: python
+
+            {
+                "balances": [
+                    {
+                        "asset": "BTC",
+                        "free": "4723846.89208129",
+                        "locked": "0.00000000"
+                    }
+                ]
+            }
+
+        """
+        with self._lock:
+            balances = [dict(b) for b in self._balances.values()]
+        return {'balances': balances}
+
+    def close(self):
+        """Close the user data socket
+
+        :return:
+        """
+        if self._bm is not None:
+            self._bm.close()
+            self._bm = None
@@ -2,52 +2,18 @@
 
 import json
 import threading
+import time
+from operator import itemgetter
 
-from autobahn.twisted.websocket import WebSocketClientFactory, \
-    WebSocketClientProtocol, \
-    connectWS
-from twisted.internet import reactor, ssl
-from twisted.internet.protocol import ReconnectingClientFactory
-from twisted.internet.error import ReactorAlreadyRunning
+from .enums import KLINE_INTERVAL_1MINUTE
+from ..metrics import record_message
+from ..feed_latency import FeedLatency
+from ..wsengine import shared_engine
+from ..backfill import TradeGapFiller
+from ..dispatch import shared_dispatcher, DROP_OLDEST, CONFLATE, KEEP_ALL
 
-# from APIs.binance.client import Client
 
-
-class BinanceClientProtocol(WebSocketClientProtocol):
-    def onConnect(self, response):
-        # reset the delay after reconnecting
-        self.factory.resetDelay()
-
-    def onMessage(self, payload, isBinary):
-        if not isBinary:
-            try:
-                payload_obj = json.loads(payload.decode('utf8'))
-            except ValueError:
-                pass
-            else:
-                self.factory.callback(payload_obj)
-
-
-class BinanceReconnectingClientFactory(ReconnectingClientFactory):
-    # set initial delay to a short time
-    initialDelay = 0.1
-
-    maxDelay = 10
-
-    maxRetries = 5
-
-
-class BinanceClientFactory(WebSocketClientFactory, BinanceReconnectingClientFactory):
-    protocol = BinanceClientProtocol
-
-    def clientConnectionFailed(self, connector, reason):
-        self.retry(connector)
-
-    def clientConnectionLost(self, connector, reason):
-        self.retry(connector)
-
-
-class BinanceSocketManager(threading.Thread):
+class BinanceSocketManager(object):
     STREAM_URL = 'wss://stream.binance.com:9443/'
 
     WEBSOCKET_DEPTH_5 = '5'
@@ -56,34 +22,122 @@ class BinanceSocketManager(threading.Thread):
 
     _user_timeout = 30 * 60  # 30 minutes
 
-    def __init__(self, client):
+    def __init__(self, client, engine=None, dispatcher=None):
         """Initialise the BinanceSocketManager
 
+        Connections run on a websocket engine shared by every manager in the
+        process, so creating a manager per symbol does not add threads.
+
+        Callbacks are not called on the network thread. Each socket gets a
+        bounded queue on the dispatcher, so a slow callback never stalls
+        socket reads. Ticker, kline and partial book streams keep only the
+        latest message, the user data stream is never dropped, other streams
+        drop the oldest message when full.
+
         :param client: Binance API client
         :type client: binance.Client
+        :param engine: Optional WebSocketEngine, defaults to the shared engine
+        :type engine: WebSocketEngine
+        :param dispatcher: Optional Dispatcher, defaults to the shared dispatcher (one worker thread),
+            pass False to call callbacks directly on the network thread
+        :type dispatcher: Dispatcher
 
         """
-        threading.Thread.__init__(self)
+        self._engine = engine or shared_engine()
+        self._dispatcher = shared_dispatcher() if dispatcher is None else dispatcher
+        self._queues = {}
         self._conns = {}
+        # trade streams are de-duplicated and backfilled from REST after gaps
+        self.fillers = {}
         self._user_timer = None
         self._user_listen_key = None
         self._user_callback = None
+        self._user_on_open = None
         self._client = client
+        # per stream exchange-to-receive / receive-to-callback latency, corrected by the server time offset
+        self.latency = FeedLatency('Binance', getattr(client, 'time_sync', None))
 
-    def _start_socket(self, path, callback, prefix='ws/'):
+    def _start_socket(self, path, callback, prefix='ws/', on_open=None):
         if path in self._conns:
             return False
 
-        factory_url = self.STREAM_URL + prefix + path
-        factory = BinanceClientFactory(factory_url)
-        factory.protocol = BinanceClientProtocol
-        factory.callback = callback
-        factory.reconnect = True
-        context_factory = ssl.ClientContextFactory()
-
-        self._conns[path] = connectWS(factory, context_factory)
+        self._conns[path] = self._engine.connect(self.STREAM_URL + prefix + path,
+                                                 self._message_handler(path, self._queued(path, callback)),
+                                                 on_open=on_open, name='Binance ' + path)
         return path
 
+    @staticmethod
+    def dispatch_policy(stream):
+        """Queue policy of a stream: conflate latest-value streams, keep every user data
+        event, otherwise drop oldest"""
+        if stream == '!ticker@arr':
+            return CONFLATE
+        if '@' not in stream:
+            # the user data stream path is the bare listen key; a dropped
+            # executionReport or balance update can not be recovered
+            return KEEP_ALL
+        name = stream.split('@', 1)[-1]
+        if name == 'ticker' or name.startswith('kline_') or \
+                (name.startswith('depth') and name[5:].isdigit()):
+            return CONFLATE
+        return DROP_OLDEST
+
+    def _queued(self, stream, callback):
+        """Put the callback behind a dispatch queue for the stream
+
+        :returns: ``deliver(msg, received=None)``, the receive-to-callback latency is
+            recorded once the callback has returned, on the thread that calls it
+        """
+        latency = self.latency
+
+        def handled(msg, received):
+            # combined streams carry the stream name, see _message_handler
+            name = msg.get('stream', stream) if isinstance(msg, dict) else stream
+            latency.on_handled(name, received)
+
+        if not self._dispatcher:
+            def deliver(msg, received=None):
+                callback(msg)
+                if received is not None:
+                    handled(msg, received)
+            return deliver
+        queue = self._dispatcher.queue('Binance ' + stream, callback, self.dispatch_policy(stream),
+                                       on_handled=handled)
+        self._queues[stream] = queue
+        return queue.put
+
+    def _unqueue(self, stream):
+        queue = self._queues.pop(stream, None)
+        if queue is not None:
+            queue.close()
+
+    def _message_handler(self, path, callback):
+        """Decode text frames, record metrics and receive latency, then call
+        ``callback(msg, received)``"""
+        latency = self.latency
+
+        def on_message(payload):
+            if not isinstance(payload, str):
+                return
+            received = time.time()
+            try:
+                payload_obj = json.loads(payload)
+            except ValueError:
+                record_message('Binance', path, len(payload), error=True)
+                return
+            record_message('Binance', path, len(payload))
+            # combined streams wrap the event as {"stream": .., "data": ..}
+            stream, event_time = path, None
+            if isinstance(payload_obj, dict):
+                stream = payload_obj.get('stream', stream)
+                event = payload_obj.get('data', payload_obj)
+                if isinstance(event, dict):
+                    event_time = event.get('E')
+            latency.on_receive(stream, event_time, received)
+            callback(payload_obj, received)
+
+        return on_message
+
     def start_depth_socket(self, symbol, callback, depth=None):
         """Start a websocket for symbol market depth returning either a diff or a partial book
 
@@ -153,7 +207,7 @@ class BinanceSocketManager(threading.Thread):
             socket_name = '{}{}'.format(socket_name, depth)
         return self._start_socket(socket_name, callback)
 
-    def start_kline_socket(self, symbol, callback, interval=Client.KLINE_INTERVAL_1MINUTE):
+    def start_kline_socket(self, symbol, callback, interval=KLINE_INTERVAL_1MINUTE):
         """Start a websocket for symbol kline data
 
         https://github.com/binance-exchange/binance-official-api-docs/blob/master/web-socket-streams.md#klinecandlestick-streams
@@ -199,15 +253,31 @@ class BinanceSocketManager(threading.Thread):
         socket_name = '{}@kline_{}'.format(symbol.lower(), interval)
         return self._start_socket(socket_name, callback)
 
-    def start_trade_socket(self, symbol, callback):
+    def _start_trade_socket(self, path, callback, id_key, fetch, backfill):
+        if path in self._conns:
+            return False
+        if not backfill or self._client is None:
+            fetch = None
+        filler = TradeGapFiller(callback, fetch, itemgetter(id_key), name='Binance ' + path)
+        self.fillers[path] = filler
+        return self._start_socket(path, filler.on_event)
+
+    def start_trade_socket(self, symbol, callback, backfill=True):
         """Start a websocket for symbol trade data
 
+        Trades are delivered in trade id order without duplicates. When ids
+        jump, for example after a reconnect, the missing trades are fetched
+        with get_historical_trades (needs an API key) and delivered first,
+        in the same format with event time set to the trade time.
+
         https://github.com/binance-exchange/binance-official-api-docs/blob/master/web-socket-streams.md#trade-streams
 
         :param symbol: required
         :type symbol: str
         :param callback: callback function to handle messages
         :type callback: function
+        :param backfill: fetch trades missed during disconnects, default True
+        :type backfill: bool
 
         :returns: connection key string if successful, False otherwise
 
@@ -230,17 +300,31 @@ class BinanceSocketManager(threading.Thread):
             }
 
         """
-        return self._start_socket(symbol.lower() + '@trade', callback)
+        symbol = symbol.upper()
+
+        def fetch(after_id):
+            trades = self._client.get_historical_trades(symbol=symbol, fromId=after_id + 1, limit=500)
+            return [{"e": "trade", "E": t['time'], "s": symbol, "t": t['id'],
+                     "p": t['price'], "q": t['qty'], "b": None, "a": None,
+                     "T": t['time'], "m": t['isBuyerMaker'], "M": t['isBestMatch']}
+                    for t in trades]
+
+        return self._start_trade_socket(symbol.lower() + '@trade', callback, 't', fetch, backfill)
 
-    def start_aggtrade_socket(self, symbol, callback):
+    def start_aggtrade_socket(self, symbol, callback, backfill=True):
         """Start a websocket for symbol trade data
 
+        Aggregate trades are delivered in id order without duplicates, trades
+        missed during disconnects are fetched with get_aggregate_trades.
+
         https://github.com/binance-exchange/binance-official-api-docs/blob/master/web-socket-streams.md#aggregate-trade-streams
 
         :param symbol: required
         :type symbol: str
         :param callback: callback function to handle messages
         :type callback: function
+        :param backfill: fetch trades missed during disconnects, default True
+        :type backfill: bool
 
         :returns: connection key string if successful, False otherwise
 
@@ -263,7 +347,15 @@ class BinanceSocketManager(threading.Thread):
             }
 
         """
-        return self._start_socket(symbol.lower() + '@aggTrade', callback)
+        symbol = symbol.upper()
+
+        def fetch(after_id):
+            trades = self._client.get_aggregate_trades(symbol=symbol, fromId=after_id + 1, limit=500)
+            for t in trades:
+                t.update({"e": "aggTrade", "E": t['T'], "s": symbol})
+            return trades
+
+        return self._start_trade_socket(symbol.lower() + '@aggTrade', callback, 'a', fetch, backfill)
 
     def start_symbol_ticker_socket(self, symbol, callback):
         """Start a websocket for a symbol's ticker data
@@ -362,6 +454,9 @@ class BinanceSocketManager(threading.Thread):
 
         Combined stream events are wrapped as follows: {"stream":"<streamName>","data":<rawPayload>}
 
+        All streams share one connection and url, for hundreds of streams use
+        :class:`StreamRouter` which shards them over several connections.
+
         https://github.com/binance-exchange/binance-official-api-docs/blob/master/web-socket-streams.md
 
         :param streams: list of stream names in lower case
@@ -377,13 +472,17 @@ class BinanceSocketManager(threading.Thread):
         stream_path = 'streams={}'.format('/'.join(streams))
         return self._start_socket(stream_path, callback, 'stream?')
 
-    def start_user_socket(self, callback):
+    def start_user_socket(self, callback, on_open=None):
         """Start a websocket for user data
 
         https://www.binance.com/restapipub.html#user-wss-endpoint
 
         :param callback: callback function to handle messages
         :type callback: function
+        :param on_open: Optional function called with the connection after every (re)connect,
+            on the websocket engine thread; ``conn.connects > 1`` means events may have been
+            missed while disconnected
+        :type on_open: function
 
         :returns: connection key string if successful, False otherwise
 
@@ -397,7 +496,8 @@ class BinanceSocketManager(threading.Thread):
                     break
         self._user_listen_key = self._client.stream_get_listen_key()
         self._user_callback = callback
-        conn_key = self._start_socket(self._user_listen_key, callback)
+        self._user_on_open = on_open
+        conn_key = self._start_socket(self._user_listen_key, callback, on_open=on_open)
         if conn_key:
             # start timer to keep socket alive
             self._start_user_timer()
@@ -413,7 +513,7 @@ class BinanceSocketManager(threading.Thread):
         listen_key = self._client.stream_get_listen_key()
         # check if they key changed and
         if listen_key != self._user_listen_key:
-            self.start_user_socket(self._user_callback)
+            self.start_user_socket(self._user_callback, self._user_on_open)
         self._start_user_timer()
 
     def stop_socket(self, conn_key):
@@ -427,10 +527,11 @@ class BinanceSocketManager(threading.Thread):
         if conn_key not in self._conns:
             return
 
-        # disable reconnecting if we are closing
-        self._conns[conn_key].factory = WebSocketClientFactory(self.STREAM_URL + 'tmp_path')
-        self._conns[conn_key].disconnect()
+        # closing also disables reconnecting
+        self._conns[conn_key].close()
         del (self._conns[conn_key])
+        self.fillers.pop(conn_key, None)
+        self._unqueue(conn_key)
 
         # check if we have a user stream socket
         if len(conn_key) >= 60 and conn_key[:60] == self._user_listen_key:
@@ -446,15 +547,20 @@ class BinanceSocketManager(threading.Thread):
         self._client.stream_close(listenKey=self._user_listen_key)
         self._user_listen_key = None
 
-    def run(self):
-        try:
-            reactor.run(installSignalHandlers=False)
-        except ReactorAlreadyRunning:
-            # Ignore error about reactor already running
-            pass
+    def start(self):
+        """Make sure the shared websocket engine is running
+
+        Sockets connect as soon as they are started, this is kept so existing
+        callers can keep calling start() after adding sockets.
+
+        """
+        self._engine.start()
 
     def close(self):
-        """Close all connections
+        """Close all connections of this manager
+
+        The shared engine keeps running for other managers, use
+        ``shared_engine().stop()`` to stop it at process exit.
 
         """
         keys = set(self._conns.keys())
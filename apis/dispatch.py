@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+websocket 消息分发
+==============================================================
+websocket 收到的消息先放入每个数据流自己的有界队列，再由工作线程调用
+用户回调，网络读取线程只做入队，不会因为回调处理慢而停止读取，
+从而避免交易所因读取缓慢断开连接、深度数据出现缺口。
+
+队列满时的策略：
+    drop_oldest  丢弃最旧的消息（增量深度、成交）
+    conflate     只保留最新一条（ticker、K 线、部分深度快照这类最新值数据）
+    keep_all     不设上限、从不丢弃（用户数据：订单成交和余额变化丢一条就无法恢复）
+
+同一数据流的消息总是按顺序、由同一时刻的一个线程处理；不同数据流在
+workers 个线程之间并发处理（workers=1 时所有回调串行执行，与网络线程内
+直接回调时的线程模型一致）。
+
+指标（见 metrics）：
+    coins_api_dispatch_queue_depth      各队列当前长度
+    coins_api_dispatch_dropped_total    因队列满丢弃或被合并的消息数
+    coins_api_dispatch_wait_ms          消息从入队到回调开始的等待时间
+"""
+
+import threading
+import time
+from collections import deque
+
+from .metrics import REGISTRY
+
+DROP_OLDEST = 'drop_oldest'
+CONFLATE = 'conflate'
+KEEP_ALL = 'keep_all'
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    'coins_api_dispatch_queue_depth', ('queue',),
+    doc='Messages waiting in a dispatch queue')
+QUEUE_DROPPED = REGISTRY.counter(
+    'coins_api_dispatch_dropped_total', ('queue', 'reason'),
+    doc='Messages dropped by a full dispatch queue (dropped / conflated)')
+QUEUE_WAIT = REGISTRY.histogram(
+    'coins_api_dispatch_wait_ms', ('queue',),
+    doc='Time from enqueue to callback start in milliseconds')
+
+
+class StreamQueue:
+    """单个数据流的有界队列，由 Dispatcher.queue 创建"""
+
+    def __init__(self, dispatcher, name, callback, policy=DROP_OLDEST, maxlen=10000,
+                 on_handled=None):
+        """
+        :param name: 队列名称，用作指标标签
+        :param callback: 回调函数
+        :param policy: drop_oldest / conflate / keep_all
+        :param maxlen: 队列长度上限，conflate 时固定为 1，keep_all 时不限
+        :param on_handled: 回调返回后调用 on_handled(item, received)，用于记录收到消息到
+            回调处理完毕的延迟；received 为 put 时传入的收到时间，未传入时为入队时间
+        """
+        if policy not in (DROP_OLDEST, CONFLATE, KEEP_ALL):
+            raise ValueError('unknown policy: %s' % policy)
+        self.dispatcher = dispatcher
+        self.name = name
+        self.callback = callback
+        self.policy = policy
+        self.maxlen = {CONFLATE: 1, KEEP_ALL: None}.get(policy, maxlen)
+        self.on_handled = on_handled
+        self.dropped = 0
+        self.processed = 0
+        self.closed = False
+        self._items = deque()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._key = (name,)
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, received=None):
+        """入队，从不阻塞；队列满时按策略丢弃
+
+        :param received: 收到消息的本机时间（秒），交给 on_handled
+        """
+        if self.closed:
+            return
+        with self._lock:
+            items = self._items
+            if self.maxlen is not None and len(items) >= self.maxlen:
+                items.popleft()
+                self.dropped += 1
+                QUEUE_DROPPED.inc((self.name, 'conflated' if self.policy == CONFLATE else 'dropped'))
+            items.append((time.time(), received, item))
+            QUEUE_DEPTH.set(self._key, len(items))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.dispatcher._schedule(self)
+
+    def close(self):
+        """不再接收消息，丢弃未处理的消息"""
+        self.closed = True
+        with self._lock:
+            self._items.clear()
+            QUEUE_DEPTH.set(self._key, 0)
+        self.dispatcher._forget(self)
+
+    def _run(self, batch):
+        """处理至多 batch 条消息，返回是否还有剩余"""
+        for _ in range(batch):
+            with self._lock:
+                if not self._items:
+                    self._scheduled = False
+                    return False
+                queued, received, item = self._items.popleft()
+                QUEUE_DEPTH.set(self._key, len(self._items))
+            QUEUE_WAIT.observe(self._key, (time.time() - queued) * 1000)
+            try:
+                self.callback(item)
+                if self.on_handled is not None:
+                    self.on_handled(item, queued if received is None else received)
+            except Exception as e:
+                print('%s 回调出错：%r' % (self.name, e))
+            self.processed += 1
+        with self._lock:
+            if self._items and not self.closed:
+                return True
+            self._scheduled = False
+            return False
+
+    def to_dict(self):
+        return {"name": self.name, "policy": self.policy, "depth": len(self._items),
+                "maxlen": self.maxlen, "dropped": self.dropped, "processed": self.processed}
+
+
+class Dispatcher:
+    """用 workers 个线程处理各数据流队列中的消息"""
+
+    def __init__(self, workers=1, batch=100, name='Dispatcher'):
+        """
+        :param workers: 工作线程数
+        :param batch: 一个队列连续处理的消息数上限，处理完后让出给其他队列
+        :param name: 线程名称前缀
+        """
+        self.workers = workers
+        self.batch = batch
+        self.name = name
+        self._queues = set()
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+
+    def queue(self, name, callback, policy=DROP_OLDEST, maxlen=10000, on_handled=None):
+        """为一个数据流创建队列，参数见 StreamQueue
+
+        :return: StreamQueue，把 queue.put 作为 websocket 回调即可
+        """
+        self.start()
+        q = StreamQueue(self, name, callback, policy, maxlen, on_handled)
+        self._queues.add(q)
+        return q
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return self
+            self._stopped = False
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, daemon=True, name='%s-%d' % (self.name, i))
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def stop(self, timeout=5):
+        """停止工作线程，未处理的消息丢弃"""
+        with self._cond:
+            self._stopped = True
+            self._ready.clear()
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for t in threads:
+            t.join(timeout)
+        for q in list(self._queues):
+            with q._lock:
+                q._items.clear()
+                q._scheduled = False
+                QUEUE_DEPTH.set(q._key, 0)
+
+    def stats(self):
+        return [q.to_dict() for q in list(self._queues)]
+
+    def _schedule(self, q):
+        with self._cond:
+            self._ready.append(q)
+            self._cond.notify()
+
+    def _forget(self, q):
+        self._queues.discard(q)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                q = self._ready.popleft()
+            if q._run(self.batch):
+                self._schedule(q)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_dispatcher():
+    """进程内共享的 Dispatcher，单个工作线程"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Dispatcher()
+        return _shared
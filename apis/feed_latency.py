@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+行情数据流延迟
+==============================================================
+Binance 推送的事件带有事件时间 E，Huobi 推送带有 ts，均为交易所服务器的
+毫秒时间戳。收到消息时用 TimeSync 校正后的本机时间减去事件时间，得到
+交易所到本地的延迟；回调处理完成后再记录本地处理耗时：
+
+    exchange_to_receive  交易所生成事件 -> 本地收到消息（已扣除时钟偏差）
+    receive_to_callback  本地收到消息 -> 回调函数处理完毕
+
+两类延迟按 (交易所, 数据流) 写入 metrics 中的直方图，同时保存每个数据流
+最近一次的延迟和收到时间，用于判断行情是否陈旧，策略可以据此决定是否报价。
+"""
+
+import threading
+import time
+
+from .metrics import REGISTRY
+
+FEED_LATENCY = REGISTRY.histogram(
+    'coins_api_feed_latency_ms', ('exchange', 'stream', 'stage'),
+    doc='Market data latency in milliseconds (exchange_to_receive / receive_to_callback)')
+
+
+def symbol_of(stream):
+    """从数据流名称中取出交易对
+
+    ethbtc@depth -> ethbtc，market.ethusdt.kline.1min -> ethusdt
+    """
+    if stream.startswith('market.'):
+        return stream.split('.')[1]
+    return stream.split('@')[0]
+
+
+class StreamLatency:
+    """单个数据流最近一次的延迟"""
+
+    __slots__ = ('stream', 'symbol', 'lag', 'handle', 'received', 'event_time', 'count')
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.symbol = symbol_of(stream)
+        self.lag = None         # 最近一次交易所到本地的延迟（毫秒）
+        self.handle = None      # 最近一次回调耗时（毫秒）
+        self.received = None    # 最近一次收到消息的本机时间（秒）
+        self.event_time = None  # 最近一次事件的交易所时间（毫秒）
+        self.count = 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FeedLatency:
+    """单个交易所的行情延迟跟踪"""
+
+    def __init__(self, exchange, time_sync=None, max_lag=1000, max_age=None):
+        """
+        :param exchange: 交易所名称
+        :param time_sync: TimeSync，用于扣除本机与服务器的时钟偏差，未启动时在这里启动，None 表示不校正
+        :param max_lag: 交易所到本地的延迟超过该值（毫秒）时认为行情陈旧
+        :param max_age: 超过该时间（秒）没有收到消息时认为行情陈旧，None 表示不检查
+        """
+        self.exchange = exchange
+        self.time_sync = time_sync
+        if time_sync is not None:
+            # 只订阅行情、没有 api key 的客户端不会启动时间同步，延迟需要它来扣除时钟偏差；
+            # 查询服务器时间是公开接口，在后台完成首次同步，不阻塞调用方
+            time_sync.start(wait=False)
+        self.max_lag = max_lag
+        self.max_age = max_age
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _get(self, stream):
+        state = self._streams.get(stream)
+        if state is None:
+            with self._lock:
+                state = self._streams.setdefault(stream, StreamLatency(stream))
+        return state
+
+    def on_receive(self, stream, event_time, received=None):
+        """收到一条消息
+
+        :param stream: 数据流名称
+        :param event_time: 交易所事件时间（毫秒），没有时传 None
+        :param received: 收到消息的本机时间（秒），默认当前时间
+        :return: 收到消息的本机时间，传给 on_handled
+        """
+        if received is None:
+            received = time.time()
+        state = self._get(stream)
+        state.received = received
+        state.count += 1
+        if event_time:
+            offset = self.time_sync.offset if self.time_sync is not None else 0.0
+            lag = received * 1000 + offset - event_time
+            state.lag = lag
+            state.event_time = event_time
+            FEED_LATENCY.observe((self.exchange, stream, 'exchange_to_receive'), max(lag, 0.0))
+        return received
+
+    def on_handled(self, stream, received):
+        """回调处理完毕"""
+        handle = (time.time() - received) * 1000
+        self._get(stream).handle = handle
+        FEED_LATENCY.observe((self.exchange, stream, 'receive_to_callback'), handle)
+
+    def is_stale(self, stream, max_lag=None, max_age=None):
+        """数据流是否陈旧，从未收到过消息的数据流视为陈旧"""
+        state = self._streams.get(stream)
+        if state is None or state.received is None:
+            return True
+        max_lag = self.max_lag if max_lag is None else max_lag
+        max_age = self.max_age if max_age is None else max_age
+        if max_lag is not None and state.lag is not None and state.lag > max_lag:
+            return True
+        if max_age is not None and time.time() - state.received > max_age:
+            return True
+        return False
+
+    def is_fresh(self, symbol, max_lag=None, max_age=None):
+        """交易对的所有数据流均不陈旧时返回 True，可用于决定是否报价"""
+        streams = self.streams(symbol)
+        return bool(streams) and not any(
+            self.is_stale(s.stream, max_lag, max_age) for s in streams)
+
+    def stale_streams(self, max_lag=None, max_age=None):
+        return [s for s in list(self._streams) if self.is_stale(s, max_lag, max_age)]
+
+    def streams(self, symbol=None):
+        """全部（或指定交易对的）数据流状态"""
+        symbol = symbol.lower() if symbol else None
+        return [s for s in list(self._streams.values())
+                if symbol is None or s.symbol.lower() == symbol]
+
+    def snapshot(self, symbol=None):
+        """各数据流最近一次延迟以及延迟分布
+
+        :return:
+            {数据流: {"symbol":.., "lag":.., "handle":.., "received":.., "stale":..,
+                      "exchange_to_receive": {"p50":.., "p99":.., ...},
+                      "receive_to_callback": {...}}, ...}
+        """
+        data = {}
+        for state in self.streams(symbol):
+            row = state.to_dict()
+            row['stale'] = self.is_stale(state.stream)
+            for stage in ('exchange_to_receive', 'receive_to_callback'):
+                h = FEED_LATENCY.child((self.exchange, state.stream, stage))
+                row[stage] = h.to_dict()
+            data[state.stream] = row
+        return data
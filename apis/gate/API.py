@@ -7,9 +7,12 @@ from .HttpUtil import httpGet, httpPost
 
 
 class GateAPI:
-    def __init__(self, apikey=None, secretkey=None):
+    # API 地址，默认 HTTPS；以 http:// 开头时使用明文 HTTP（如本地测试服务）
+    URL = 'data.gate.io'
+
+    def __init__(self, apikey=None, secretkey=None, url=None):
         self.name = 'Gate.io'
-        self.__url = 'data.gate.io'
+        self.__url = url or self.URL
         self.__apikey = apikey
         self.__secretkey = secretkey
 
@@ -4,27 +4,54 @@
 创建日期：2018-01-06
 """
 import http.client
+import time
 import urllib
 import json
 from hashlib import sha512
-import hmac
+
+from ..signing import get_signer, encode_params
+from ..metrics import record_request, endpoint_of
 
 
 def getSign(params, secretKey):
-    sign = ''
-    for key in (params.keys()):
-        sign += key + '=' + str(params[key]) + '&'
-    sign = sign[:-1]
-    my_sign = hmac.new(bytes(secretKey, encoding='utf8'), bytes(sign, encoding='utf8'), sha512).hexdigest()
-    return my_sign
+    return get_signer(secretKey, sha512).hexdigest(encode_params(params))
+
+
+def _send(url, method, resource, body=None, headers=None, endpoint=None):
+    """发送请求并按 connect/server/read/parse 阶段记录耗时"""
+    endpoint = endpoint or endpoint_of(resource)
+    t0 = time.perf_counter()
+    if url.startswith('http://'):
+        conn = http.client.HTTPConnection(url[7:], timeout=10)
+    else:
+        conn = http.client.HTTPSConnection(url, timeout=10)
+    timings = {}
+    try:
+        conn.connect()
+        t1 = time.perf_counter()
+        timings['connect'] = (t1 - t0) * 1000
+        conn.request(method, resource, body, headers or {})
+        response = conn.getresponse()
+        t2 = time.perf_counter()
+        timings['server'] = (t2 - t1) * 1000
+        data = response.read().decode('utf-8')
+        t3 = time.perf_counter()
+        timings['read'] = (t3 - t2) * 1000
+        data = json.loads(data)
+        t4 = time.perf_counter()
+        timings['parse'] = (t4 - t3) * 1000
+    except Exception:
+        record_request('Gate', endpoint, (time.perf_counter() - t0) * 1000, 'error', **timings)
+        raise
+    finally:
+        conn.close()
+    record_request('Gate', endpoint, (t4 - t0) * 1000,
+                   'ok' if response.status == 200 else 'error', **timings)
+    return data
 
 
 def httpGet(url, resource, params=''):
-    conn = http.client.HTTPSConnection(url, timeout=10)
-    conn.request("GET", resource + '/' + params)
-    response = conn.getresponse()
-    data = response.read().decode('utf-8')
-    return json.loads(data)
+    return _send(url, "GET", resource + '/' + params, endpoint=resource)
 
 
 def httpPost(url, resource, params, apikey, secretkey):
@@ -33,15 +60,10 @@ def httpPost(url, resource, params, apikey, secretkey):
         "KEY": apikey,
         "SIGN": getSign(params, secretkey)
     }
-    conn = http.client.HTTPSConnection(url, timeout=10)
     if params:
         temp_params = urllib.parse.urlencode(params)
     else:
         temp_params = ''
-    print(temp_params)
-    conn.request("POST", resource, temp_params, headers)
-    response = conn.getresponse()
-    data = response.read().decode('utf-8')
+    data = _send(url, "POST", resource, temp_params, headers)
     params.clear()
-    conn.close()
     return data
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Gate.io websocket 行情订阅
+https://gateio.news/docs/websocket/index.html
+===============================================================================
+接口与 BinanceSocketManager 相同，每个数据流一条连接，运行在共享的 websocket
+事件循环上，回调默认经过共享 Dispatcher 的有界队列调用：
+
+    gm = GateSocketManager()
+    gm.start_ticker_socket('eth_btc', on_ticker)
+    gm.start_trade_socket('eth_btc', on_trade)
+    gm.start_depth_socket('eth_btc', on_depth, limit=20)
+    gm.start_kline_socket('eth_btc', on_kline, interval=60)
+    ...
+    gm.stop_socket('eth_btc@trade')
+    gm.close()
+
+Gate 推送为 JSON-RPC 格式的 {"method": "ticker.update", "params": [...]}，
+回调收到的是规范化后的数据（价格、数量均为浮点数，交易对为小写如 eth_btc）：
+
+    ticker  {"symbol", "high", "low", "sell", "buy", "last", "volume", "timestamp", "raw"}
+            Gate 的 ticker 推送没有买一卖一价和时间戳，sell / buy / timestamp 为 None
+    trade   {"symbol", "id", "time", "price", "amount", "type", "raw"}
+            每条成交单独回调，按 id 递增、不重复；type 0 为买，1 为卖
+    depth   {"symbol", "bids": [(price, amount), ...], "asks": [...], "timestamp", "raw"}
+            推送为快照加增量，本地只保留前 limit 档，每次回调都是前 limit 档
+    kline   {"symbol", "interval", "time", "open", "high", "low", "close", "volume", "raw"}
+
+每次（重）连接成功后重新订阅；订阅成交时 Gate 会先推送最近的成交，重连后
+由此补齐断线期间的成交（超出这部分的缺口无法补齐）。
+
+延迟（latency，见 feed_latency）：只有成交推送带有交易所时间，exchange_to_receive
+取本条推送中最新一笔成交的时间，订阅后的第一条（历史成交）不计；Gate 没有
+服务器时间接口，这一延迟包含本机与服务器的时钟偏差。ticker、深度、K 线只记录
+receive_to_callback。
+"""
+
+import heapq
+import itertools
+import json
+import time
+
+from ..metrics import record_message
+from ..feed_latency import FeedLatency
+from ..wsengine import shared_engine
+from ..backfill import TradeGapFiller
+from ..dispatch import shared_dispatcher, DROP_OLDEST, CONFLATE
+
+
+class GateSocketManager:
+    """Gate.io websocket 行情订阅管理"""
+
+    STREAM_URL = 'wss://ws.gate.io/v3/'
+
+    def __init__(self, client=None, engine=None, dispatcher=None):
+        """
+        :param client: GateClient，暂未使用，与其他交易所的 SocketManager 保持一致
+        :param engine: WebSocketEngine，默认使用共享的事件循环
+        :param dispatcher: Dispatcher，默认使用共享的 Dispatcher，False 表示在网络线程中直接回调
+        """
+        self._client = client
+        self._engine = engine or shared_engine()
+        self._dispatcher = shared_dispatcher() if dispatcher is None else dispatcher
+        self._conns = {}
+        self._queues = {}
+        # 成交去重，键为数据流名称
+        self.fillers = {}
+        self._request_id = itertools.count(1)
+        self.latency = FeedLatency('Gate')
+
+    def _start_socket(self, stream, method, params, callback, handler, event_time=None):
+        """建立一条连接，连接成功后发送订阅请求
+
+        :param stream: 数据流名称，如 eth_btc@ticker，作为连接的键
+        :param method: 订阅方法，如 ticker.subscribe
+        :param params: 订阅参数
+        :param handler: handler(params, deliver)，把推送的 params 规范化后交给 deliver(msg)
+        :param event_time: event_time(params)，返回推送的交易所时间（毫秒），用于计算延迟
+        """
+        if stream in self._conns:
+            return False
+        deliver = self._queued(stream, callback)
+        on_message = self._message_handler(stream, handler, deliver, event_time)
+
+        def on_open(conn):
+            # 订阅后的第一条推送是快照或历史成交，不计算交易所延迟
+            on_message.subscribed = True
+            conn.send(json.dumps({"id": next(self._request_id), "method": method, "params": params}))
+
+        self._conns[stream] = self._engine.connect(
+            self.STREAM_URL, on_message, on_open=on_open, name='Gate ' + stream)
+        return stream
+
+    @staticmethod
+    def dispatch_policy(stream):
+        """队列策略：成交丢弃最旧的消息，其余只保留最新一条"""
+        return DROP_OLDEST if stream.endswith('@trade') else CONFLATE
+
+    def _queued(self, stream, callback):
+        """返回 deliver(msg, received=None)，回调返回后（在调用回调的线程中）记录处理延迟"""
+        latency = self.latency
+
+        def handled(msg, received):
+            latency.on_handled(stream, received)
+
+        if not self._dispatcher:
+            def deliver(msg, received=None):
+                callback(msg)
+                if received is not None:
+                    handled(msg, received)
+            return deliver
+        queue = self._dispatcher.queue('Gate ' + stream, callback, self.dispatch_policy(stream),
+                                       on_handled=handled)
+        self._queues[stream] = queue
+        return queue.put
+
+    def _unqueue(self, stream):
+        queue = self._queues.pop(stream, None)
+        if queue is not None:
+            queue.close()
+
+    def _message_handler(self, stream, handler, deliver, event_time=None):
+        """解析推送、记录指标和收到延迟，再交给 handler"""
+        latency = self.latency
+
+        def on_message(payload):
+            received = time.time()
+            try:
+                msg = json.loads(payload)
+            except ValueError:
+                record_message('Gate', stream, len(payload), error=True)
+                return
+            record_message('Gate', stream, len(payload))
+            if msg.get('error'):
+                # 订阅失败只影响这条连接
+                print('Gate %s 订阅失败：%s' % (stream, msg['error']))
+                return
+            if not msg.get('method', '').endswith('.update'):
+                # 订阅结果 {"result": {"status": "success"}}
+                return
+            params = msg['params']
+            exchange_time = None
+            if on_message.subscribed:
+                on_message.subscribed = False
+            elif event_time is not None:
+                exchange_time = event_time(params)
+            latency.on_receive(stream, exchange_time, received)
+            handler(params, lambda item: deliver(item, received))
+
+        on_message.subscribed = False
+        return on_message
+
+    def start_ticker_socket(self, symbol, callback):
+        """订阅 24 小时行情 ticker.subscribe
+
+        :param symbol: 交易对，如 eth_btc
+        :return: 数据流名称，已订阅时返回 False
+        """
+        symbol = symbol.lower()
+
+        def handler(params, deliver):
+            info = params[1]
+            deliver({"symbol": symbol, "high": float(info['high']), "low": float(info['low']),
+                     "sell": None, "buy": None, "last": float(info['last']),
+                     "volume": float(info['baseVolume']), "timestamp": None, "raw": info})
+
+        return self._start_socket(symbol + '@ticker', 'ticker.subscribe', [symbol.upper()],
+                                  callback, handler)
+
+    def start_trade_socket(self, symbol, callback):
+        """订阅成交 trades.subscribe，成交按 id 递增、不重复地回调
+
+        :param symbol: 交易对，如 eth_btc
+        :return: 数据流名称，已订阅时返回 False
+        """
+        symbol = symbol.lower()
+        stream = symbol + '@trade'
+        if stream in self._conns:
+            return False
+
+        def normalize(t):
+            return {"symbol": symbol, "id": t['id'], "time": int(t['time'] * 1000),
+                    "price": float(t['price']), "amount": float(t['amount']),
+                    "type": 1 if t['type'] == 'sell' else 0, "raw": t}
+
+        filler = None
+
+        def handler(params, deliver):
+            nonlocal filler
+            if filler is None:
+                filler = self.fillers[stream] = TradeGapFiller(
+                    deliver, None, lambda t: t['id'], contiguous=False, name='Gate ' + stream)
+            # deliver 带有本条推送的收到时间
+            filler.callback = deliver
+            # 推送中的成交按时间倒序
+            for t in sorted(params[1], key=lambda t: t['id']):
+                filler.on_event(normalize(t))
+
+        def event_time(params):
+            return max(t['time'] for t in params[1]) * 1000 if params[1] else None
+
+        return self._start_socket(stream, 'trades.subscribe', [symbol.upper()], callback, handler,
+                                  event_time)
+
+    def start_depth_socket(self, symbol, callback, limit=30, interval='0.00000001'):
+        """订阅深度 depth.subscribe，在本地合并快照和增量，回调前 limit 档盘口
+
+        :param symbol: 交易对，如 eth_btc
+        :param limit: 档数，1, 5, 10, 20, 30
+        :param interval: 价格合并精度，如 '0.00000001'
+        :return: 数据流名称，已订阅时返回 False
+        """
+        symbol = symbol.lower()
+        bids, asks = {}, {}
+
+        def apply(side, levels):
+            for price, amount in levels or ():
+                amount = float(amount)
+                if amount:
+                    side[float(price)] = amount
+                else:
+                    side.pop(float(price), None)
+
+        def top(side, select):
+            # 每条推送只改动几档，取前 limit 档不需要整体排序
+            levels = select(limit, side.items())
+            if len(side) > limit:
+                # 挤出前 limit 档的价位不会再收到删除，直接丢弃
+                side.clear()
+                side.update(levels)
+            return levels
+
+        def handler(params, deliver):
+            clean, update = params[0], params[1]
+            if clean:
+                # 完整快照，(重)连接后的第一条推送
+                bids.clear()
+                asks.clear()
+            apply(bids, update.get('bids'))
+            apply(asks, update.get('asks'))
+            deliver({"symbol": symbol, "bids": top(bids, heapq.nlargest),
+                     "asks": top(asks, heapq.nsmallest), "timestamp": None, "raw": update})
+
+        return self._start_socket(symbol + '@depth', 'depth.subscribe',
+                                  [symbol.upper(), limit, interval], callback, handler)
+
+    def start_kline_socket(self, symbol, callback, interval=60):
+        """订阅 K 线 kline.subscribe
+
+        :param symbol: 交易对，如 eth_btc
+        :param interval: K 线周期（秒），如 60、300、3600、86400
+        :return: 数据流名称，已订阅时返回 False
+        """
+        symbol = symbol.lower()
+
+        def handler(params, deliver):
+            # [time, open, close, high, low, volume, amount, market]
+            for k in params:
+                deliver({"symbol": symbol, "interval": interval, "time": int(k[0]) * 1000,
+                         "open": float(k[1]), "high": float(k[3]), "low": float(k[4]),
+                         "close": float(k[2]), "volume": float(k[5]), "raw": k})
+
+        return self._start_socket('%s@kline_%d' % (symbol, interval), 'kline.subscribe',
+                                  [symbol.upper(), interval], callback, handler)
+
+    def stop_socket(self, conn_key):
+        """关闭一个数据流的连接
+
+        :param conn_key: start_* 返回的数据流名称
+        """
+        conn = self._conns.pop(conn_key, None)
+        if conn is None:
+            return
+        conn.close()
+        self.fillers.pop(conn_key, None)
+        self._unqueue(conn_key)
+
+    def start(self):
+        """确保共享的事件循环已启动，start_* 时会自动启动"""
+        self._engine.start()
+
+    def close(self):
+        """关闭本管理器的全部连接，共享的事件循环继续运行"""
+        for key in list(self._conns):
+            self.stop_socket(key)
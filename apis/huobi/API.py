@@ -12,6 +12,7 @@ from .hb_util import MARKET_URL
 from .hb_util import http_get_request
 from .hb_util import api_key_get
 from .hb_util import api_key_post
+from .hb_util import TIME_SYNC
 
 
 class HuobiAPI:
@@ -24,6 +25,9 @@ class HuobiAPI:
         self.API_HOST = "api.huobi.pro"
         self.ACCESS_KEY = ACCESS_KEY
         self.SECRET_KEY = SECRET_KEY
+        self.time_sync = TIME_SYNC
+        if self.ACCESS_KEY is not None and self.SECRET_KEY is not None:
+            self.time_sync.start()
         # if self.ACCESS_KEY is not None and self.SECRET_KEY is not None:
         #     self.ACCOUNT_ID = self.get_accounts()  # 获取key对应的accounts，分为 spot（现货账户） 和 otc
         #     self.spot_acct_id = self.ACCOUNT_ID[0]['id']
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+火币网增量深度缓存
+https://huobiapi.github.io/docs/spot/v1/cn/#market-by-price
+===============================================================================
+订阅 market.$symbol.mbp.$levels 增量深度，在内存中维护完整的盘口，接口与
+Binance 的 DepthCacheManager 相同：
+
+    dcm = DepthCacheManager('ethusdt', callback=on_book)
+    dcm.wait(10)
+    book = dcm.get_depth_cache()
+    book.get_best_bid(), book.get_best_ask(), book.get_bids()[:5]
+
+校验与重新同步：
+* 每条增量带 seqNum 和 prevSeqNum，prevSeqNum 必须等于上一条的 seqNum，
+  否则说明漏了推送（断线重连、队列丢弃），重新获取快照
+* 火币现货增量深度不提供 checksum，改为检查买一价低于卖一价，盘口交叉时
+  同样重新获取快照
+* 快照通过 websocket req 获取，带有与增量对齐的 seqNum；超过 snapshot_timeout
+  没有收到时在单独的线程中请求 REST /market/depth（不占用分发线程）。REST
+  快照没有 seqNum，请求发出前缓存的增量早于快照，直接丢弃，之后的增量继续
+  维护，此时 synced 为 False，并立即重新请求对齐的快照，收到后替换
+"""
+
+import threading
+import time
+
+from ..binance.depthcache import DepthCache
+from .API import HuobiAPI
+from .websockets import HuobiSocketManager
+
+
+class DepthCacheManager:
+    """维护单个交易对的火币增量深度"""
+
+    _default_refresh = 60 * 30  # 30 分钟
+
+    def __init__(self, symbol, callback=None, levels=150, manager=None,
+                 refresh_interval=_default_refresh, snapshot_timeout=5):
+        """
+        :param symbol: 交易对，如 ethusdt
+        :param callback: 每次盘口更新后调用 callback(depth_cache)
+        :param levels: 增量深度档数，5 / 20 / 150（400 档需要 wss://api.huobi.pro/feed）
+        :param manager: HuobiSocketManager，默认新建一个
+        :param refresh_interval: 定期重新获取快照的间隔（秒），0 或 None 表示不刷新
+        :param snapshot_timeout: 等待 websocket 快照的时间（秒），超时后使用 REST 快照
+        """
+        self._symbol = symbol.lower()
+        self._callback = callback
+        self._topic = 'market.%s.mbp.%d' % (self._symbol, levels)
+        self._depth_cache = DepthCache(self._symbol)
+        self._refresh_interval = refresh_interval
+        self._refresh_time = None
+        self._snapshot_timeout = snapshot_timeout
+        self._last_seq = None
+        self._buffer = []
+        self._requested = None      # 发送快照请求的时间，None 表示还未发出
+        self._ready = threading.Event()
+        # REST 快照在单独的线程中获取，与分发线程共用以下状态
+        self._lock = threading.RLock()
+        self._epoch = 0             # 每次重新同步加一，丢弃过期的 REST 结果
+        self._fetching = False
+        self.synced = False         # 盘口是否由与增量对齐的快照建立
+        self.resyncs = 0
+        self._own_manager = manager is None
+        self._manager = manager or HuobiSocketManager()
+        self._manager.subscribe([self._topic], self._on_message)
+        self._send_request()
+
+    def _request_snapshot(self):
+        """丢弃当前盘口，缓存增量直到快照到达"""
+        self._last_seq = None
+        self._buffer = []
+        self.synced = False
+        self._epoch += 1
+        self._send_request()
+
+    def _send_request(self):
+        # 连接尚未建立时 req 不会发送，收到下一条增量时再发
+        self._requested = time.time() if self._manager.request(self._topic) else None
+
+    def _on_message(self, msg):
+        with self._lock:
+            if 'rep' in msg:
+                if self._last_seq is None or not self.synced:
+                    self._init_cache(msg['data'], aligned=True)
+                return
+            tick = msg['tick']
+            if self._last_seq is None:
+                # 等待快照，增量先缓存
+                self._buffer.append(tick)
+                if self._requested is None:
+                    self._send_request()
+                elif time.time() - self._requested > self._snapshot_timeout and not self._fetching:
+                    self._fetching = True
+                    threading.Thread(target=self._rest_snapshot, args=(self._epoch, len(self._buffer)),
+                                     daemon=True, name='Huobi depth ' + self._symbol).start()
+                return
+            if self._process_depth_message(tick) and not self.synced:
+                # 盘口来自 REST 快照，等待对齐的快照期间增量同时缓存，用于替换
+                self._buffer.append(tick)
+                del self._buffer[:-self._max_buffer]
+                if self._requested is None or time.time() - self._requested > self._snapshot_timeout:
+                    self._send_request()
+
+    _max_buffer = 1000
+
+    def _rest_snapshot(self, epoch, cutoff):
+        """websocket 快照超时，用 REST 深度建立盘口，在单独的线程中运行
+
+        :param epoch: 发起请求时的同步轮次，期间重新同步过则丢弃结果
+        :param cutoff: 发起请求时已缓存的增量条数，这些增量早于 REST 快照
+        """
+        try:
+            res = HuobiAPI.get_depth(self._symbol, 'step0')
+        except Exception as e:
+            print('Huobi %s REST 深度获取失败：%r' % (self._symbol, e))
+            res = None
+        with self._lock:
+            self._fetching = False
+            if epoch != self._epoch or self._last_seq is not None:
+                # 等待期间已经收到 websocket 快照
+                return
+            if not res or res.get('status') != 'ok':
+                self._send_request()
+                return
+            del self._buffer[:cutoff]
+            self._init_cache(res['tick'], aligned=False)
+
+    def _init_cache(self, snapshot, aligned):
+        """用快照重建盘口，再应用缓存的增量
+
+        :param snapshot: 含 bids / asks，websocket 快照还有 seqNum
+        :param aligned: 快照是否带有与增量对齐的 seqNum
+        """
+        buffer, self._buffer = self._buffer, []
+        self._requested = None
+        self._depth_cache.clear()
+        for bid in snapshot['bids']:
+            self._depth_cache.add_bid(bid)
+        for ask in snapshot['asks']:
+            self._depth_cache.add_ask(ask)
+        if self._refresh_interval:
+            self._refresh_time = time.time() + self._refresh_interval
+        self.resyncs += 1
+
+        if aligned:
+            self.synced = True
+            self._last_seq = snapshot['seqNum']
+            buffer = [tick for tick in buffer if tick['seqNum'] > self._last_seq]
+            if buffer and buffer[0]['prevSeqNum'] > self._last_seq:
+                # 快照早于缓存的第一条增量，中间有缺口
+                self._request_snapshot()
+                return
+            if buffer:
+                # 第一条增量跨过快照位置，之后按 prevSeqNum 逐条校验
+                self._last_seq = buffer[0]['prevSeqNum']
+        elif buffer:
+            # REST 快照无法与增量对齐，从快照之后缓存的第一条增量开始继续维护
+            self._last_seq = buffer[0]['prevSeqNum']
+        else:
+            self._last_seq = 0
+        for i, tick in enumerate(buffer):
+            if not self._process_depth_message(tick):
+                # 重新等待快照，剩余的增量继续缓存
+                self._buffer.extend(buffer[i + 1:])
+                return
+        if not aligned and self._last_seq is not None:
+            # 立即请求对齐的快照，不等到 refresh_interval；缓存的增量留给它使用
+            self._buffer = buffer[-self._max_buffer:]
+            self._send_request()
+        self._ready.set()
+        if not buffer and self._callback:
+            self._callback(self._depth_cache)
+
+    def _process_depth_message(self, tick):
+        """应用一条增量
+
+        :return: 是否已应用，发现缺口或盘口交叉时重新请求快照并返回 False
+        """
+        if self._last_seq == 0:
+            # REST 快照之后收到的第一条增量
+            self._last_seq = tick['prevSeqNum']
+        if tick['seqNum'] <= self._last_seq:
+            # 重复或早于快照的增量
+            return True
+        if tick['prevSeqNum'] != self._last_seq:
+            print('Huobi %s 增量深度缺口：%s -> %s' % (self._symbol, self._last_seq, tick['prevSeqNum']))
+            self._request_snapshot()
+            self._buffer.append(tick)
+            return False
+
+        for bid in tick.get('bids') or ():
+            self._depth_cache.add_bid(bid)
+        for ask in tick.get('asks') or ():
+            self._depth_cache.add_ask(ask)
+        self._last_seq = tick['seqNum']
+
+        bid, ask = self._depth_cache.get_best_bid(), self._depth_cache.get_best_ask()
+        if bid is not None and ask is not None and bid[0] >= ask[0]:
+            print('Huobi %s 盘口交叉：%s >= %s' % (self._symbol, bid[0], ask[0]))
+            self._request_snapshot()
+            return False
+
+        self._ready.set()
+        if self._callback:
+            self._callback(self._depth_cache)
+
+        if self._refresh_time and time.time() > self._refresh_time:
+            self._request_snapshot()
+        return True
+
+    def wait(self, timeout=None):
+        """等待盘口建立
+
+        :return: 盘口是否已建立
+        """
+        return self._ready.wait(timeout)
+
+    def get_depth_cache(self):
+        """当前的 DepthCache"""
+        return self._depth_cache
+
+    def close(self):
+        """取消订阅，管理器由本对象创建时一并关闭"""
+        if self._own_manager:
+            self._manager.close()
+        else:
+            self._manager.stop_socket(self._topic)
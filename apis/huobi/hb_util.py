@@ -5,13 +5,14 @@
 ===============================================================================
 """
 
-import base64
-import hmac
-import hashlib
 import json
+import time
 import urllib
 import requests
-from datetime import datetime
+
+from ..signing import get_signer, canonical_keys, encode_params
+from ..timesync import TimeSync
+from ..metrics import record_request, endpoint_of
 
 # 基础设置
 TIMEOUT = 10
@@ -35,6 +36,14 @@ DEFAULT_POST_HEADERS = {
 }
 
 
+def _server_timestamp():
+    return http_get_request(MARKET_URL + '/v1/common/timestamp', {})['data']
+
+
+# 服务器时间偏差跟踪，签名请求的 Timestamp 使用校正后的时间，由 HuobiAPI 启动后台同步
+TIME_SYNC = TimeSync(_server_timestamp, name='Huobi')
+
+
 # 各种请求,获取数据方式
 def http_get_request(url, params, add_to_headers=None):
     headers = {
@@ -44,14 +53,20 @@ def http_get_request(url, params, add_to_headers=None):
     if add_to_headers:
         headers.update(add_to_headers)
     postdata = urllib.parse.urlencode(params)
+    t0 = time.perf_counter()
     try:
         response = requests.get(
             url, postdata, headers=headers, timeout=TIMEOUT)
         if response.status_code == 200:
-            return response.json()
+            t1 = time.perf_counter()
+            data = response.json()
+            _record(url, t0, t1, response, 'ok')
+            return data
         else:
+            _record(url, t0, time.perf_counter(), response, 'error')
             return {"status": "fail"}
     except Exception as e:
+        _record(url, t0, time.perf_counter(), None, 'error')
         print("httpGet failed, detail is: %s" % e)
         return {"status": "fail", "msg": e}
 
@@ -66,21 +81,36 @@ def http_post_request(url, params, add_to_headers=None):
     if add_to_headers:
         headers.update(add_to_headers)
     postdata = json.dumps(params)
+    t0 = time.perf_counter()
     try:
         response = requests.post(
             url, postdata, headers=headers, timeout=TIMEOUT)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return response.json()
+        t1 = time.perf_counter()
+        data = response.json()
+        _record(url, t0, t1, response,
+                'ok' if response.status_code == 200 else 'error')
+        return data
     except Exception as e:
+        _record(url, t0, time.perf_counter(), None, 'error')
         print("httpPost failed, detail is:%s" % e)
         return {"status": "fail", "msg": e}
 
 
+def _record(url, t0, t1, response, result):
+    """记录请求耗时，t1 为收到完整响应体的时间，之后的时间计入 JSON 解析"""
+    t2 = time.perf_counter()
+    if response is None:
+        record_request('Huobi', endpoint_of(url), (t2 - t0) * 1000, result)
+        return
+    server = response.elapsed.total_seconds() * 1000
+    record_request('Huobi', endpoint_of(url), (t2 - t0) * 1000, result,
+                   server=server, read=max((t1 - t0) * 1000 - server, 0.0),
+                   parse=(t2 - t1) * 1000)
+
+
 def api_key_get(params, request_path, ACCESS_KEY, SECRET_KEY):
     method = 'GET'
-    timestamp = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+    timestamp = TIME_SYNC.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
     params.update({'AccessKeyId': ACCESS_KEY,
                    'SignatureMethod': 'HmacSHA256',
                    'SignatureVersion': '2',
@@ -98,7 +128,7 @@ def api_key_get(params, request_path, ACCESS_KEY, SECRET_KEY):
 
 def api_key_post(params, request_path, ACCESS_KEY, SECRET_KEY):
     method = 'POST'
-    timestamp = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+    timestamp = TIME_SYNC.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
     params_to_sign = {'AccessKeyId': ACCESS_KEY,
                       'SignatureMethod': 'HmacSHA256',
                       'SignatureVersion': '2',
@@ -116,14 +146,6 @@ def api_key_post(params, request_path, ACCESS_KEY, SECRET_KEY):
 
 def createSign(pParams, method, host_url, request_path, secret_key):
     """创建signature"""
-    sorted_params = sorted(list(pParams.items()),
-                           key=lambda x: x[0], reverse=False)
-    encode_params = urllib.parse.urlencode(sorted_params)
-    payload = [method, host_url, request_path, encode_params]
-    payload = '\n'.join(payload)
-    payload = payload.encode(encoding='UTF8')
-    secret_key = secret_key.encode(encoding='UTF8')
-    digest = hmac.new(secret_key, payload, digestmod=hashlib.sha256).digest()
-    signature = base64.b64encode(digest)
-    signature = signature.decode()
-    return signature
+    encode_params_ = encode_params(pParams, canonical_keys(pParams), quote=True)
+    payload = '\n'.join([method, host_url, request_path, encode_params_])
+    return get_signer(secret_key).b64digest(payload)
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+火币网 websocket 行情订阅
+https://github.com/huobiapi/API_Docs/wiki/WS_api_reference
+===============================================================================
+一条火币 websocket 连接可以订阅多个 topic，HuobiSocketManager 把 topic 分配到
+若干条连接（每条最多 topics_per_connection 个），所有连接运行在共享的
+websocket 事件循环上：
+
+    manager = HuobiSocketManager()
+    manager.subscribe(['market.ethusdt.depth.step0', 'market.btcusdt.depth.step0'], on_depth)
+    manager.start_trade_socket('ethusdt', on_trade)
+    manager.start_kline_socket('ethusdt', on_kline, '1min')
+    ...
+    manager.rates()         # 各 topic 最近的消息速率（条/秒）
+    manager.close()
+
+* 推送为 gzip 压缩的二进制帧，解压后按 ch 交给对应 topic 的回调
+* 服务器每 5 秒发送 {"ping": ts}，由管理器回复 {"pong": ts}；超过 idle_timeout
+  没有收到任何消息（包括 ping）视为连接已死，断开重连
+* 每次（重）连接成功后重新订阅该连接上的全部 topic
+* 订阅失败只影响对应 topic，打印错误后继续接收其他 topic
+* trade.detail 推送经过 TradeGapFiller 去重，重连后用 get_hist_trade 补齐缺失的成交
+
+回调与 BinanceSocketManager 相同，默认经过共享 Dispatcher 的有界队列调用，
+不在网络线程中执行。
+"""
+
+import gzip
+import itertools
+import json
+import math
+import threading
+import time
+
+from ..metrics import record_message
+from ..feed_latency import FeedLatency
+from ..wsengine import shared_engine
+from ..backfill import TradeGapFiller
+from ..dispatch import shared_dispatcher, DROP_OLDEST, CONFLATE
+from .hb_util import TIME_SYNC
+from .API import HuobiAPI
+
+
+class TopicRate:
+    """单个 topic 的消息速率，按指数衰减计算最近约 window 秒的平均值"""
+
+    __slots__ = ('messages', 'window', '_rate', '_first', '_last')
+
+    def __init__(self, window=10.0):
+        self.messages = 0
+        self.window = window
+        self._rate = 0.0
+        self._first = None
+        self._last = None
+
+    def hit(self, now):
+        if self._last is None:
+            self._first = now
+        else:
+            self._rate *= math.exp(-(now - self._last) / self.window)
+        self._rate += 1.0 / self.window
+        self._last = now
+        self.messages += 1
+
+    def rate(self, now=None):
+        """条/秒"""
+        if self._last is None:
+            return 0.0
+        now = time.time() if now is None else now
+        rate = self._rate * math.exp(-max(now - self._last, 0.0) / self.window)
+        # 订阅后的前几个 window 内按已经过的时间修正，避免低估
+        warmup = 1 - math.exp(-(now - self._first) / self.window)
+        return rate / warmup if warmup > 1e-3 else rate
+
+
+class _Pool:
+    """一条连接及分配到该连接上的 topic"""
+
+    def __init__(self, index):
+        self.name = 'Huobi pool-%d' % index
+        self.topics = set()
+        self.conn = None
+
+
+class HuobiSocketManager:
+    """火币 websocket 行情订阅管理，多个 topic 共用连接"""
+
+    STREAM_URL = 'wss://api.huobi.pro/ws'
+
+    def __init__(self, client=None, topics_per_connection=50, engine=None, dispatcher=None,
+                 idle_timeout=30, url=None):
+        """
+        :param client: HuobiAPI，使用其 time_sync 计算行情延迟，None 时使用 TIME_SYNC
+        :param topics_per_connection: 每条连接最多订阅的 topic 数
+        :param engine: WebSocketEngine，默认使用共享的事件循环
+        :param dispatcher: Dispatcher，默认使用共享的 Dispatcher，False 表示在网络线程中直接回调
+        :param idle_timeout: 超过该时间（秒）没有收到消息时重连
+        :param url: websocket 地址，默认 STREAM_URL，mbp.400 等数据需要使用 wss://api.huobi.pro/feed
+        """
+        self.url = url or self.STREAM_URL
+        self.topics_per_connection = topics_per_connection
+        self.idle_timeout = idle_timeout
+        self._engine = engine or shared_engine()
+        self._dispatcher = shared_dispatcher() if dispatcher is None else dispatcher
+        self._callbacks = {}
+        self._queues = {}
+        self._pool_of = {}
+        self._pools = []
+        self._index = 0
+        self._rates = {}
+        self._request_id = itertools.count(1)
+        # trade.detail 的去重与补数，键为 topic
+        self.fillers = {}
+        self._lock = threading.RLock()
+        self.latency = FeedLatency('Huobi', getattr(client, 'time_sync', None) or TIME_SYNC)
+
+    @property
+    def topics(self):
+        return list(self._callbacks)
+
+    # ------------------------------------------------------------ 订阅
+    def subscribe(self, topics, callback, backfill=True):
+        """订阅 topic
+
+        :param topics: topic 列表，如 market.ethusdt.depth.step0、market.ethusdt.kline.1min
+        :param callback: 回调，参数为解压后的推送 dict（含 ch / ts / tick）；
+                         trade.detail 每条成交单独回调一次，tick.data 中只有这一条成交
+        :param backfill: trade.detail 重连后是否从 REST 补齐缺失的成交
+        :return: 新订阅的 topic 列表
+        """
+        added = []
+        with self._lock:
+            for topic in topics:
+                if topic in self._callbacks:
+                    self._unqueue(topic)
+                else:
+                    pool = self._pool_with_room()
+                    pool.topics.add(topic)
+                    self._pool_of[topic] = pool
+                    self._rates[topic] = TopicRate()
+                    added.append(topic)
+                self._callbacks[topic] = self._handler(topic, callback, backfill)
+            for pool in {self._pool_of[topic] for topic in added}:
+                if pool.conn is None:
+                    self._connect(pool)
+                elif pool.conn.connected:
+                    for topic in added:
+                        if self._pool_of[topic] is pool:
+                            self._send(pool, {"sub": topic, "id": topic})
+        return added
+
+    def unsubscribe(self, topics):
+        """取消订阅，没有 topic 的连接会被关闭"""
+        with self._lock:
+            for topic in topics:
+                self._callbacks.pop(topic, None)
+                self._rates.pop(topic, None)
+                self.fillers.pop(topic, None)
+                self._unqueue(topic)
+                pool = self._pool_of.pop(topic, None)
+                if pool is None:
+                    continue
+                pool.topics.discard(topic)
+                if not pool.topics:
+                    self._close_pool(pool)
+                elif pool.conn is not None and pool.conn.connected:
+                    self._send(pool, {"unsub": topic, "id": topic})
+
+    def start_depth_socket(self, symbol, callback, step='step0'):
+        """订阅深度 market.$symbol.depth.$step，每次推送为完整的 150 档深度
+
+        :param step: step0 不合并，step1 - step5 为不同精度的合并深度
+        :return: topic，已订阅时返回 False
+        """
+        return self._start('market.%s.depth.%s' % (symbol.lower(), step), callback)
+
+    def start_kline_socket(self, symbol, callback, period='1min'):
+        """订阅 K 线 market.$symbol.kline.$period
+
+        :param period: 1min, 5min, 15min, 30min, 60min, 1day, 1mon, 1week, 1year
+        :return: topic，已订阅时返回 False
+        """
+        return self._start('market.%s.kline.%s' % (symbol.lower(), period), callback)
+
+    def start_trade_socket(self, symbol, callback, backfill=True):
+        """订阅成交 market.$symbol.trade.detail，成交按 id 递增、不重复地回调
+
+        :param backfill: 重连后是否用 get_hist_trade 补齐缺失的成交
+        :return: topic，已订阅时返回 False
+        """
+        return self._start('market.%s.trade.detail' % symbol.lower(), callback, backfill)
+
+    def start_detail_socket(self, symbol, callback):
+        """订阅 24 小时行情 market.$symbol.detail
+
+        :return: topic，已订阅时返回 False
+        """
+        return self._start('market.%s.detail' % symbol.lower(), callback)
+
+    def request(self, topic):
+        """在 topic 所在的连接上请求一次全量数据（req），如 mbp 深度快照
+
+        回复 {"rep": topic, "data": ...} 与推送一样交给该 topic 的回调，并与推送
+        在同一队列中按顺序处理。请求失败只打印错误，调用方需要自行处理超时。
+
+        :return: 是否已发送，topic 未订阅或连接尚未建立时返回 False
+        """
+        with self._lock:
+            pool = self._pool_of.get(topic)
+            if pool is None or pool.conn is None or not pool.conn.connected:
+                return False
+            self._send(pool, {"req": topic, "id": 'req-%d' % next(self._request_id)})
+            return True
+
+    def stop_socket(self, topic):
+        """取消订阅一个 topic"""
+        self.unsubscribe([topic])
+
+    def start(self):
+        """确保共享的事件循环已启动，订阅时会自动启动"""
+        self._engine.start()
+
+    def close(self):
+        """关闭全部连接，共享的事件循环继续运行"""
+        with self._lock:
+            for pool in list(self._pools):
+                self._close_pool(pool)
+            for topic in list(self._queues):
+                self._unqueue(topic)
+            self._callbacks = {}
+            self._pool_of = {}
+            self._rates = {}
+            self.fillers = {}
+
+    # ------------------------------------------------------------ 统计
+    def rates(self):
+        """各 topic 最近的消息速率（条/秒）"""
+        now = time.time()
+        return {topic: rate.rate(now) for topic, rate in list(self._rates.items())}
+
+    def stats(self):
+        """各连接的状态
+
+        :return: list of dict，name / topics / connected / connects / messages
+        """
+        with self._lock:
+            return [{"name": pool.name,
+                     "topics": len(pool.topics),
+                     "connected": bool(pool.conn and pool.conn.connected),
+                     "connects": pool.conn.connects if pool.conn else 0,
+                     "messages": pool.conn.messages if pool.conn else 0}
+                    for pool in self._pools]
+
+    # ------------------------------------------------------------ 内部
+    def _start(self, topic, callback, backfill=True):
+        if topic in self._callbacks:
+            return False
+        self.subscribe([topic], callback, backfill)
+        return topic
+
+    @staticmethod
+    def dispatch_policy(topic):
+        """队列策略：成交和增量深度丢弃最旧的消息，其余（快照类）只保留最新一条"""
+        if topic.endswith('.trade.detail') or ('.mbp.' in topic and '.refresh.' not in topic):
+            return DROP_OLDEST
+        return CONFLATE
+
+    def _queued(self, topic, callback):
+        """返回 deliver(msg, received=None)，回调返回后（在调用回调的线程中）记录处理延迟"""
+        latency = self.latency
+
+        def handled(msg, received):
+            latency.on_handled(topic, received)
+
+        if not self._dispatcher:
+            def deliver(msg, received=None):
+                callback(msg)
+                if received is not None:
+                    handled(msg, received)
+            return deliver
+        queue = self._dispatcher.queue('Huobi ' + topic, callback, self.dispatch_policy(topic),
+                                       on_handled=handled)
+        self._queues[topic] = queue
+        return queue.put
+
+    def _unqueue(self, topic):
+        queue = self._queues.pop(topic, None)
+        if queue is not None:
+            queue.close()
+
+    def _handler(self, topic, callback, backfill):
+        """topic 收到推送时调用的函数"""
+        deliver = self._queued(topic, callback)
+        if not topic.endswith('.trade.detail'):
+            return deliver
+
+        symbol = topic.split('.')[1]
+
+        def fetch(after_id):
+            res = HuobiAPI.get_hist_trade(symbol, 2000)
+            trades = [t for batch in res.get('data') or [] for t in batch['data']]
+            return sorted((t for t in trades if t['id'] > after_id), key=lambda t: t['id'])
+
+        received = None
+
+        def on_trade(trade):
+            deliver({"ch": topic, "ts": trade['ts'],
+                     "tick": {"id": trade['id'], "ts": trade['ts'], "data": [trade]}}, received)
+
+        filler = self.fillers.get(topic)
+        if filler is None:
+            filler = self.fillers[topic] = TradeGapFiller(
+                on_trade, fetch if backfill else None, lambda t: t['id'],
+                contiguous=False, name='Huobi ' + topic)
+        else:
+            filler.callback = on_trade
+            filler.fetch = fetch if backfill else None
+
+        def on_message(msg, received_at=None):
+            nonlocal received
+            # 补齐的成交与触发补齐的推送一起计算延迟
+            received = received_at
+            # 同一推送中的成交 id 可能乱序
+            for trade in sorted(msg['tick']['data'], key=lambda t: t['id']):
+                filler.on_event(trade)
+
+        return on_message
+
+    def _pool_with_room(self):
+        open_pools = [p for p in self._pools if len(p.topics) < self.topics_per_connection]
+        if open_pools:
+            return min(open_pools, key=lambda p: len(p.topics))
+        pool = _Pool(self._index)
+        self._index += 1
+        self._pools.append(pool)
+        return pool
+
+    def _connect(self, pool):
+        pool.conn = self._engine.connect(
+            self.url, self._message_handler(pool),
+            on_open=lambda conn, pool=pool: self._on_open(pool),
+            name=pool.name, idle_timeout=self.idle_timeout)
+
+    def _close_pool(self, pool):
+        if pool.conn is not None:
+            pool.conn.close()
+            pool.conn = None
+        if pool in self._pools:
+            self._pools.remove(pool)
+
+    def _on_open(self, pool):
+        """（重）连接成功，订阅该连接上的全部 topic"""
+        with self._lock:
+            topics = sorted(pool.topics)
+            for topic in topics:
+                filler = self.fillers.get(topic)
+                if filler is not None:
+                    # 下一条成交推送之前可能有缺口
+                    filler.reconnected()
+                self._send(pool, {"sub": topic, "id": topic})
+
+    def _send(self, pool, message):
+        if pool.conn is not None:
+            pool.conn.send(json.dumps(message))
+
+    def _message_handler(self, pool):
+        """解压推送、回复 ping、记录指标和收到延迟，再按 ch 调用 callback(msg, received)"""
+        latency = self.latency
+
+        def on_message(payload):
+            received = time.time()
+            size = len(payload)
+            try:
+                if isinstance(payload, bytes):
+                    payload = gzip.decompress(payload)
+                msg = json.loads(payload)
+            except (OSError, EOFError, ValueError):
+                record_message('Huobi', 'ws', size, error=True)
+                return
+            ch = msg.get('ch')
+            if ch is None:
+                if msg.get('status', 'ok') == 'ok' and 'rep' in msg:
+                    # req 的回复，交给对应 topic 的回调
+                    ch = msg['rep']
+                else:
+                    record_message('Huobi', 'ws', size)
+                    if 'ping' in msg:
+                        self._send(pool, {"pong": msg['ping']})
+                    elif msg.get('status', 'ok') != 'ok':
+                        # 订阅或请求失败只影响该 topic
+                        print('%s %s 失败：%s' % (pool.name, msg.get('id'), msg.get('err-msg')))
+                    return
+            record_message('Huobi', ch, size)
+            rate = self._rates.get(ch)
+            if rate is not None:
+                rate.hit(received)
+            callback = self._callbacks.get(ch)
+            if callback is None:
+                return
+            latency.on_receive(ch, msg.get('ts'), received)
+            callback(msg, received)
+
+        return on_message
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+请求延迟与消息统计
+==============================================================
+进程内的轻量指标：REST 请求按 (交易所, 接口, 阶段) 记录延迟直方图，
+websocket 按 (交易所, 数据流) 记录消息数、字节数和错误数。
+
+记录一次事件只是一次二分查找加几次整数累加，不做任何 I/O；
+snapshot() 返回可直接序列化为 JSON 的字典，render_prometheus()
+输出 Prometheus 文本格式，可挂到任意 HTTP 服务上供采集。
+
+REST 延迟的阶段（phase）：
+    connect  DNS + TCP + TLS 建连（仅 http.client 实现的接口可单独统计）
+    server   发出请求到收到响应头
+    read     读取响应体
+    parse    JSON 解析
+    total    整个请求的耗时
+"""
+
+import re
+import threading
+from bisect import bisect_left
+
+# 毫秒延迟的默认分桶上界
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+                   1000, 2500, 5000, 10000, 30000, 60000)
+
+# 订单id、账户id等长数字路径段，避免接口标签随id无限增长
+_ID_RE = re.compile(r'/\d{4,}(?=/|$)')
+
+
+def endpoint_of(url):
+    """从 url 中取出接口路径，去掉 host、查询参数，数字 id 替换为 {id}"""
+    start = url.find('/', url.find('//') + 2) if '//' in url else 0
+    end = url.find('?', start)
+    path = url[start:end] if end >= 0 else url[start:]
+    return _ID_RE.sub('/{id}', path) if path else '/'
+
+
+class Histogram:
+    """单个标签组合的直方图"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def copy(self):
+        h = Histogram(self.bounds)
+        h.counts = list(self.counts)
+        h.count, h.sum, h.max = self.count, self.sum, self.max
+        return h
+
+    def percentile(self, q):
+        """按分桶线性插值估计分位数，q 取 0~1"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                upper = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+            if i < len(self.bounds):
+                lower = self.bounds[i]
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "mean": self.sum / self.count if self.count else None,
+                "p50": self.percentile(0.5), "p90": self.percentile(0.9),
+                "p99": self.percentile(0.99)}
+
+
+class HistogramFamily:
+    """同名直方图，按标签值元组区分"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, labels, buckets=LATENCY_BUCKETS, doc=''):
+        self.name = name
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.doc = doc
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def child(self, key):
+        h = self._children.get(key)
+        if h is None:
+            with self._lock:
+                h = self._children.setdefault(key, Histogram(self.buckets))
+        return h
+
+    def observe(self, key, value):
+        """
+        :param key: 标签值元组，与 labels 一一对应
+        :param value: 观测值
+        """
+        h = self._children.get(key)
+        if h is None:
+            h = self.child(key)
+        # 事件循环、分发线程和 REST 线程会同时写入
+        with self._lock:
+            h.observe(value)
+
+    def items(self):
+        """(标签值元组, Histogram 拷贝) 列表，拷贝在锁内完成，各分桶计数一致"""
+        with self._lock:
+            return [(key, h.copy()) for key, h in self._children.items()]
+
+    def clear(self):
+        with self._lock:
+            self._children.clear()
+
+
+class CounterFamily:
+    """同名计数器，按标签值元组区分"""
+
+    kind = 'counter'
+
+    def __init__(self, name, labels, doc=''):
+        self.name = name
+        self.labels = tuple(labels)
+        self.doc = doc
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount=1):
+        # 读-改-写需要加锁，否则多个线程同时计数会丢失
+        with self._lock:
+            values = self._values
+            values[key] = values.get(key, 0) + amount
+
+    def get(self, key):
+        return self._values.get(key, 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class GaugeFamily(CounterFamily):
+    """同名的瞬时值（如队列长度），按标签值元组区分"""
+
+    kind = 'gauge'
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name, factory):
+        family = self._families.get(name)
+        if family is None:
+            with self._lock:
+                family = self._families.get(name)
+                if family is None:
+                    family = self._families[name] = factory()
+        return family
+
+    def histogram(self, name, labels, buckets=LATENCY_BUCKETS, doc=''):
+        return self._family(name, lambda: HistogramFamily(name, labels, buckets, doc))
+
+    def counter(self, name, labels, doc=''):
+        return self._family(name, lambda: CounterFamily(name, labels, doc))
+
+    def gauge(self, name, labels, doc=''):
+        return self._family(name, lambda: GaugeFamily(name, labels, doc))
+
+    def get(self, name):
+        return self._families.get(name)
+
+    def reset(self):
+        for family in self._families.values():
+            family.clear()
+
+    def snapshot(self):
+        """当前所有指标
+
+        :return:
+            {
+            指标名: [{"labels": {标签: 值}, "value": 计数} 或
+                     {"labels": {...}, "count":.., "sum":.., "max":.., "mean":.., "p50":.., "p90":.., "p99":..},
+                     ...],
+            ...
+            }
+        """
+        data = {}
+        for name, family in list(self._families.items()):
+            rows = []
+            for key, value in family.items():
+                row = {"labels": dict(zip(family.labels, key))}
+                if family.kind == 'histogram':
+                    row.update(value.to_dict())
+                else:
+                    row["value"] = value
+                rows.append(row)
+            data[name] = rows
+        return data
+
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        for name, family in list(self._families.items()):
+            if family.doc:
+                lines.append('# HELP %s %s' % (name, family.doc))
+            lines.append('# TYPE %s %s' % (name, family.kind))
+            for key, value in family.items():
+                labels = ','.join('%s="%s"' % (k, _escape(v))
+                                  for k, v in zip(family.labels, key))
+                if family.kind != 'histogram':
+                    lines.append('%s{%s} %s' % (name, labels, value))
+                    continue
+                sep = ',' if labels else ''
+                cumulative = 0
+                for bound, count in zip(value.bounds, value.counts):
+                    cumulative += count
+                    lines.append('%s_bucket{%s%sle="%s"} %d' % (name, labels, sep, bound, cumulative))
+                lines.append('%s_bucket{%s%sle="+Inf"} %d' % (name, labels, sep, value.count))
+                lines.append('%s_sum{%s} %s' % (name, labels, value.sum))
+                lines.append('%s_count{%s} %d' % (name, labels, value.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    'coins_api_http_request_ms', ('exchange', 'endpoint', 'phase'),
+    doc='REST request latency in milliseconds')
+HTTP_REQUESTS = REGISTRY.counter(
+    'coins_api_http_requests_total', ('exchange', 'endpoint', 'result'),
+    doc='REST requests by result (ok / error)')
+WS_MESSAGES = REGISTRY.counter(
+    'coins_api_ws_messages_total', ('exchange', 'stream'),
+    doc='Websocket messages received')
+WS_BYTES = REGISTRY.counter(
+    'coins_api_ws_bytes_total', ('exchange', 'stream'),
+    doc='Websocket payload bytes received')
+WS_ERRORS = REGISTRY.counter(
+    'coins_api_ws_errors_total', ('exchange', 'stream'),
+    doc='Websocket messages that failed to decode')
+
+
+def record_request(exchange, endpoint, total, result='ok', **phases):
+    """记录一次 REST 请求
+
+    :param exchange: 交易所名称
+    :param endpoint: 接口路径，见 endpoint_of
+    :param total: 总耗时（毫秒）
+    :param result: ok / error
+    :param phases: 各阶段耗时（毫秒），如 server=12.3, parse=0.2
+    """
+    HTTP_LATENCY.observe((exchange, endpoint, 'total'), total)
+    for phase, value in phases.items():
+        if value is not None:
+            HTTP_LATENCY.observe((exchange, endpoint, phase), value)
+    HTTP_REQUESTS.inc((exchange, endpoint, result))
+
+
+def record_message(exchange, stream, size, error=False):
+    """记录一条 websocket 消息"""
+    key = (exchange, stream)
+    WS_MESSAGES.inc(key)
+    WS_BYTES.inc(key, size)
+    if error:
+        WS_ERRORS.inc(key)
+
+
+snapshot = REGISTRY.snapshot
+render_prometheus = REGISTRY.render_prometheus
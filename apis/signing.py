@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+请求签名工具
+==============================================================
+各交易所签名方式不同，但热点路径相同：参数按 key 排序、拼接成字符串、
+做一次 HMAC。这里把三件事做成可复用的部件：
+
+    canonical_keys  同一接口每次请求的参数 key 集合相同，排序结果按 key
+                    元组缓存，之后每次请求只是一次字典查找；
+    encode_params   单次 join 完成参数编码，不做逐段字符串拼接；
+    HmacSigner      用密钥初始化一次 hmac 对象，每次签名只 copy() 后 update，
+                    省去每次重新计算密钥填充块。
+"""
+
+import base64
+import hashlib
+import hmac
+import re
+from functools import lru_cache
+from urllib.parse import quote_plus
+
+# quote_plus 不转义的字符，只含这些字符的值原样输出
+_is_safe = re.compile(r'[A-Za-z0-9_.~-]*\Z').match
+
+
+@lru_cache(maxsize=1024)
+def _sorted_keys(keys):
+    return tuple(sorted(keys))
+
+
+@lru_cache(maxsize=1024)
+def _quote_key(key):
+    return quote_plus(str(key))
+
+
+def _quote(value):
+    value = str(value)
+    return value if _is_safe(value) else quote_plus(value)
+
+
+def canonical_keys(params):
+    """参数 key 的排序结果，按 key 元组缓存
+
+    :param params: dict 或 key 的可迭代对象
+    :return: 排序后的 key 元组
+    """
+    return _sorted_keys(tuple(params))
+
+
+def encode_params(params, keys=None, quote=False):
+    """把参数编码为 k1=v1&k2=v2 形式的字符串
+
+    :param params: 参数字典
+    :param keys: key 顺序，默认按 params 的插入顺序
+    :param quote: 是否按 urllib.parse.urlencode 的规则转义 key 和 value
+    """
+    if keys is None:
+        keys = params
+    if quote:
+        return '&'.join([_quote_key(k) + '=' + _quote(params[k]) for k in keys])
+    return '&'.join([k + '=' + str(params[k]) for k in keys])
+
+
+class HmacSigner:
+    """复用密钥初始化结果的 HMAC 签名器，线程安全"""
+
+    __slots__ = ('_base',)
+
+    def __init__(self, secret, digestmod=hashlib.sha256):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        self._base = hmac.new(secret, digestmod=digestmod)
+
+    def _mac(self, msg):
+        if isinstance(msg, str):
+            msg = msg.encode('utf-8')
+        mac = self._base.copy()
+        mac.update(msg)
+        return mac
+
+    def digest(self, msg):
+        return self._mac(msg).digest()
+
+    def hexdigest(self, msg):
+        return self._mac(msg).hexdigest()
+
+    def b64digest(self, msg):
+        """base64 编码的签名字符串"""
+        return base64.b64encode(self._mac(msg).digest()).decode()
+
+
+@lru_cache(maxsize=64)
+def get_signer(secret, digestmod=hashlib.sha256):
+    """按 (密钥, 算法) 缓存的 HmacSigner，供以函数形式签名的模块使用"""
+    return HmacSigner(secret, digestmod)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+服务器时间同步
+==============================================================
+签名请求需要携带时间戳，本机时钟与交易所服务器偏差过大时请求会被拒绝
+（如 Binance -1021 Timestamp for this request is outside of the recvWindow）。
+
+TimeSync 在后台线程中定期查询交易所服务器时间，用请求前后本机时间的中点
+估计时钟偏差，并对偏差和往返延迟做指数平滑。签名时调用 now_ms() 直接
+得到校正后的时间戳，不需要每次请求都查询服务器时间。
+"""
+
+import threading
+import time
+from datetime import datetime
+
+
+class TimeSync:
+    """单个交易所的服务器时间偏差跟踪器"""
+
+    def __init__(self, fetch, interval=60, alpha=0.2, name=None):
+        """
+        :param fetch: 查询服务器时间的函数，返回毫秒时间戳
+        :param interval: 后台同步间隔（秒）
+        :param alpha: 指数平滑系数，越大越依赖最新样本
+        :param name: 名称，用于日志
+        """
+        self._fetch = fetch
+        self.interval = interval
+        self.alpha = alpha
+        self.name = name
+        self.offset = 0.0   # 服务器时间 - 本机时间（毫秒）
+        self.rtt = None     # 平滑后的往返延迟（毫秒）
+        self.samples = 0
+        self.last_sync = None
+        self._thread = None
+        # 每个后台线程有自己的停止事件，stop 之后立即 start 也不会让旧线程继续运行
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # start / stop 可能在不同线程中并发调用（多个客户端共用一个 TimeSync）
+        self._start_lock = threading.Lock()
+
+    def sample(self):
+        """查询一次服务器时间并更新偏差估计
+
+        往返延迟超过平滑值 3 倍的样本只更新延迟，不更新偏差，避免网络抖动
+        带来的偏差跳变。
+
+        :return: 本次样本的 (offset, rtt)
+        """
+        t0 = time.time()
+        server = float(self._fetch())
+        t1 = time.time()
+        rtt = (t1 - t0) * 1000
+        offset = server - (t0 + t1) * 500
+
+        with self._lock:
+            if self.samples == 0:
+                self.offset = offset
+                self.rtt = rtt
+            else:
+                if rtt <= 3 * self.rtt:
+                    self.offset += self.alpha * (offset - self.offset)
+                self.rtt += self.alpha * (rtt - self.rtt)
+            self.samples += 1
+            self.last_sync = t1
+        return offset, rtt
+
+    def now_ms(self):
+        """校正后的服务器时间（毫秒时间戳）"""
+        return int(time.time() * 1000 + self.offset)
+
+    def utcnow(self):
+        """校正后的服务器 UTC 时间"""
+        return datetime.utcfromtimestamp(time.time() + self.offset / 1000)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, wait=True):
+        """同步一次后启动后台线程，重复调用无副作用
+
+        并发调用时只有第一个调用者创建线程，其余调用者等待首次同步完成后返回。
+
+        :param wait: 是否等待首次同步完成，False 时首次同步在后台线程中进行
+        """
+        with self._start_lock:
+            if self.running:
+                return self
+            stop = self._stop = threading.Event()
+            if wait:
+                self._safe_sample()
+            thread = threading.Thread(target=self._run, args=(stop, not wait), daemon=True,
+                                      name='TimeSync-%s' % (self.name or ''))
+            thread.start()
+            self._thread = thread
+        return self
+
+    def stop(self, timeout=5):
+        """停止后台线程，等待其退出（正在进行的同步至多等待 timeout 秒）"""
+        with self._start_lock:
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _safe_sample(self):
+        try:
+            self.sample()
+        except Exception as e:
+            print("%s 服务器时间同步失败：%s" % (self.name or '', e))
+
+    def _run(self, stop, sample_first=False):
+        if sample_first:
+            self._safe_sample()
+        while not stop.wait(self.interval):
+            self._safe_sample()
+
+    def to_dict(self):
+        return {"name": self.name, "offset": self.offset, "rtt": self.rtt,
+                "samples": self.samples, "last_sync": self.last_sync}
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+共享的 websocket 事件循环
+==============================================================
+进程内所有 websocket 连接共用一个 asyncio 事件循环，运行在一个后台线程中，
+连接数增加不会增加线程数，也不依赖 Twisted reactor 这样的全局单例。
+
+    engine = shared_engine()
+    conn = engine.connect('wss://stream.binance.com:9443/ws/ethbtc@depth', on_message)
+    ...
+    conn.close()        # 关闭单条连接，不再重连
+    engine.stop()       # 关闭全部连接并停止事件循环
+
+线程安全：connect / send / close / stop 可以在任意线程调用，内部都转交给
+事件循环线程执行。回调（on_message / on_open / on_close）总是在事件循环
+线程中逐个调用，同一时刻只有一个回调在运行，回调之间不需要加锁。
+
+断线重连：连接断开（包括 ping 超时、超过 idle_timeout 没有收到消息）后
+按指数退避加随机抖动无限重连，避免大量连接在同一时刻重连；on_open 在
+每次重连成功后都会调用，connects 大于 1 表示这是一次重连，上层据此
+重新订阅、补齐断线期间缺失的数据。
+
+背压：每条连接最多缓存 max_queue 条未处理的消息，回调处理不过来时停止
+从 socket 读取，由 TCP 流量控制让对端减速；写缓冲区超过 write_limit 字节时
+send 等待其排空（drain），返回的 Future 在此之后才完成，发送方可以据此减速。
+回调中不要做耗时操作，否则会拖慢所有连接。
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import websockets
+
+
+class Connection:
+    """单条 websocket 连接，由 WebSocketEngine.connect 创建，断开后自动重连"""
+
+    def __init__(self, engine, url, on_message, on_open=None, on_close=None, name=None,
+                 reconnect=True, max_queue=1024, max_size=2 ** 24, write_limit=2 ** 16,
+                 ping_interval=20, ping_timeout=20, idle_timeout=None):
+        """
+        :param url: ws:// 或 wss:// 地址
+        :param on_message: 收到消息时调用 on_message(message)，文本帧为 str，二进制帧为 bytes
+        :param on_open: 连接（或重连）成功后调用 on_open(connection)
+        :param on_close: 连接断开后调用 on_close(connection)
+        :param name: 名称，用于日志
+        :param reconnect: 断开后是否重连
+        :param max_queue: 最多缓存的未处理消息数
+        :param max_size: 单条消息的最大字节数
+        :param write_limit: 写缓冲区的高水位（字节），超过后 send 等待缓冲区排空
+        :param ping_interval: 发送 ping 的间隔（秒），None 表示不发送
+        :param ping_timeout: 等待 pong 的超时（秒），超时后断开重连
+        :param idle_timeout: 超过该时间（秒）没有收到任何消息时断开重连，None 表示不检查，
+                             用于持续推送的数据流（深度、心跳），服务器停止推送但连接未断时也能发现
+        """
+        self.engine = engine
+        self.url = url
+        self.name = name or url
+        self.on_message = on_message
+        self.on_open = on_open
+        self.on_close = on_close
+        self.reconnect = reconnect
+        self.options = {"max_queue": max_queue, "max_size": max_size, "write_limit": write_limit,
+                        "ping_interval": ping_interval, "ping_timeout": ping_timeout}
+        self.connected = False
+        self.connected_url = None   # 当前连接实际使用的地址，url 可以在重连前修改
+        self.closing = False
+        self.idle_timeout = idle_timeout
+        self.connects = 0       # 成功建立连接的次数
+        self.messages = 0
+        self.last_message = None
+        self.last_error = None
+        self._ws = None
+        self._task = None
+
+    def send(self, data):
+        """发送一条消息，可在任意线程调用
+
+        :return: concurrent.futures.Future，写缓冲区低于 write_limit 后返回 None，
+                 未连接时为 ConnectionError
+        """
+        return asyncio.run_coroutine_threadsafe(self._send(data), self.engine.loop)
+
+    def close(self):
+        """关闭连接，不再重连"""
+        self.engine.disconnect(self)
+
+    async def _send(self, data):
+        if self._ws is None:
+            raise ConnectionError('%s 未连接' % self.name)
+        await self._ws.send(data)
+
+    def _call(self, func, *args):
+        if func is None:
+            return
+        try:
+            func(*args)
+        except Exception as e:
+            print('%s 回调出错：%r' % (self.name, e))
+
+    async def _run(self):
+        engine = self.engine
+        delay = engine.initial_delay
+        retries = 0
+        watchdog = None
+        while not self.closing:
+            url = self.url
+            try:
+                async with websockets.connect(url, **self.options) as ws:
+                    self._ws = ws
+                    self.connected_url = url
+                    self.connected = True
+                    self.connects += 1
+                    delay = engine.initial_delay
+                    retries = 0
+                    self.last_message = time.time()
+                    if self.idle_timeout:
+                        watchdog = asyncio.ensure_future(self._watchdog(ws))
+                    self._call(self.on_open, self)
+                    on_message = self.on_message
+                    async for message in ws:
+                        self.messages += 1
+                        self.last_message = time.time()
+                        try:
+                            on_message(message)
+                        except Exception as e:
+                            print('%s 回调出错：%r' % (self.name, e))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = e
+                print('%s 连接断开：%r' % (self.name, e))
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+                    watchdog = None
+                self._ws = None
+                if self.connected:
+                    self.connected = False
+                    self._call(self.on_close, self)
+
+            if self.closing or not self.reconnect:
+                break
+            retries += 1
+            if engine.max_retries is not None and retries > engine.max_retries:
+                print('%s 重连 %d 次失败，停止重连' % (self.name, engine.max_retries))
+                break
+            # 在 [delay/2, delay] 之间随机等待，避免所有连接同时重连
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+            delay = min(delay * 2, engine.max_delay)
+        engine._forget(self)
+
+    async def _watchdog(self, ws):
+        """超过 idle_timeout 没有收到消息时关闭连接，由 _run 重连"""
+        while True:
+            idle = time.time() - self.last_message
+            if idle >= self.idle_timeout:
+                print('%s %.0f 秒未收到消息，重新连接' % (self.name, idle))
+                await ws.close(1001, 'idle timeout')
+                return
+            await asyncio.sleep(self.idle_timeout - idle)
+
+
+class WebSocketEngine:
+    """在一个后台线程的 asyncio 事件循环中运行多条 websocket 连接"""
+
+    # 重连间隔从 initial_delay 开始翻倍，最长 max_delay 秒，每次随机缩短至多一半；
+    # max_retries 为连续失败多少次后放弃，None 表示一直重连
+    initial_delay = 0.1
+    max_delay = 30
+    max_retries = None
+
+    def __init__(self, name='WebSocketEngine'):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._conns = set()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def connections(self):
+        return list(self._conns)
+
+    def start(self):
+        """启动事件循环线程，重复调用无副作用"""
+        with self._lock:
+            if self.running:
+                return self
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(loop, ready),
+                                            daemon=True, name=self.name)
+            self._thread.start()
+            ready.wait()
+            self.loop = loop
+        return self
+
+    def _run(self, loop, ready):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(_cancel_tasks(asyncio.all_tasks(loop)))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def stop(self, timeout=5):
+        """关闭全部连接并停止事件循环线程"""
+        with self._lock:
+            if not self.running:
+                return
+            loop, thread = self.loop, self._thread
+            future = asyncio.run_coroutine_threadsafe(self._close_all(), loop)
+            try:
+                future.result(timeout)
+            except Exception as e:
+                print('%s 关闭连接超时：%r' % (self.name, e))
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            self.loop = None
+            self._thread = None
+
+    async def _close_all(self):
+        for conn in list(self._conns):
+            conn.closing = True
+        self._conns.clear()
+        # 已 disconnect 但还在等待关闭握手的连接也一并结束
+        await _cancel_tasks(asyncio.all_tasks() - {asyncio.current_task()})
+
+    def connect(self, url, on_message, **kwargs):
+        """建立一条连接，未启动时自动启动事件循环，参数见 Connection
+
+        :return: Connection
+        """
+        self.start()
+        conn = Connection(self, url, on_message, **kwargs)
+        self._conns.add(conn)
+        self.loop.call_soon_threadsafe(self._spawn, conn)
+        return conn
+
+    def _spawn(self, conn):
+        if not conn.closing:
+            conn._task = self.loop.create_task(conn._run())
+
+    def disconnect(self, conn):
+        """关闭一条连接，不再重连"""
+        conn.closing = True
+        self._conns.discard(conn)
+        if self.running:
+            self.loop.call_soon_threadsafe(self._cancel, conn)
+
+    @staticmethod
+    def _cancel(conn):
+        if conn._task is not None:
+            conn._task.cancel()
+
+    def _forget(self, conn):
+        self._conns.discard(conn)
+
+
+async def _cancel_tasks(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_engine():
+    """进程内共享的 WebSocketEngine"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = WebSocketEngine()
+        return _shared
@@ -0,0 +1,211 @@
+# -*- coding:utf-8 -*-
+"""
+三角套利 / 跨交易所套利扫描
+==============================================================
+初始化时根据各交易所 get_exchange_symbols 的结果一次性构建币种图，
+枚举同一交易所内的所有三角环路（如 eth_btc / btc_usdt / eth_usdt）
+以及同一交易对在不同交易所之间的搬砖环路，并按 (交易所, 交易对)
+建立索引。每次盘口更新只重新计算涉及该交易对的环路。
+
+每条环路的每一步（leg）对应一个“转换率”槽位：
+    卖出 base_quote：base -> quote，转换率 = bid * (1 - fee)
+    买入 base_quote：quote -> base，转换率 = (1 - fee) / ask
+环路收益率为各步转换率之积减 1，只有收益为正时才计算可成交数量。
+"""
+
+
+class ArbitrageScanner:
+    """套利机会扫描器
+
+    用法：
+
+        scanner = ArbitrageScanner(fees={'Binance': 0.001, 'Huobi': 0.002})
+        scanner.add_exchange('Binance', binance_client.get_exchange_symbols()['symbols'])
+        scanner.add_exchange('Huobi', huobi_client.get_exchange_symbols()['symbols'])
+        scanner.attach(aggregator, callback=print)   # 接入 DepthAggregator
+    """
+
+    def __init__(self, fees=None, default_fee=0.002, min_profit=0.0):
+        """
+        :param fees: {交易所: 手续费率}
+        :param default_fee: 未指定交易所的默认手续费率
+        :param min_profit: 最小收益率（扣除手续费后），低于该值的机会不返回
+        """
+        self.fees = dict(fees or {})
+        self.default_fee = default_fee
+        self.min_profit = min_profit
+
+        self._keys = {}     # (exchange, symbol) -> key id
+        self._aliases = {}  # (exchange, 去掉分隔符的小写交易对) -> key id，如 ETHBTC / ETH_BTC
+        self._key_info = []  # key id -> (exchange, symbol, fee)
+        # 每个 key 占两个槽位：2*k 为卖出，2*k+1 为买入
+        self._rates = []    # 转换率，无行情时为 0
+        self._caps = []     # 该步最多可投入的数量（以该步输入币种计）
+
+        self._cycles = []    # cycle id -> (legs, type, 起始币种)
+        self._touching = []  # key id -> [cycle id, ...]
+        self._symbols = {}   # exchange -> set(symbol)
+
+    def _key(self, exchange, symbol):
+        key = self._keys.get((exchange, symbol))
+        if key is None:
+            key = len(self._key_info)
+            self._keys[(exchange, symbol)] = key
+            self._key_info.append((exchange, symbol,
+                                   self.fees.get(exchange, self.default_fee)))
+            self._rates.extend((0.0, 0.0))
+            self._caps.extend((0.0, 0.0))
+            self._touching.append([])
+        return key
+
+    def _add_cycle(self, legs, type_, currency):
+        cid = len(self._cycles)
+        self._cycles.append((tuple(legs), type_, currency))
+        for key in set(leg >> 1 for leg in legs):
+            self._touching[key].append(cid)
+
+    def add_exchange(self, exchange, symbols):
+        """登记交易所支持的交易对，并生成相关的三角环路和跨交易所环路
+
+        :param exchange: 交易所名称
+        :param symbols: 交易对列表，如 ["eth_btc", "btc_usdt", ...]；重复登记时只为新增的
+                        交易对生成环路
+        """
+        known = self._symbols.get(exchange, set())
+        symbols = set(s.lower() for s in symbols) - known
+        if not symbols:
+            return
+        new_keys = set(self._key(exchange, symbol) for symbol in symbols)
+        # 币种图：pairs[(a, b)] = 槽位编号，表示 a -> b 的一步
+        pairs = {}
+        neighbours = {}
+        for symbol in symbols | known:
+            base, quote = symbol.split('_')
+            key = self._key(exchange, symbol)
+            pairs[(base, quote)] = 2 * key
+            pairs[(quote, base)] = 2 * key + 1
+            neighbours.setdefault(base, set()).add(quote)
+            neighbours.setdefault(quote, set()).add(base)
+
+        # 三角环路：每个三角形正反两个方向
+        for a in neighbours:
+            for b in neighbours[a]:
+                if b <= a:
+                    continue
+                for c in neighbours[a] & neighbours[b]:
+                    if c <= b:
+                        continue
+                    if not new_keys.intersection((pairs[(a, b)] >> 1, pairs[(b, c)] >> 1,
+                                                  pairs[(c, a)] >> 1)):
+                        # 三条边都已登记过，环路已经存在
+                        continue
+                    self._add_cycle((pairs[(a, b)], pairs[(b, c)], pairs[(c, a)]),
+                                    'triangle', a)
+                    self._add_cycle((pairs[(a, c)], pairs[(c, b)], pairs[(b, a)]),
+                                    'triangle', a)
+
+        # 跨交易所环路：在一边买入，在另一边卖出
+        for other, other_symbols in self._symbols.items():
+            if other == exchange:
+                continue
+            for symbol in symbols & other_symbols:
+                quote = symbol.split('_')[1]
+                here = self._keys[(exchange, symbol)]
+                there = self._keys[(other, symbol)]
+                self._add_cycle((2 * here + 1, 2 * there), 'cross', quote)
+                self._add_cycle((2 * there + 1, 2 * here), 'cross', quote)
+
+        self._symbols[exchange] = known | symbols
+        for symbol in symbols:
+            alias = (exchange, symbol.replace('_', ''))
+            # 去掉分隔符后重名（如 ab_cd / abc_d）时不建立别名
+            self._aliases[alias] = None if alias in self._aliases else self._keys[(exchange, symbol)]
+
+    @property
+    def cycle_count(self):
+        return len(self._cycles)
+
+    def on_book(self, exchange, symbol, bid, bid_amount, ask, ask_amount):
+        """最优买卖价更新，重新计算涉及该交易对的环路
+
+        :return: 套利机会列表，见 _opportunity
+        """
+        key = self._keys.get((exchange, symbol))
+        if key is None:
+            key = self._resolve(exchange, symbol)
+            if key is None:
+                return []
+        fee_factor = 1.0 - self._key_info[key][2]
+        rates = self._rates
+        caps = self._caps
+        if bid and bid_amount:
+            rates[2 * key] = bid * fee_factor
+            caps[2 * key] = bid_amount
+        else:
+            rates[2 * key] = caps[2 * key] = 0.0
+        if ask and ask_amount:
+            rates[2 * key + 1] = fee_factor / ask
+            caps[2 * key + 1] = ask_amount * ask
+        else:
+            rates[2 * key + 1] = caps[2 * key + 1] = 0.0
+
+        threshold = 1.0 + self.min_profit
+        cycles = self._cycles
+        found = []
+        for cid in self._touching[key]:
+            legs = cycles[cid][0]
+            rate = 1.0
+            for leg in legs:
+                rate *= rates[leg]
+            if rate > threshold:
+                found.append(self._opportunity(cid, rate))
+        return found
+
+    def _resolve(self, exchange, symbol):
+        """大写或不带分隔符的交易对（ETH_BTC、ETHBTC），找到后缓存到 _keys"""
+        key = self._aliases.get((exchange, symbol.lower().replace('_', '').replace('/', '')))
+        if key is not None:
+            self._keys[(exchange, symbol)] = key
+        return key
+
+    def on_book_update(self, exchange, symbol, book):
+        """DepthAggregator 监听回调的适配，book 为 OrderBook"""
+        bid, ask = book.top()
+        return self.on_book(exchange, symbol,
+                            bid[0] if bid else 0.0, bid[1] if bid else 0.0,
+                            ask[0] if ask else 0.0, ask[1] if ask else 0.0)
+
+    def attach(self, aggregator, callback):
+        """接入 DepthAggregator，发现机会时调用 callback(opportunities)"""
+        def listener(exchange, symbol, book):
+            found = self.on_book_update(exchange, symbol, book)
+            if found:
+                callback(found)
+        aggregator.add_listener(listener)
+        return listener
+
+    def _opportunity(self, cid, rate):
+        """构造套利机会
+
+        :return:
+            {
+            "type": "triangle" 三角套利 或 "cross" 跨交易所,
+            "currency": 起始币种,
+            "profit": 扣除手续费后的收益率,
+            "size": 可成交的起始币种数量（受各步最优价位数量限制）,
+            "path": [(交易所, 交易对, "buy"/"sell"), ...]
+            }
+        """
+        legs, type_, currency = self._cycles[cid]
+        rates = self._rates
+        caps = self._caps
+        size = float('inf')
+        acc = 1.0  # 起始币种到当前步输入币种的累计转换率
+        path = []
+        for leg in legs:
+            size = min(size, caps[leg] / acc)
+            acc *= rates[leg]
+            exchange, symbol, _ = self._key_info[leg >> 1]
+            path.append((exchange, symbol, 'buy' if leg & 1 else 'sell'))
+        return {"type": type_, "currency": currency, "profit": rate - 1.0,
+                "size": size, "path": path}
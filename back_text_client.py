@@ -1,4 +1,5 @@
-from .contract import ExchangeClient, Asset, AssetException
+from .contract import ExchangeClient
+from .ledger import Ledger
 import json
 from .meta import exchange_api, quotation_provicer
 
@@ -13,38 +14,42 @@ from .meta import exchange_api, quotation_provicer
 ])
 class BackTestClient(ExchangeClient):
     def __str__(self):
-        return json.dumps(self.__dict__, ensure_ascii=True, indent=2)
+        return json.dumps({'exchange': self.exchange,
+                           'assets': self.ledger.to_dict(),
+                           'traders': self.traders},
+                          ensure_ascii=True, indent=2)
 
     def __init__(self, exchange, assets={}):
         self.exchange = exchange
-        self.assets = {}
+        self.ledger = Ledger(assets)
         self.traders = []
-        for x in assets.keys():
-            self.assets[x] = Asset(x, assets[x])
+
+    @property
+    def assets(self):
+        """与账本联动的 {币种: Asset}，修改余额直接写入账本"""
+        return self.ledger.views()
 
     def get_assets(self):
         '''
         交易所对象
         '''
-        return self.assets
+        return self.ledger.views()
 
     def buy(self, symbol, price, volume, type_=None):
         [bsym, ssym] = symbol.split('/')
-        print(bsym, ssym)
-        amount = round(price * volume, 8)
-        if ssym not in self.assets or self.assets[ssym].balance < amount:
-
-            raise AssetException('资产不足', ssym)
-        self.assets[ssym].balance = self.assets[ssym].balance - amount
-        self.assets[bsym].balance = self.assets[bsym].balance + volume
+        # 支付计价币种，收到基础币种
+        self.ledger.trade(ssym, price * volume, bsym, volume)
 
     def sell(self, symbol, price, volume, type_=None):
         [ssym, bsym] = symbol.split('/')
-        amount = round(price * volume, 8)
-        if ssym not in self.assets or self.assets[ssym].balance < amount:
-            raise AssetException('资产不足', self.assets[ssym])
-        self.assets[ssym].balance = self.assets[ssym].balance - amount
-        self.assets[bsym].balance = self.assets[bsym].balance + volume
+        # 支付基础币种，收到计价币种
+        self.ledger.trade(ssym, volume, bsym, price * volume)
+
+    def snapshot(self):
+        '''
+        资产快照，用于记录净值曲线
+        '''
+        return self.ledger.snapshot()
 
     def cancel_order(self, order_id):
         pass
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Binance 本地盘口（DepthCache / DepthCacheManager）基准与一致性校验
+==============================================================
+按交易所的规则模拟一个真实盘口，生成连续的深度增量事件，再模拟网络
+投递：随机丢失若干事件（缺口）、重复投递、价位数量为 0 的删除，数量 0
+的写法也不止 "0.00000000" 一种。投递序列交给 DepthCacheManager 处理，
+需要重新同步时由替身客户端返回当时的真实盘口快照；--lag 模拟 REST 快照
+落后于推送，每次重新同步的前 lag 个快照是缺口之前的旧快照。
+
+测量：
+    manager     _depth_event -> _process_depth_message 整条处理链路，消息/秒、价位更新/秒
+    add_level   DepthCache.add_bid / add_ask 单独的价位更新/秒
+    memory      每个价位占用的内存（字节）
+    top         get_bids()[0] 与 get_best_bid() 等读取最优价的耗时（微秒）
+
+校验：处理完成后 DepthCacheManager 中的盘口必须与参考实现（按 Decimal
+保存、逐条应用全部事件的真实盘口）完全一致，否则以非 0 状态退出。
+
+也可以回放录制的推送（--recorded，每行一条 depthUpdate 消息的 JSON，
+支持组合流 {"stream":..,"data":..} 格式），此时录制序列被视为真实序列。
+
+在包的上级目录运行：
+
+    python -m coins_api.benchmarks.bench_depthcache
+    python -m coins_api.benchmarks.bench_depthcache -n 200000 --gap-rate 0.001 --levels 2000
+    python -m coins_api.benchmarks.bench_depthcache --gap-rate 0.01 --lag 2
+    python -m coins_api.benchmarks.bench_depthcache --recorded ethbtc_depth.jsonl
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+from ..apis.binance.depthcache import DepthCache, DepthCacheManager
+
+SYMBOL = 'ETHBTC'
+ZEROS = ('0.00000000', '0.00000000', '0.00000000', '0', '0.0', '0.000')
+
+
+class ReferenceBook:
+    """参考实现：价格和数量均为 Decimal，数量为 0 即删除"""
+
+    def __init__(self):
+        self.bids = {}
+        self.asks = {}
+        self.last_update_id = 0
+
+    def apply(self, msg):
+        for side, levels in ((self.bids, msg['b']), (self.asks, msg['a'])):
+            for price, quantity, *_ in levels:
+                price, quantity = Decimal(price), Decimal(quantity)
+                if quantity:
+                    side[price] = quantity
+                else:
+                    side.pop(price, None)
+        self.last_update_id = msg['u']
+
+    def snapshot(self):
+        """REST /api/v1/depth 格式的快照"""
+        return {"lastUpdateId": self.last_update_id,
+                "bids": [['%.8f' % p, '%.8f' % q, []] for p, q in
+                         sorted(self.bids.items(), reverse=True)],
+                "asks": [['%.8f' % p, '%.8f' % q, []] for p, q in sorted(self.asks.items())]}
+
+    def levels(self):
+        """与 DepthCache.get_bids / get_asks 相同格式的盘口"""
+        return ([[float(p), float(q)] for p, q in sorted(self.bids.items(), reverse=True)],
+                [[float(p), float(q)] for p, q in sorted(self.asks.items())])
+
+
+def synthetic_events(n, levels=1000, per_msg=10, delete_rate=0.1, seed=7):
+    """生成 n 条连续的深度增量事件
+
+    价位集中在中间价附近，越靠近中间价更新越频繁，近似真实盘口的分布。
+
+    :param levels: 每一边的价位数量上限
+    :param per_msg: 每条消息平均更新的价位数
+    :param delete_rate: 数量为 0（删除）的比例
+    """
+    rnd = random.Random(seed)
+    mid = 3100000  # 单位 1e-8
+    update_id = 1000
+    for _ in range(n):
+        bids, asks = [], []
+        for _ in range(max(1, int(rnd.expovariate(1.0 / per_msg)))):
+            distance = min(levels, int(rnd.expovariate(1.0 / (levels / 8))) + 1)
+            side, price = (bids, mid - distance) if rnd.random() < 0.5 else (asks, mid + distance)
+            if rnd.random() < delete_rate:
+                quantity = rnd.choice(ZEROS)
+            else:
+                quantity = '%.8f' % (rnd.randint(1, 5000000) / 1e5)
+            side.append(['%.8f' % (price / 1e8), quantity, []])
+        n_ids = rnd.randint(1, 3)
+        yield {"e": "depthUpdate", "E": 0, "s": SYMBOL,
+               "U": update_id, "u": update_id + n_ids - 1, "b": bids, "a": asks}
+        update_id += n_ids
+
+
+def recorded_events(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                msg = json.loads(line)
+                yield msg.get('data', msg)
+
+
+class Scenario:
+    """一次投递：真实事件序列 + 实际投递给 DepthCacheManager 的序列
+
+    初始化时按交易所文档的流程：先连上 websocket，再请求 REST 快照，
+    请求发出之前收到的消息一定早于快照，请求过程中收到的消息有早有晚，
+    需要缓存后按 lastUpdateId 过滤再应用。
+
+    :param events: 真实事件序列
+    :param buffered: 初始快照完成之前收到的消息数，快照取在其中间
+    :param gap_rate: 每条消息之后发生缺口的概率，缺口丢失 1~5 条消息
+    :param dup_rate: 每条消息重复投递的概率
+    """
+
+    def __init__(self, events, buffered=20, gap_rate=0.0005, dup_rate=0.01, seed=11):
+        rnd = random.Random(seed)
+        truth = ReferenceBook()
+        self.before_request = []    # 请求快照之前收到的消息
+        self.during_request = []    # 请求快照过程中收到的消息
+        self.delivered = []
+        self.snapshots = {}         # 投递位置 -> 此时的真实快照，'init' 为初始快照
+        self.stale = {}             # 投递位置 -> 缺口之前的旧快照，模拟落后的 REST 快照
+        self.gaps = self.duplicates = 0
+        skip = 0
+        resync = False
+        for i, msg in enumerate(events):
+            truth.apply(msg)
+            if i < buffered:
+                (self.before_request if i < buffered // 4 else self.during_request).append(msg)
+                if i == buffered // 2:
+                    self.snapshots['init'] = truth.snapshot()
+                continue
+            if skip:
+                skip -= 1
+                continue
+            if resync:
+                # 缺口之后收到的第一条消息触发重新同步，此时的快照已包含该消息
+                self.snapshots[len(self.delivered)] = truth.snapshot()
+                self.stale[len(self.delivered)] = stale
+                resync = False
+            self.delivered.append(msg)
+            if rnd.random() < dup_rate:
+                self.delivered.append(msg)
+                self.duplicates += 1
+            if rnd.random() < gap_rate:
+                skip = rnd.randint(1, 5)
+                resync = True
+                stale = truth.snapshot()
+                self.gaps += 1
+        if 'init' not in self.snapshots:
+            self.snapshots['init'] = truth.snapshot()
+        self.truth = truth
+        self.updates = sum(len(m['b']) + len(m['a']) for m in self.delivered)
+
+
+class ReplayClient:
+    """替身客户端，get_order_book 返回当前投递位置对应的真实快照
+
+    :param lag: 每次重新同步的前 lag 次请求返回缺口之前的旧快照
+    """
+
+    def __init__(self, scenario, lag=0):
+        self.scenario = scenario
+        self.lag = lag
+        self.manager = None
+        self.cursor = 'init'
+        self.resyncs = 0
+        self.stale_served = 0
+        self._calls = {}
+
+    def get_order_book(self, symbol, limit=100):
+        self.resyncs += 1
+        if self.cursor == 'init':
+            for msg in self.scenario.during_request:
+                self.manager._depth_event(msg)
+        calls = self._calls[self.cursor] = self._calls.get(self.cursor, 0) + 1
+        if calls <= self.lag and self.cursor in self.scenario.stale:
+            self.stale_served += 1
+            return self.scenario.stale[self.cursor]
+        try:
+            return self.scenario.snapshots[self.cursor]
+        except KeyError:
+            raise AssertionError('unexpected resync at message %s' % self.cursor)
+
+
+class ReplayManager(DepthCacheManager):
+    """不连接 websocket 的 DepthCacheManager，由 ReplayClient 投递初始化阶段的消息
+
+    重新同步在当前线程中完成、重试之间不等待，投递位置与快照一一对应，结果可复现。
+    """
+
+    _resync_delay = 0
+
+    def __init__(self, client):
+        client.manager = self
+        self._replay_client = client
+        super().__init__(client, SYMBOL, refresh_interval=0)
+
+    def _start_socket(self):
+        for msg in self._replay_client.scenario.before_request:
+            self._depth_event(msg)
+
+    def _start_fetch(self):
+        if not self._fetching:
+            self._fetching = True
+            self._fetch_snapshot()
+
+
+def run_manager(scenario, lag=0):
+    """把投递序列交给 DepthCacheManager，返回 (耗时, manager, client)"""
+    client = ReplayClient(scenario, lag)
+    manager = ReplayManager(client)
+    event = manager._depth_event
+    if len(scenario.snapshots) > 1:
+        start = time.perf_counter()
+        for i, msg in enumerate(scenario.delivered):
+            client.cursor = i
+            event(msg)
+    else:
+        start = time.perf_counter()
+        for msg in scenario.delivered:
+            event(msg)
+    return time.perf_counter() - start, manager, client
+
+
+def check(manager, scenario):
+    """比较 DepthCacheManager 与参考实现的最终盘口，返回差异描述列表"""
+    cache = manager.get_depth_cache()
+    bids, asks = scenario.truth.levels()
+    problems = []
+    for name, got, want in (('bids', cache.get_bids(), bids), ('asks', cache.get_asks(), asks)):
+        if got != want:
+            got_set, want_set = set(map(tuple, got)), set(map(tuple, want))
+            problems.append('%s: %d levels vs %d expected, %d extra, %d missing' % (
+                name, len(got), len(want), len(got_set - want_set), len(want_set - got_set)))
+    if manager._last_update_id != scenario.truth.last_update_id:
+        problems.append('lastUpdateId %s vs %s expected' % (
+            manager._last_update_id, scenario.truth.last_update_id))
+    return problems
+
+
+def bench_add_level(messages):
+    cache = DepthCache(SYMBOL)
+    add_bid, add_ask = cache.add_bid, cache.add_ask
+    start = time.perf_counter()
+    for msg in messages:
+        for bid in msg['b']:
+            add_bid(bid)
+        for ask in msg['a']:
+            add_ask(ask)
+    return time.perf_counter() - start
+
+
+def bench_memory(levels):
+    """构造每边 levels 个价位的盘口，返回每个价位的字节数"""
+    bids = [['%.8f' % ((3100000 - i) / 1e8), '%.8f' % (i + 1)] for i in range(1, levels + 1)]
+    asks = [['%.8f' % ((3100000 + i) / 1e8), '%.8f' % (i + 1)] for i in range(1, levels + 1)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = DepthCache(SYMBOL)
+    for bid in bids:
+        cache.add_bid(bid)
+    for ask in asks:
+        cache.add_ask(ask)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return cache, used / (2 * levels)
+
+
+def bench_top(cache, number=200):
+    """读取最优买卖价的耗时（微秒/次）"""
+    reads = {
+        'get_bids()[0]': lambda: cache.get_bids()[0],
+        'get_asks()[0]': lambda: cache.get_asks()[0],
+        'get_best_bid()': cache.get_best_bid,
+        'get_best_ask()': cache.get_best_ask,
+    }
+    result = {}
+    for name, read in reads.items():
+        start = time.perf_counter()
+        for _ in range(number):
+            read()
+        result[name] = (time.perf_counter() - start) / number * 1e6
+    assert cache.get_best_bid() == cache.get_bids()[0]
+    assert cache.get_best_ask() == cache.get_asks()[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DepthCache 基准与一致性校验')
+    parser.add_argument('-n', '--number', type=int, default=100000, help='真实事件数')
+    parser.add_argument('--levels', type=int, default=1000, help='每一边的价位数量上限')
+    parser.add_argument('--per-msg', type=float, default=10, help='每条消息平均更新的价位数')
+    parser.add_argument('--delete-rate', type=float, default=0.1)
+    parser.add_argument('--gap-rate', type=float, default=0.0005)
+    parser.add_argument('--dup-rate', type=float, default=0.01)
+    parser.add_argument('--lag', type=int, default=0,
+                        help='每次重新同步时先返回几个落后于推送的旧快照')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--recorded', help='录制的深度推送文件，每行一条 JSON')
+    parser.add_argument('--book-sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='内存与最优价读取测量的盘口大小（每边价位数）')
+    args = parser.parse_args()
+
+    if args.recorded:
+        events = recorded_events(args.recorded)
+    else:
+        events = synthetic_events(args.number, args.levels, args.per_msg,
+                                  args.delete_rate, args.seed)
+    scenario = Scenario(events, gap_rate=args.gap_rate, dup_rate=args.dup_rate, seed=args.seed)
+
+    seconds, manager, client = run_manager(scenario, args.lag)
+    problems = check(manager, scenario)
+    messages = len(scenario.delivered)
+    print('manager    %d msgs (%d gaps, %d duplicates, %d resyncs, %d lagging snapshots), '
+          '%d level updates' % (messages, scenario.gaps, scenario.duplicates, client.resyncs,
+                                client.stale_served, scenario.updates))
+    print('           %.0f msgs/s, %.0f updates/s' % (messages / seconds, scenario.updates / seconds))
+
+    seconds = bench_add_level(scenario.delivered)
+    print('add_level  %.0f updates/s' % (scenario.updates / seconds))
+
+    for size in args.book_sizes:
+        cache, per_level = bench_memory(size)
+        top = bench_top(cache)
+        print('book %-5d %.0f bytes/level, top of book (us): %s' % (
+            size, per_level, ', '.join('%s %.2f' % item for item in top.items())))
+
+    if problems:
+        print('MISMATCH against reference book:')
+        for problem in problems:
+            print('  ' + problem)
+        sys.exit(1)
+    print('final book matches reference (%d bids, %d asks)' % (
+        len(scenario.truth.bids), len(scenario.truth.asks)))
+
+
+if __name__ == '__main__':
+    main()
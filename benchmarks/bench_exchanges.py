@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+交易所客户端离线基准测试
+==============================================================
+启动本地替身服务（见 standins.py），把各交易所客户端指向替身服务，
+在不访问外网的情况下测量完整的请求链路：签名、HTTP、JSON 解析、
+结果整理，以及 websocket 推送的接收、解压、解析和盘口更新。
+
+在包的上级目录运行：
+
+    python -m coins_api.benchmarks.bench_exchanges
+    python -m coins_api.benchmarks.bench_exchanges -s ticker depth --json base.json
+    python -m coins_api.benchmarks.bench_exchanges --baseline base.json
+
+输出每个场景的操作数、吞吐量（次/秒）和 p50/p99 延迟（毫秒）；
+指定 --baseline 时同时输出与基线的差异，便于比较传输层或解析器的改动。
+"""
+
+import argparse
+import gzip
+import json
+import time
+
+from .standins import StandInHTTPServer, StandInWebSocketServer, point_clients_at
+
+KEY = 'bench-key'
+SECRET = 'bench-secret'
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    index = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+    return samples[index]
+
+
+def timed(func, n):
+    """调用 func() n 次，返回每次耗时（秒）和总耗时"""
+    samples = []
+    start = time.perf_counter()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - start
+
+
+class Bench:
+    """各场景共用的客户端，首次使用时创建"""
+
+    def __init__(self, http_url, ws_url, n, stream_count=None):
+        self.http_url = http_url
+        self.ws_url = ws_url
+        self.n = n
+        self.stream_count = stream_count
+        self._clients = {}
+
+    def client(self, name):
+        if name not in self._clients:
+            if name == 'Binance':
+                from ..binance_client import BinanceClient
+                client = BinanceClient(KEY, SECRET, symbol_ttl=0)
+            elif name == 'Huobi':
+                from ..huobi_client import HuobiClient
+                client = HuobiClient(KEY, SECRET, symbol_ttl=0)
+            else:
+                from ..gate_client import GateClient
+                client = GateClient(KEY, SECRET, symbol_ttl=0)
+            client.get_symbol_registry()  # 预先加载交易对，不计入测量
+            self._clients[name] = client
+        return self._clients[name]
+
+    # ------------------------------------------------------------ 场景
+    def ticker(self):
+        for name in ('Binance', 'Huobi', 'Gate'):
+            client = self.client(name)
+            yield name, timed(lambda: client.get_ticker('eth_btc'), self.n)
+
+    def depth(self):
+        for name in ('Binance', 'Huobi', 'Gate'):
+            client = self.client(name)
+            yield name, timed(lambda: client.get_depth('eth_btc'), self.n)
+
+    def kline_paging(self):
+        """Binance 按 startTime 翻页，每页 500 根；Huobi 单次取 2000 根"""
+        api = self.client('Binance').client
+        state = {'start': 1514764800000}
+
+        def binance_page():
+            rows = api.get_klines(symbol='ETHBTC', interval='1m', limit=500,
+                                  startTime=state['start'])
+            state['start'] = rows[-1][6] + 1
+        yield 'Binance', timed(binance_page, self.n)
+
+        huobi = self.client('Huobi')
+        yield 'Huobi', timed(lambda: huobi.get_kline('eth_btc', '1min', 2000), self.n)
+
+    def order(self):
+        """逐个签名下单"""
+        b = self.client('Binance')
+        yield 'Binance', timed(lambda: b.buy('eth_btc', 1, price=0.031), self.n)
+        h = self.client('Huobi')
+        yield 'Huobi', timed(lambda: h.buy('eth_btc', 0.031, 1), self.n)
+        g = self.client('Gate')
+        yield 'Gate', timed(lambda: g.buy('eth_btc', 0.031, 1), self.n)
+
+    def order_batch(self):
+        """place_orders 批量下单，每批 20 个，延迟按批统计"""
+        orders = [{"symbol": "eth_btc", "side": "buy" if i % 2 else "sell",
+                   "price": 0.031 + i * 1e-6, "amount": 1} for i in range(20)]
+        for name in ('Binance', 'Huobi', 'Gate'):
+            client = self.client(name)
+            client.order_limiter.rate = client.order_limiter.burst = 1e6  # 基准测试不限速
+            samples, total = timed(lambda: client.place_orders(orders),
+                                   max(1, self.n // 20))
+            yield name, (samples, total, len(samples) * len(orders))
+
+    def stream_depth(self):
+        """websocket 深度推送：接收、解析并更新本地盘口，延迟为发送到处理完毕
+
+        Binance 走 BinanceSocketManager（共享事件循环），Huobi 直接用 websocket-client。
+        """
+        import threading
+        import websocket
+        from ..apis.binance.depthcache import DepthCache
+        from ..apis.binance.websockets import BinanceSocketManager
+        from ..depth_aggregator import DepthAggregator
+
+        cache = DepthCache('ETHBTC')
+        samples = []
+        done = threading.Event()
+
+        def on_depth(msg):
+            for bid in msg['b']:
+                cache.add_bid(bid)
+            for ask in msg['a']:
+                cache.add_ask(ask)
+            samples.append(time.time() - msg['E'] / 1000)
+            if len(samples) >= self.stream_count:
+                done.set()
+
+        bm = BinanceSocketManager(None)
+        bm.STREAM_URL = self.ws_url + '/binance/'
+        start = time.perf_counter()
+        bm.start_depth_socket('ETHBTC', on_depth)
+        bm.start()
+        done.wait(self.stream_count / 100 + 30)
+        yield 'Binance', (samples, time.perf_counter() - start)
+        bm.close()
+
+        aggregator = DepthAggregator()
+        ws = websocket.create_connection(self.ws_url + '/huobi/market.ethbtc.depth.step0')
+        samples = []
+        start = time.perf_counter()
+        while True:
+            opcode, data = ws.recv_data()
+            if opcode == websocket.ABNF.OPCODE_CLOSE:
+                break
+            msg = json.loads(gzip.decompress(data))
+            tick = msg['tick']
+            aggregator.apply_snapshot('Huobi', 'eth_btc', tick['bids'], tick['asks'])
+            samples.append(time.time() - msg['ts'] / 1000)
+        yield 'Huobi', (samples, time.perf_counter() - start)
+        ws.close()
+
+
+SCENARIOS = ['ticker', 'depth', 'kline_paging', 'order', 'order_batch', 'stream_depth']
+
+
+def run(scenarios, n, stream_count, stream_rate, delay):
+    results = {}
+    with StandInHTTPServer(delay=delay) as http, \
+            StandInWebSocketServer(count=stream_count, rate=stream_rate) as ws:
+        point_clients_at(http.url)
+        bench = Bench(http.url, ws.url, n, stream_count)
+        for scenario in scenarios:
+            for exchange, result in getattr(bench, scenario)():
+                samples, total = result[0], result[1]
+                ops = result[2] if len(result) > 2 else len(samples)
+                results['%s/%s' % (scenario, exchange)] = {
+                    "ops": ops,
+                    "seconds": total,
+                    "throughput": ops / total if total else None,
+                    "p50_ms": percentile(samples, 0.5) * 1000,
+                    "p99_ms": percentile(samples, 0.99) * 1000,
+                }
+    return results
+
+
+def _delta(new, old):
+    if not old or new is None:
+        return ''
+    return '%+.1f%%' % ((new - old) / old * 100)
+
+
+def report(results, baseline=None):
+    header = '%-26s %8s %12s %10s %10s' % ('scenario', 'ops', 'ops/s', 'p50(ms)', 'p99(ms)')
+    if baseline:
+        header += ' %10s %10s' % ('Δops/s', 'Δp50')
+    print(header)
+    for name, r in results.items():
+        line = '%-26s %8d %12.1f %10.3f %10.3f' % (name, r['ops'], r['throughput'],
+                                                   r['p50_ms'], r['p99_ms'])
+        if baseline:
+            old = baseline.get(name, {})
+            line += ' %10s %10s' % (_delta(r['throughput'], old.get('throughput')),
+                                    _delta(r['p50_ms'], old.get('p50_ms')))
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='交易所客户端离线基准测试')
+    parser.add_argument('-s', '--scenario', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('-n', '--number', type=int, default=200, help='每个 REST 场景的请求次数')
+    parser.add_argument('--stream-count', type=int, default=20000, help='每条 websocket 推送的消息数')
+    parser.add_argument('--stream-rate', type=float, default=1000,
+                        help='推送速率（条/秒），0 表示尽快推送（此时延迟包含排队时间）')
+    parser.add_argument('--delay', type=float, default=0.0, help='替身服务每个请求的额外延迟（秒）')
+    parser.add_argument('--json', help='把结果保存为 JSON，可作为之后的基线')
+    parser.add_argument('--baseline', help='基线结果 JSON 文件')
+    args = parser.parse_args()
+
+    results = run(args.scenario, args.number, args.stream_count, args.stream_rate, args.delay)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
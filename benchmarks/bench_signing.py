@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+签名耗时基准测试
+==============================================================
+对比各交易所原来的签名实现与 apis.signing 的实现，并校验两者结果一致。
+不访问网络，在包的上级目录运行：
+
+    python -m coins_api.benchmarks.bench_signing [-n 次数]
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import time
+import timeit
+import urllib.parse
+from operator import itemgetter
+
+from ..apis.binance.API import BinanceAPI
+from ..apis.huobi.hb_util import createSign
+from ..apis.gate.HttpUtil import getSign
+from ..apis.bigone.API import Auth
+from ..apis.signing import HmacSigner
+
+SECRET = 'NhqPtmdSJYdKjVHjA7PZj4Mge3R5YNiP1e3UZjInClVN65XAbvqqM6A7H5fATj0j'
+
+
+# ---------------------------------------------------------------- 原实现
+def legacy_binance(secret, data):
+    params = [(k, v) for k, v in data.items() if k != 'signature']
+    params.sort(key=itemgetter(0))
+    query_string = '&'.join(["{}={}".format(d[0], d[1]) for d in params])
+    m = hmac.new(secret.encode('utf-8'), query_string.encode('utf-8'), hashlib.sha256)
+    return m.hexdigest()
+
+
+def legacy_huobi(pParams, method, host_url, request_path, secret_key):
+    sorted_params = sorted(list(pParams.items()), key=lambda x: x[0], reverse=False)
+    encode_params = urllib.parse.urlencode(sorted_params)
+    payload = '\n'.join([method, host_url, request_path, encode_params]).encode('UTF8')
+    digest = hmac.new(secret_key.encode('UTF8'), payload, digestmod=hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def legacy_gate(params, secretKey):
+    sign = ''
+    for key in params.keys():
+        sign += key + '=' + str(params[key]) + '&'
+    sign = sign[:-1]
+    return hmac.new(bytes(secretKey, encoding='utf8'), bytes(sign, encoding='utf8'),
+                    hashlib.sha512).hexdigest()
+
+
+def legacy_bigone(secret, verb, path, params):
+    query = ''
+    for key in sorted(params.keys()):
+        value = params[key]
+        if key != "orders":
+            query = "%s&%s=%s" % (query, key, value) if len(query) else "%s=%s" % (key, value)
+        else:
+            for v in value:
+                for k in sorted(v.keys()):
+                    item = "orders[][%s]=%s" % (k, v[k])
+                    query = "%s&%s" % (query, item) if len(query) else "%s" % item
+    msg = ("|".join([verb, path, query])).encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), msg=msg, digestmod=hashlib.sha256).hexdigest()
+
+
+# ---------------------------------------------------------------- 测试数据
+def binance_case():
+    api = BinanceAPI.__new__(BinanceAPI)  # 不调用构造函数，避免 ping
+    api.API_SECRET = SECRET
+    api._signer = HmacSigner(SECRET)
+    data = {'symbol': 'ETHBTC', 'side': 'BUY', 'type': 'LIMIT', 'timeInForce': 'GTC',
+            'quantity': '1.00000000', 'price': '0.03125000', 'recvWindow': 5000,
+            'timestamp': int(time.time() * 1000)}
+    return (lambda: legacy_binance(SECRET, data),
+            lambda: api._generate_signature(data))
+
+
+def huobi_case():
+    params = {'AccessKeyId': 'e2xxxxxx-99xxxxxx-84xxxxxx-7xxxx', 'SignatureMethod': 'HmacSHA256',
+              'SignatureVersion': '2', 'Timestamp': '2018-01-06T12:00:00',
+              'order-id': '1234567890'}
+    args = (params, 'GET', 'api.huobi.pro', '/v1/order/orders/1234567890', SECRET)
+    return (lambda: legacy_huobi(*args), lambda: createSign(*args))
+
+
+def gate_case():
+    params = {'currencyPair': 'eth_btc', 'rate': '0.03125', 'amount': '1.5'}
+    return (lambda: legacy_gate(params, SECRET), lambda: getSign(params, SECRET))
+
+
+def bigone_case():
+    auth = Auth('access', SECRET)
+    # 批量下单 20 个订单，原实现的逐段拼接在参数较多时退化为平方复杂度
+    params = {'tonce': int(time.time() * 1000), 'access_key': 'access',
+              'orders': [{'market': 'EOS-BTC', 'side': 'BID' if i % 2 else 'ASK',
+                          'price': '%.8f' % (0.0001 + i * 1e-6), 'amount': '1'}
+                         for i in range(20)]}
+    return (lambda: legacy_bigone(SECRET, 'POST', '/orders', params),
+            lambda: auth.sign('POST', '/orders', params))
+
+
+CASES = [('Binance', binance_case), ('Huobi', huobi_case),
+         ('Gate', gate_case), ('BigOne', bigone_case)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--number', type=int, default=20000, help='每组签名次数')
+    args = parser.parse_args()
+
+    print('%-8s %12s %12s %8s' % ('exchange', 'legacy(us)', 'new(us)', 'speedup'))
+    for name, case in CASES:
+        legacy, new = case()
+        assert legacy() == new(), '%s 签名结果不一致' % name
+        t_old = min(timeit.repeat(legacy, number=args.number, repeat=3)) / args.number * 1e6
+        t_new = min(timeit.repeat(new, number=args.number, repeat=3)) / args.number * 1e6
+        print('%-8s %12.2f %12.2f %7.2fx' % (name, t_old, t_new, t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
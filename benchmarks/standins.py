@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+本地交易所替身服务
+==============================================================
+StandInHTTPServer 在本机端口上模拟 Binance、Huobi、Gate 的 REST 接口，
+返回格式与交易所一致的固定数据；StandInWebSocketServer 是一个最小的
+websocket 服务，连接后按设定速率推送 Binance 深度增量（文本帧）或
+Huobi 深度快照（gzip 压缩的二进制帧）。
+
+point_clients_at(url) 把各交易所 REST 封装的地址指向替身服务，
+基准测试完全不需要访问外网。BigOne 的封装没有基准场景，也不提供替身接口，
+同样指向替身服务，只是为了避免误访问外网。
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SYMBOLS = [('eth', 'btc'), ('bnb', 'btc'), ('eth', 'usdt'), ('btc', 'usdt'),
+           ('ltc', 'btc'), ('eos', 'eth')]
+
+
+def _levels(mid, n, step, reverse, as_str=True, rnd=None):
+    rnd = rnd or random.Random(0)
+    levels = []
+    for i in range(n):
+        price = mid - (i + 1) * step if reverse else mid + (i + 1) * step
+        amount = round(rnd.uniform(0.01, 50), 4)
+        if as_str:
+            levels.append(['%.8f' % price, '%.8f' % amount])
+        else:
+            levels.append([round(price, 8), amount])
+    return levels
+
+
+# ---------------------------------------------------------------- 固定数据
+def binance_routes(depth=1000, klines=500):
+    rnd = random.Random(1)
+    symbols = []
+    for base, quote in SYMBOLS:
+        symbols.append({
+            "symbol": (base + quote).upper(), "status": "TRADING",
+            "baseAsset": base.upper(), "quoteAsset": quote.upper(),
+            "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.00000100"},
+                        {"filterType": "LOT_SIZE", "stepSize": "0.00100000"}]})
+    kline_rows = [[1514764800000 + i * 60000, "0.03100000", "0.03120000", "0.03090000",
+                   "0.03110000", "%.8f" % rnd.uniform(1, 100), 1514764859999 + i * 60000,
+                   "1.0", 10, "1.0", "1.0", "0"] for i in range(klines)]
+    return {
+        '/api/v1/ping': {},
+        '/api/v1/time': lambda q: {"serverTime": int(time.time() * 1000)},
+        '/api/v1/exchangeInfo': {"timezone": "UTC", "symbols": symbols},
+        '/api/v1/ticker/24hr': {
+            "symbol": "ETHBTC", "priceChange": "-0.0001", "priceChangePercent": "-0.3",
+            "weightedAvgPrice": "0.0311", "prevClosePrice": "0.0312", "lastPrice": "0.0311",
+            "bidPrice": "0.0310", "askPrice": "0.0312", "openPrice": "0.0312",
+            "highPrice": "0.0320", "lowPrice": "0.0300", "volume": "12345.6",
+            "openTime": 1514764800000, "closeTime": 1514851199999, "count": 1000},
+        '/api/v1/depth': {"lastUpdateId": 160,
+                          "bids": _levels(0.031, depth, 1e-6, True, rnd=rnd),
+                          "asks": _levels(0.031, depth, 1e-6, False, rnd=rnd)},
+        '/api/v1/klines': kline_rows,
+        '/api/v3/order': lambda q: {"symbol": "ETHBTC", "orderId": random.randint(1, 10 ** 9),
+                                    "clientOrderId": "bench", "transactTime": int(time.time() * 1000)},
+    }
+
+
+def huobi_routes(depth=150, klines=2000):
+    rnd = random.Random(2)
+    symbols = [{"base-currency": b, "quote-currency": q, "symbol": b + q,
+                "price-precision": 6, "amount-precision": 4} for b, q in SYMBOLS]
+    return {
+        '/v1/common/timestamp': lambda q: {"status": "ok", "data": int(time.time() * 1000)},
+        '/v1/common/symbols': {"status": "ok", "data": symbols},
+        '/v1/account/accounts': {"status": "ok", "data": [{"id": 100009, "type": "spot", "state": "working"}]},
+        '/market/detail/merged': lambda q: {
+            "status": "ok", "ch": "market.ethbtc.detail.merged", "ts": int(time.time() * 1000),
+            "tick": {"id": 1, "open": 0.031, "close": 0.0311, "high": 0.032, "low": 0.030,
+                     "amount": 1234.5, "vol": 38.2, "count": 1000,
+                     "bid": [0.0310, 1.5], "ask": [0.0312, 2.5]}},
+        '/market/depth': lambda q: {
+            "status": "ok", "ch": "market.ethbtc.depth.step0", "ts": int(time.time() * 1000),
+            "tick": {"bids": _levels(0.031, depth, 1e-6, True, False, rnd),
+                     "asks": _levels(0.031, depth, 1e-6, False, False, rnd)}},
+        '/market/history/kline': {
+            "status": "ok", "ch": "market.ethbtc.kline.1min", "ts": 1514764800000,
+            "data": [{"id": 1514764800 - i * 60, "open": 0.031, "close": 0.0311, "low": 0.030,
+                      "high": 0.032, "amount": 12.5, "vol": 0.39, "count": 10}
+                     for i in range(klines)]},
+        '/v1/order/orders/place': lambda q: {"status": "ok", "data": str(random.randint(1, 10 ** 9))},
+    }
+
+
+def gate_routes(depth=100):
+    rnd = random.Random(3)
+    pairs = [{"%s_%s" % (b, q): {"decimal_places": 6, "min_amount": 0.0001, "fee": 0.2}}
+             for b, q in SYMBOLS]
+    return {
+        '/api2/1/marketinfo': {"result": "true", "pairs": pairs},
+        '/api2/1/ticker': {"result": "true", "last": 0.0311, "lowestAsk": 0.0312,
+                           "highestBid": 0.0310, "percentChange": -0.3, "baseVolume": 38.2,
+                           "quoteVolume": 1234.5, "high24hr": 0.032, "low24hr": 0.030},
+        '/api2/1/orderBook': {"result": "true",
+                              "asks": _levels(0.031, depth, 1e-6, False, False, rnd)[::-1],
+                              "bids": _levels(0.031, depth, 1e-6, True, False, rnd)},
+        '/api2/1/private/buy': lambda q: {"result": "true", "message": "Success",
+                                          "orderNumber": random.randint(1, 10 ** 9)},
+        '/api2/1/private/sell': lambda q: {"result": "true", "message": "Success",
+                                           "orderNumber": random.randint(1, 10 ** 9)},
+    }
+
+
+def all_routes():
+    routes = {}
+    for build in (binance_routes, huobi_routes, gate_routes):
+        routes.update(build())
+    return routes
+
+
+# ---------------------------------------------------------------- HTTP 替身
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，不关闭 Nagle 时 keep-alive 连接会被延迟确认拖慢约 40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        server = self.server
+        body = server.static.get(url.path)
+        if body is None:
+            handler = server.dynamic.get(url.path)
+            if handler is None:
+                # Gate 的行情接口把交易对拼在路径里：/api2/1/ticker/eth_btc
+                parent = url.path.rsplit('/', 1)[0]
+                body = server.static.get(parent)
+                handler = server.dynamic.get(parent)
+            if body is None and handler is not None:
+                body = json.dumps(handler(parse_qs(url.query))).encode()
+        if server.delay:
+            time.sleep(server.delay)
+        if body is None:
+            self.send_response(404)
+            body = b'{"msg": "not found"}'
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = _reply
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # 并发下单时同时建立多个连接，默认的 backlog 5 会导致 SYN 被丢弃并等待 1 秒重传
+    request_queue_size = 128
+
+
+class StandInHTTPServer:
+    """模拟各交易所 REST 接口的本地 HTTP 服务"""
+
+    def __init__(self, routes=None, host='127.0.0.1', port=0, delay=0.0):
+        """
+        :param routes: {路径: 返回数据 或 函数(query) -> 返回数据}，默认 all_routes()
+        :param delay: 每个请求额外等待的秒数，用于模拟网络延迟
+        """
+        routes = all_routes() if routes is None else routes
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.static = {p: json.dumps(v).encode() for p, v in routes.items()
+                              if not callable(v)}
+        self._httpd.dynamic = {p: v for p, v in routes.items() if callable(v)}
+        self._httpd.delay = delay
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def point_clients_at(url):
+    """把各交易所 REST 封装的地址指向 url（如 http://127.0.0.1:8080）"""
+    from ..apis.binance.API import BinanceAPI
+    from ..apis.huobi import hb_util
+    from ..apis.huobi import API as huobi_api
+    from ..apis.gate.API import GateAPI
+    from ..apis.bigone import API as bigone_api
+
+    BinanceAPI.API_URL = url + '/api'
+    hb_util.MARKET_URL = hb_util.TRADE_URL = url
+    huobi_api.MARKET_URL = url
+    GateAPI.URL = url
+    # 与原地址一样以 / 结尾，封装直接拼接路径
+    bigone_api.BASE_URL = url.rstrip('/') + '/'
+
+
+# ---------------------------------------------------------------- websocket 替身
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def _frame(payload, opcode):
+    header = bytes([0x80 | opcode])
+    n = len(payload)
+    if n < 126:
+        header += bytes([n])
+    elif n < 65536:
+        header += bytes([126]) + struct.pack('!H', n)
+    else:
+        header += bytes([127]) + struct.pack('!Q', n)
+    return header + payload
+
+
+def binance_depth_diffs(symbol='ETHBTC', levels=20, seed=5):
+    """无限生成 Binance 深度增量消息（dict），约 10% 的价位数量为 0（删除）"""
+    rnd = random.Random(seed)
+    update_id = 161
+    while True:
+        bids, asks = [], []
+        for side, sign in ((bids, -1), (asks, 1)):
+            for _ in range(rnd.randint(1, levels)):
+                price = 0.031 + sign * rnd.randint(1, 1000) * 1e-6
+                amount = 0.0 if rnd.random() < 0.1 else rnd.uniform(0.01, 50)
+                side.append(['%.8f' % price, '%.8f' % amount, []])
+        n = rnd.randint(1, 3)
+        yield {"e": "depthUpdate", "E": 0, "s": symbol, "U": update_id,
+               "u": update_id + n - 1, "b": bids, "a": asks}
+        update_id += n
+
+
+def huobi_depth_ticks(symbol='ethbtc', levels=150, seed=6):
+    """无限生成 Huobi 深度快照推送（dict）"""
+    rnd = random.Random(seed)
+    while True:
+        yield {"ch": "market.%s.depth.step0" % symbol, "ts": 0,
+               "tick": {"bids": _levels(0.031, levels, 1e-6, True, False, rnd),
+                        "asks": _levels(0.031, levels, 1e-6, False, False, rnd)}}
+
+
+class StandInWebSocketServer:
+    """最小的 websocket 推送服务
+
+    路径 /binance/<任意> 推送 Binance 深度增量文本帧，事件时间 E 为发送时刻；
+    路径 /huobi/<任意> 推送 gzip 压缩的 Huobi 深度快照二进制帧，ts 为发送时刻。
+    推送 count 条后发送关闭帧。只实现基准测试需要的部分协议，客户端发来的
+    帧（订阅、pong）读取后丢弃。
+    """
+
+    def __init__(self, count=10000, rate=None, host='127.0.0.1', port=0):
+        """
+        :param count: 每个连接推送的消息数
+        :param rate: 每秒推送的消息数，None 或 0 表示尽快推送
+        """
+        self.count = count
+        self.rate = rate
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(16)
+        self._closed = False
+
+    @property
+    def url(self):
+        host, port = self._sock.getsockname()[:2]
+        return 'ws://%s:%d' % (host, port)
+
+    def start(self):
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def close(self):
+        self._closed = True
+        self._sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                conn.close()
+                return
+            request += chunk
+        lines = request.decode('latin-1').split('\r\n')
+        path = lines[0].split(' ')[1]
+        headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+        key = headers.get('Sec-WebSocket-Key') or headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+        conn.sendall(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                      'Connection: Upgrade\r\nSec-WebSocket-Accept: %s\r\n\r\n' % accept).encode())
+        threading.Thread(target=self._drain, args=(conn,), daemon=True).start()
+
+        huobi = path.startswith('/huobi')
+        source = huobi_depth_ticks() if huobi else binance_depth_diffs()
+        interval = 1.0 / self.rate if self.rate else 0
+        next_send = time.time()
+        try:
+            for _ in range(self.count):
+                msg = next(source)
+                if interval:
+                    next_send += interval
+                    delay = next_send - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                now = int(time.time() * 1000)
+                if huobi:
+                    msg['ts'] = now
+                    conn.sendall(_frame(gzip.compress(json.dumps(msg).encode(), 1), 0x2))
+                else:
+                    msg['E'] = now
+                    conn.sendall(_frame(json.dumps(msg).encode(), 0x1))
+            conn.sendall(_frame(struct.pack('!H', 1000), 0x8))
+        except OSError:
+            pass
+        finally:
+            time.sleep(0.1)
+            try:
+                # shutdown 才会立即发出 FIN，_drain 线程阻塞在 recv 时仅 close 不会
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    @staticmethod
+    def _drain(conn):
+        try:
+            while conn.recv(4096):
+                pass
+        except OSError:
+            pass
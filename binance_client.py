@@ -2,6 +2,8 @@
 
 from .apis.binance.API import BinanceAPI
 from .contract import PullQuotationSubscriber
+from .symbols import SymbolRegistry, SymbolCache
+from .concurrency import fan_out, place_orders, cancel_each, RateLimiter, MAX_WORKERS
 from .meta import exchange_api, quotation_provicer
 
 """
@@ -33,15 +35,27 @@ Binance 交易所客户端
 class BinanceClient(PullQuotationSubscriber):
     """Binance 交易所客户端"""
 
-    def __init__(self, biance_api_key=None, biance_api_secret=None):
+    def __init__(self, biance_api_key=None, biance_api_secret=None,
+                 symbol_ttl=3600, order_rate=10):
         self.name = "Binance"
         self.api_key = biance_api_key
         self.secret_key = biance_api_secret
         self.client = BinanceAPI(self.api_key, self.secret_key)
+        self._symbol_cache = SymbolCache(self.get_exchange_symbols, symbol_ttl)
+        self._user_data = None
+        # 下单、撤单限速（次/秒），批量下单和批量撤单共用
+        self.order_limiter = RateLimiter(order_rate)
 
-    @staticmethod
-    def _check_transform(symbol):
-        return symbol.replace('_', "").replace('/', "").upper()
+    def _check_transform(self, symbol):
+        return self.get_symbol_registry().to_native(symbol)
+
+    def get_symbol_registry(self):
+        """交易对注册表，首次调用时从交易所加载，之后按 TTL 在后台刷新"""
+        return self._symbol_cache.get()
+
+    def is_supported_symbol(self, symbol):
+        """是否支持该交易对"""
+        return self._symbol_cache.get().is_supported(symbol)
 
     """
     基础信息查询 API
@@ -71,16 +85,9 @@ class BinanceClient(PullQuotationSubscriber):
         info = self.client.get_exchange_info()
         info = info['symbols']
 
-        data = {"raw": info, "exchange": self.name}
-
-        symbols = []
-        for s in info:
-            base = s['baseAsset']
-            quote = s['quoteAsset']
-            symbol = base + '_' + quote
-            symbols.append(symbol.lower())
-
-        data['symbols'] = symbols
+        registry = self._symbol_cache.set(SymbolRegistry.from_binance(self.name, info))
+        data = {"raw": info, "exchange": self.name,
+                "symbols": list(registry.symbols)}
         return data
 
     # 获取当前所在交易所支持的币种
@@ -93,17 +100,8 @@ class BinanceClient(PullQuotationSubscriber):
             "currencies": ["usdt", "btc", ... ],
             }
         """
-        data = self.get_exchange_symbols()
-        currencies = []
-        if data['symbols']:
-            for i in data['symbols']:
-                base, quote = i.split('_')
-                currencies.append(base)
-                currencies.append(quote)
-            return {"exchange": data['exchange'],
-                    "currencies": list(set(currencies))}
-        else:
-            print('get_exchange_symbols方法未定义或调用失败')
+        return {"exchange": self.name,
+                "currencies": list(self._symbol_cache.get().currencies)}
 
     # 获取当前所在交易所的全部API接口
     def get_exchange_apis(self):
@@ -369,9 +367,37 @@ class BinanceClient(PullQuotationSubscriber):
         else:
             return {"order_id": order_id, "submitted": False}
 
+    # 批量下单
+    def place_orders(self, orders, max_workers=MAX_WORKERS):
+        """批量下单，按 order_limiter 限速并发提交，单个订单失败不影响其他订单
+
+        :param orders: [{"symbol": 交易对, "side": "buy"/"sell", "price": 价格,
+                         "amount": 数量, "type_": 市价单（0） or 限价单（1）}, ...]
+        :return:
+            [{"order": 下单参数, "success": 是否成功, "order_id": 订单id, "error": 错误信息}, ...]
+        """
+        return place_orders(self, orders, limiter=self.order_limiter,
+                            max_workers=max_workers)
+
+    # 批量取消多个订单
+    def cancel_orders(self, order_ids, symbol, max_workers=MAX_WORKERS):
+        """批量取消同一交易对的多个订单，Binance 没有批量撤单接口，按限速并发逐个撤单
+
+        :param order_ids: 需要取消的订单列表
+        :param symbol: 交易对
+        :return:
+            {
+            "success_submitted": 成功提交撤单的订单列表,
+            "fail_submitted": 撤单提交失败的订单列表,
+            "errors": {订单id: 错误信息}
+            }
+        """
+        return cancel_each(lambda i: self.cancel_order(i, symbol), order_ids,
+                           self.order_limiter, max_workers)
+
     # 查询某个订单详情
     def get_order(self, order_id, symbol):
-        """查询某个订单详情
+        """查询某个订单详情，开启用户数据推送后优先从本地订单表读取
 
         :param order_id: 需要查询的订单id
         :return:
@@ -385,8 +411,65 @@ class BinanceClient(PullQuotationSubscriber):
             "type": 订单类型, BUY :买单，SELL : 卖单
             }
         """
+        if self._user_data is not None:
+            info = self._user_data.get_order(order_id)
+            if info is not None:
+                return self._format_order(info)
         symbol = self._check_transform(symbol=symbol)
         info = self.client.get_order(symbol=symbol, orderId=order_id)
+        return self._format_order(info)
+
+    # 批量查询多个订单详情
+    def get_orders(self, order_ids, symbol, max_workers=MAX_WORKERS):
+        """批量查询同一交易对的多个订单详情
+
+        开启用户数据推送时先读本地订单表；其余订单用 get_all_orders 从最小的
+        订单id开始一次取回，仍未取到的再并发逐个查询。
+
+        :param order_ids: 需要查询的订单id列表
+        :param symbol: 交易对
+        :param max_workers: 逐个查询时的最大并发数
+        :return:
+            {
+            "raw": get_all_orders 返回的原始信息,
+            "orders": [get_order 格式的订单, ...]，与 order_ids 顺序一致,
+            "errors": {订单id: 错误信息}，查询失败的订单
+            }
+        """
+        order_ids = [int(i) for i in order_ids]
+        orders = {}
+        if self._user_data is not None:
+            for order_id in order_ids:
+                info = self._user_data.get_order(order_id)
+                if info is not None:
+                    orders[order_id] = info
+
+        symbol = self._check_transform(symbol=symbol)
+        raw = []
+        missing = [i for i in order_ids if i not in orders]
+        if missing:
+            raw = self.client.get_all_orders(symbol=symbol, orderId=min(missing),
+                                             limit=500)
+            wanted = set(missing)
+            for info in raw:
+                if info['orderId'] in wanted:
+                    orders[info['orderId']] = info
+
+        errors = {}
+        missing = [i for i in order_ids if i not in orders]
+        results = fan_out(lambda i: self.client.get_order(symbol=symbol, orderId=i),
+                          missing, max_workers)
+        for order_id, info, error in results:
+            if error is None:
+                orders[order_id] = info
+            else:
+                errors[order_id] = str(error)
+
+        return {"raw": raw,
+                "orders": [self._format_order(orders[i]) for i in order_ids if i in orders],
+                "errors": errors}
+
+    def _format_order(self, info):
         data = {'raw': info,
                 "id": info['orderId'],
                 "price": info['price'],
@@ -425,7 +508,7 @@ class BinanceClient(PullQuotationSubscriber):
 
     # 查询账户余额
     def get_assets(self):
-        """查询账户余额
+        """查询账户余额，开启用户数据推送后直接从本地读取
 
         :return:
             非空数字资产余额
@@ -438,7 +521,10 @@ class BinanceClient(PullQuotationSubscriber):
                         ],
             }
         """
-        info = self.client.get_account()
+        if self._user_data is not None:
+            info = self._user_data.get_account()
+        else:
+            info = self.client.get_account()
         data = {"raw": info, "exchange": self.name}
 
         info = info['balances']
@@ -456,3 +542,33 @@ class BinanceClient(PullQuotationSubscriber):
 
         data['balances'] = balances
         return data
+
+    """
+    用户数据推送
+    ===========================================================
+    """
+
+    # 开启用户数据推送
+    def start_user_stream(self, callback=None):
+        """开启用户数据推送（websocket），在本地维护未完成订单和账户余额，
+        之后 get_order、get_assets 直接从内存读取，不再请求 REST
+
+        :param callback: 可选，收到每条用户数据推送后调用 callback(msg)
+        """
+        if self._user_data is None:
+            # websocket 依赖按需导入，只用 REST 时不需要安装
+            from .apis.binance.userdata import UserDataCache
+            self._user_data = UserDataCache(self.client, callback=callback)
+            self._user_data.start()
+        return self._user_data
+
+    # 用 REST 数据校准本地订单和余额
+    def reconcile_user_stream(self):
+        if self._user_data is not None:
+            self._user_data.reconcile()
+
+    # 关闭用户数据推送
+    def stop_user_stream(self):
+        if self._user_data is not None:
+            self._user_data.close()
+            self._user_data = None
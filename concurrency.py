@@ -0,0 +1,129 @@
+# -*- coding:utf-8 -*-
+"""
+并发请求工具
+==============================================================
+交易所没有批量接口时，用有限大小的线程池并发发起多个 REST 请求。
+各交易所的 REST 封装都是同步阻塞的（requests / http.client），
+线程池即可把 N 次串行往返压缩到约 N / max_workers 次。
+下单、撤单类请求通过 RateLimiter（令牌桶）限速，避免触发交易所的频率限制。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 8
+
+
+class RateLimiter:
+    """令牌桶限速器，线程安全
+
+    每秒补充 rate 个令牌，最多积累 burst 个；acquire 在令牌不足时阻塞等待。
+    同一交易所的多个批量操作应共用一个限速器。
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: 每秒允许的请求数
+        :param burst: 允许的突发请求数，默认等于 rate
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def fan_out(func, items, max_workers=MAX_WORKERS, limiter=None):
+    """对 items 中的每个元素并发调用 func(item)
+
+    单个请求失败不影响其他请求。
+
+    :param func: 单个请求函数
+    :param items: 参数列表
+    :param max_workers: 最大并发数
+    :param limiter: RateLimiter，每个请求发出前先取得一个令牌
+    :return: [(item, result, error), ...]，与 items 顺序一致，成功时 error 为 None
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            if limiter is not None:
+                limiter.acquire()
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+
+    if len(items) == 1 or max_workers <= 1:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(call, items))
+
+
+def place_orders(client, orders, order_id=None, limiter=None, max_workers=MAX_WORKERS):
+    """并发下单，调用 client.buy / client.sell
+
+    :param client: 交易所客户端
+    :param orders: [{"symbol": 交易对, "side": "buy"/"sell", "price": 价格,
+                     "amount": 数量, "type_": 市价单（0） or 限价单（1），默认 1}, ...]
+    :param order_id: 从 buy/sell 返回值中取出订单id的函数，默认返回值即订单id
+    :param limiter: RateLimiter
+    :param max_workers: 最大并发数
+    :return: 与 orders 顺序一致的下单结果
+        [{"order": 下单参数, "success": 是否成功, "order_id": 订单id, "error": 错误信息}, ...]
+    """
+    def place(order):
+        side = order['side'].lower()
+        if side not in ('buy', 'sell'):
+            raise ValueError('side 只能是 buy 或 sell：%s' % order['side'])
+        return getattr(client, side)(symbol=order['symbol'], price=order.get('price'),
+                                     amount=order['amount'], type_=order.get('type_', 1))
+
+    outcomes = []
+    for order, result, error in fan_out(place, orders, max_workers, limiter):
+        oid = None
+        if error is None and result is not None:
+            oid = order_id(result) if order_id else result
+        if error is None and oid is None:
+            error = '下单失败'
+        outcomes.append({"order": order, "success": error is None,
+                         "order_id": oid,
+                         "error": None if error is None else str(error)})
+    return outcomes
+
+
+def cancel_each(cancel, order_ids, limiter=None, max_workers=MAX_WORKERS):
+    """交易所没有批量撤单接口时，并发逐个撤单
+
+    :param cancel: 单个撤单函数 cancel(order_id)，返回 {"order_id": .., "submitted": ..}
+    :return:
+        {
+        "success_submitted": 成功提交撤单的订单列表,
+        "fail_submitted": 撤单提交失败的订单列表,
+        "errors": {订单id: 错误信息}
+        }
+    """
+    success, fail, errors = [], [], {}
+    for order_id, result, error in fan_out(cancel, order_ids, max_workers, limiter):
+        if error is None and result and result.get('submitted'):
+            success.append(order_id)
+        else:
+            fail.append(order_id)
+            if error is not None:
+                errors[order_id] = str(error)
+    return {"success_submitted": success, "fail_submitted": fail, "errors": errors}
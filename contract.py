@@ -109,11 +109,18 @@ class ExchangeClient:
 
 class Asset:
 
+    __slots__ = ('symbol', 'balance', 'fronzen_balance')
+
     def __str__(self):
-        return json.dumps(self.__dict__, ensure_ascii=True, indent=2)
+        return json.dumps(self.to_dict(), ensure_ascii=True, indent=2)
+
+    def to_dict(self):
+        return {'symbol': self.symbol,
+                'balance': self.balance,
+                'fronzen_balance': self.fronzen_balance}
 
     def to_json(self, ensure_ascii=False):
-        return json.dumps(self.__dict__, ensure_ascii=ensure_ascii, indent=2)
+        return json.dumps(self.to_dict(), ensure_ascii=ensure_ascii, indent=2)
 
     def __init__(self, symbol, balance=0):
         self.symbol = symbol
@@ -126,3 +133,10 @@ class AssetException(Exception):
     def __init__(self, message, asset):
         msg = message + ':' + str(asset)
         Exception.__init__(self, msg)
+
+
+class SymbolException(Exception):
+
+    def __init__(self, message, symbol):
+        msg = message + ':' + str(symbol)
+        Exception.__init__(self, msg)
@@ -0,0 +1,272 @@
+# -*- coding:utf-8 -*-
+"""
+跨交易所盘口聚合
+==============================================================
+各交易所 get_depth 返回的盘口格式略有不同（Binance 为字符串价格，
+Huobi 为浮点列表），这里统一规范为 (price, amount) 浮点二元组，
+按交易所维护增量盘口，并在此基础上增量维护跨交易所的合并盘口
+（最优买卖价和深度阶梯）。每次更新只改动涉及的价位，不做全量重算。
+"""
+
+from bisect import bisect_left, insort
+
+
+def normalize_levels(levels):
+    """把各交易所的挂单列表统一为 [(price, amount), ...] 浮点二元组
+
+    支持 ["0.1", "2", []]、[0.1, 2] 以及 {"price": .., "amount": ..} 三种格式
+    """
+    result = []
+    for level in levels:
+        if isinstance(level, dict):
+            result.append((float(level['price']), float(level['amount'])))
+        else:
+            result.append((float(level[0]), float(level[1])))
+    return result
+
+
+class BookSide:
+    """单边盘口，价格升序存放，买盘从尾部读取"""
+
+    __slots__ = ('reverse', '_levels', '_prices')
+
+    def __init__(self, reverse=False):
+        """
+        :param reverse: True 为买盘（价格降序），False 为卖盘（价格升序）
+        """
+        self.reverse = reverse
+        self._levels = {}
+        self._prices = []
+
+    def __len__(self):
+        return len(self._prices)
+
+    def __contains__(self, price):
+        return price in self._levels
+
+    def get(self, price):
+        return self._levels.get(price, 0.0)
+
+    def set(self, price, amount):
+        """设置价位数量，数量为 0 时删除该价位
+
+        :return: 该价位原来的数量
+        """
+        levels = self._levels
+        old = levels.get(price, 0.0)
+        if amount > 0:
+            if not old:
+                insort(self._prices, price)
+            levels[price] = amount
+        elif old:
+            del levels[price]
+            prices = self._prices
+            del prices[bisect_left(prices, price)]
+        return old
+
+    def best(self):
+        """最优价位 (price, amount)，空盘口返回 None"""
+        if not self._prices:
+            return None
+        price = self._prices[-1] if self.reverse else self._prices[0]
+        return price, self._levels[price]
+
+    def prices(self, depth=None):
+        """按盘口顺序返回价格列表"""
+        prices = self._prices
+        if self.reverse:
+            if depth is None:
+                return prices[::-1]
+            return prices[:-depth - 1:-1] if depth < len(prices) else prices[::-1]
+        return prices[:depth]
+
+    def levels(self, depth=None):
+        """按盘口顺序返回 [[price, amount], ...]"""
+        levels = self._levels
+        return [[p, levels[p]] for p in self.prices(depth)]
+
+    def clear(self):
+        self._levels.clear()
+        del self._prices[:]
+
+
+class OrderBook:
+    """单个交易所、单个交易对的规范化增量盘口"""
+
+    __slots__ = ('exchange', 'symbol', 'bids', 'asks')
+
+    def __init__(self, exchange, symbol):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.bids = BookSide(reverse=True)
+        self.asks = BookSide(reverse=False)
+
+    def get_bids(self, depth=None):
+        return self.bids.levels(depth)
+
+    def get_asks(self, depth=None):
+        return self.asks.levels(depth)
+
+    def top(self):
+        """(最优买, 最优卖)，各为 (price, amount) 或 None"""
+        return self.bids.best(), self.asks.best()
+
+
+class _ConsolidatedSide:
+    """合并盘口的一边：每个价位记录总量以及各交易所的数量"""
+
+    __slots__ = ('side', '_venues')
+
+    def __init__(self, reverse):
+        self.side = BookSide(reverse)
+        self._venues = {}
+
+    def apply(self, exchange, price, old, new):
+        if old == new:
+            return
+        venues = self._venues.get(price)
+        if venues is None:
+            venues = self._venues[price] = {}
+        if new > 0:
+            venues[exchange] = new
+        else:
+            venues.pop(exchange, None)
+        if venues:
+            # 每个价位的交易所数量很少，直接求和避免浮点误差累积
+            self.side.set(price, sum(venues.values()))
+        else:
+            del self._venues[price]
+            self.side.set(price, 0.0)
+
+    def best(self):
+        top = self.side.best()
+        if top is None:
+            return None
+        return top[0], top[1], dict(self._venues[top[0]])
+
+    def levels(self, depth=None):
+        side = self.side
+        return [[p, side.get(p), dict(self._venues[p])] for p in side.prices(depth)]
+
+
+class DepthAggregator:
+    """跨交易所盘口聚合器
+
+    用法：
+
+        agg = DepthAggregator()
+        agg.apply_depth('Binance', 'eth_btc', binance_client.get_depth('eth_btc'))
+        agg.apply_depth('Huobi', 'eth_btc', huobi_client.get_depth('eth_btc'))
+        agg.update('Huobi', 'eth_btc', bids=[[0.031, 0]])   # 增量：数量为 0 删除价位
+        agg.top_of_book('eth_btc')
+    """
+
+    def __init__(self):
+        self._books = {}         # (exchange, symbol) -> OrderBook
+        self._consolidated = {}  # symbol -> (bids, asks)
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """注册回调，某交易所盘口最优价位变化时调用 callback(exchange, symbol, book)"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def get_book(self, exchange, symbol):
+        """返回单个交易所的 OrderBook，不存在时创建"""
+        key = (exchange, symbol)
+        book = self._books.get(key)
+        if book is None:
+            book = self._books[key] = OrderBook(exchange, symbol)
+            if symbol not in self._consolidated:
+                self._consolidated[symbol] = (_ConsolidatedSide(True),
+                                              _ConsolidatedSide(False))
+        return book
+
+    def books(self, symbol=None):
+        """返回全部（或指定交易对的）单交易所盘口"""
+        return [b for (_, s), b in self._books.items() if symbol is None or s == symbol]
+
+    def update(self, exchange, symbol, bids=(), asks=()):
+        """应用增量更新，数量为 0 表示删除该价位
+
+        :param bids: 买盘变动 [[price, amount], ...]
+        :param asks: 卖盘变动 [[price, amount], ...]
+        """
+        book = self.get_book(exchange, symbol)
+        c_bids, c_asks = self._consolidated[symbol]
+        top = book.top()
+        for price, amount in normalize_levels(bids):
+            c_bids.apply(exchange, price, book.bids.set(price, amount), amount)
+        for price, amount in normalize_levels(asks):
+            c_asks.apply(exchange, price, book.asks.set(price, amount), amount)
+        self._notify(book, top)
+
+    def apply_snapshot(self, exchange, symbol, bids, asks):
+        """用完整盘口替换某交易所的盘口，只对变化的价位做增量更新"""
+        book = self.get_book(exchange, symbol)
+        c_bids, c_asks = self._consolidated[symbol]
+        top = book.top()
+        for side, consolidated, levels in ((book.bids, c_bids, bids),
+                                           (book.asks, c_asks, asks)):
+            levels = dict(normalize_levels(levels))
+            for price in side.prices():
+                if price not in levels:
+                    consolidated.apply(exchange, price, side.set(price, 0.0), 0.0)
+            for price, amount in levels.items():
+                if side.get(price) != amount:
+                    consolidated.apply(exchange, price, side.set(price, amount), amount)
+        self._notify(book, top)
+
+    def apply_depth(self, exchange, symbol, depth):
+        """应用 get_depth 的返回值（完整盘口）"""
+        self.apply_snapshot(exchange, symbol, depth['bids'], depth['asks'])
+
+    def remove(self, exchange, symbol):
+        """移除某交易所的盘口（如断线时）"""
+        book = self._books.get((exchange, symbol))
+        if book is not None:
+            self.apply_snapshot(exchange, symbol, [], [])
+            del self._books[(exchange, symbol)]
+
+    def _notify(self, book, old_top):
+        if self._listeners and book.top() != old_top:
+            for callback in self._listeners:
+                callback(book.exchange, book.symbol, book)
+
+    def best_bid(self, symbol):
+        """合并后的最优买价 (price, amount, {exchange: amount})"""
+        return self._consolidated[symbol][0].best()
+
+    def best_ask(self, symbol):
+        """合并后的最优卖价 (price, amount, {exchange: amount})"""
+        return self._consolidated[symbol][1].best()
+
+    def top_of_book(self, symbol):
+        """合并后的最优买卖价
+
+        :return:
+            {
+            "symbol": 交易对,
+            "bid": (price, amount, {exchange: amount}) 或 None,
+            "ask": (price, amount, {exchange: amount}) 或 None,
+            }
+        """
+        c_bids, c_asks = self._consolidated[symbol]
+        return {"symbol": symbol, "bid": c_bids.best(), "ask": c_asks.best()}
+
+    def get_ladder(self, symbol, depth=None):
+        """合并后的深度阶梯
+
+        :return:
+            {
+            "symbol": 交易对,
+            "bids": [[price, amount, {exchange: amount}], ...], 按price降序,
+            "asks": [[price, amount, {exchange: amount}], ...], 按price升序,
+            }
+        """
+        c_bids, c_asks = self._consolidated[symbol]
+        return {"symbol": symbol,
+                "bids": c_bids.levels(depth),
+                "asks": c_asks.levels(depth)}
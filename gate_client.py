@@ -1,6 +1,8 @@
 # -*- coding:utf-8 -*-
 
 from .apis.gate.API import GateAPI
+from .symbols import SymbolRegistry, SymbolCache
+from .concurrency import fan_out, place_orders, cancel_each, RateLimiter, MAX_WORKERS
 import time
 
 """
@@ -17,19 +19,26 @@ Gate 交易所客户端
 class GateClient:
     """统一API客户端"""
 
-    def __init__(self, api_key=None, secret_key=None):
+    def __init__(self, api_key=None, secret_key=None, symbol_ttl=3600,
+                 order_rate=10):
         self.name = "Gate"
         self.api_key = api_key
         self.secret_key = secret_key
         self.client = GateAPI(self.api_key, self.secret_key)
+        self._symbol_cache = SymbolCache(self.get_exchange_symbols, symbol_ttl)
+        # 下单、撤单限速（次/秒），批量下单和批量撤单共用
+        self.order_limiter = RateLimiter(order_rate)
 
-    @staticmethod
-    def _check_transform(symbol):
-        if "_" not in symbol:
-            print("symbol 规则：基础币种+计价币种。如BTC/USDT，"
-                  "symbol为btc_usdt；ETH/BTC， symbol为eth_btc，以此类推。")
-        else:
-            return symbol
+    def _check_transform(self, symbol):
+        return self.get_symbol_registry().to_native(symbol)
+
+    def get_symbol_registry(self):
+        """交易对注册表，首次调用时从交易所加载，之后按 TTL 在后台刷新"""
+        return self._symbol_cache.get()
+
+    def is_supported_symbol(self, symbol):
+        """是否支持该交易对"""
+        return self._symbol_cache.get().is_supported(symbol)
 
     """
     基础信息查询 API
@@ -54,10 +63,10 @@ class GateClient:
             "symbols": ["usdt_btc", "eth_btc", ... ],
             }
         """
-        data = {"raw": None, "exchange": self.name, "symbols": None}
-        symbols = self.client.pairs()
-        data['raw'] = symbols
-        data["symbols"] = symbols
+        info = self.client.marketinfo()
+        registry = self._symbol_cache.set(SymbolRegistry.from_gate(self.name, info['pairs']))
+        data = {"raw": info, "exchange": self.name,
+                "symbols": list(registry.symbols)}
         return data
 
     # 获取当前所在交易所支持的币种
@@ -70,17 +79,8 @@ class GateClient:
             "currencies": ["usdt", "btc", ... ],
             }
         """
-        data = self.get_exchange_symbols()
-        currencies = []
-        if data['symbols']:
-            for i in data['symbols']:
-                base, quote = i.split('_')
-                currencies.append(base)
-                currencies.append(quote)
-            return {"exchange": data['exchange'],
-                    "currencies": list(set(currencies))}
-        else:
-            raise NotImplementedError('get_exchange_symbols方法未定义或调用失败')
+        return {"exchange": self.name,
+                "currencies": list(self._symbol_cache.get().currencies)}
 
     # 获取当前所在交易所的全部API接口
     def get_exchange_apis(self):
@@ -318,6 +318,7 @@ class GateClient:
             {"order_id": 订单id,
             "submitted": 是否取消成功，成功为 True}
         """
+        symbol = self._check_transform(symbol=symbol)
         info = self.client.cancelOrder(orderNumber=order_id,
                                        currencyPair=symbol)
         if info['result'] == "true":
@@ -325,19 +326,33 @@ class GateClient:
         else:
             return {"order_id": order_id, "submitted": False}
 
+    # 批量下单
+    def place_orders(self, orders, max_workers=MAX_WORKERS):
+        """批量下单，按 order_limiter 限速并发提交，单个订单失败不影响其他订单
+
+        :param orders: [{"symbol": 交易对, "side": "buy"/"sell", "price": 价格,
+                         "amount": 数量}, ...]
+        :return:
+            [{"order": 下单参数, "success": 是否成功, "order_id": 订单id, "error": 错误信息}, ...]
+        """
+        return place_orders(self, orders, order_id=lambda r: r['order_id'],
+                            limiter=self.order_limiter, max_workers=max_workers)
+
     # 批量取消多个订单
-    def cancel_orders(self, order_ids):
-        """批量取消多个订单
+    def cancel_orders(self, order_ids, symbol, max_workers=MAX_WORKERS):
+        """批量取消同一交易对的多个订单，按限速并发逐个撤单
 
-        :param order_ids: list/str 需要取消的订单列表，
-        如果order_ids='all', 则取消订单列表中的所有订单
+        :param order_ids: 需要取消的订单列表
+        :param symbol: 交易对
         :return:
             {
             "success_submitted": 成功提交撤单的订单列表,
-            "fail_submitted": 撤单提交失败的订单列表
+            "fail_submitted": 撤单提交失败的订单列表,
+            "errors": {订单id: 错误信息}
             }
         """
-        raise NotImplementedError("取消多个订单的接口还没有实现")
+        return cancel_each(lambda i: self.cancel_order(symbol, i), order_ids,
+                           self.order_limiter, max_workers)
 
     # 查询某个订单详情
     def get_order(self, symbol, order_id):
@@ -358,25 +373,34 @@ class GateClient:
             "type": 订单类型, BUY :买单，SELL : 卖单
             }
         """
+        symbol = self._check_transform(symbol=symbol)
         info = self.client.getOrder(orderNumber=order_id, currencyPair=symbol)
 
         assert info['result'] == "true", "获取订单详情失败"
+        data = self._format_order(info['order'])
+        data['raw'] = info
+        return data
+
+    @staticmethod
+    def _format_order(order):
+        """getOrder 的 order 和 openOrders 的 orders 字段略有不同，这里统一处理"""
         data = {
-            "raw": info,
-            "id": info['order']['id'],
-            "price": info['order']['initialRate'],
-            "amount": info['order']['initialAmount'],
-            "deal_amount": info['order']['amount']
+            "id": order.get('id', order.get('orderNumber')),
+            "price": order['initialRate'],
+            "amount": order['initialAmount'],
+            "deal_amount": order.get('filledAmount', order['amount'])
         }
 
         # add status
-        if info['order']['status'] == 'cancelled':
+        if order['status'] == 'open':
+            data['status'] = "PENDING"
+        elif order['status'] == 'cancelled':
             data['status'] = "CANCELED"
         else:
             data['status'] = "CLOSED"
 
         # add type
-        if info['order']['type'] == 'sell':
+        if order['type'] == 'sell':
             data['type'] = "SELL"
         else:
             data['type'] = "BUY"
@@ -384,13 +408,18 @@ class GateClient:
         return data
 
     # - 批量查询多个订单详情
-    def get_orders(self, order_ids):
+    def get_orders(self, order_ids, symbol=None, max_workers=MAX_WORKERS):
         """批量查询多个订单详情
 
+        先用 openOrders 一次取回所有挂单，不在挂单列表中的订单再并发调用
+        getOrder 逐个查询（需要指定 symbol）。
+
         :param order_ids: 需要查询的订单id列表
+        :param symbol: 交易对
+        :param max_workers: 最大并发数
         :return:
             {
-            "raw": 交易所返回的原始信息,
+            "raw": openOrders 返回的原始信息,
             "orders": [
                 {
                 "id": 订单唯一标识符,
@@ -402,10 +431,40 @@ class GateClient:
                 },
                 ...
                 ...
-            ]
+            ],
+            "errors": {订单id: 错误信息}，查询失败的订单
             }
         """
-        raise NotImplementedError("批量查询多个订单详情接口还没有实现")
+        order_ids = [str(i) for i in order_ids]
+        info = self.client.openOrders()
+        assert info['result'] == "true", "获取挂单列表失败"
+        wanted = set(order_ids)
+        found = {}
+        for order in info['orders']:
+            if str(order['orderNumber']) in wanted:
+                found[str(order['orderNumber'])] = order
+
+        errors = {}
+        missing = [i for i in order_ids if i not in found]
+        if missing and symbol is None:
+            for order_id in missing:
+                errors[order_id] = "订单不在挂单列表中，需要指定 symbol 查询"
+            missing = []
+        if missing:
+            symbol = self._check_transform(symbol=symbol)
+        for order_id, result, error in fan_out(
+                lambda i: self.client.getOrder(orderNumber=i, currencyPair=symbol),
+                missing, max_workers):
+            if error is not None:
+                errors[order_id] = str(error)
+            elif result.get('result') != "true":
+                errors[order_id] = str(result.get('message', result))
+            else:
+                found[order_id] = result['order']
+
+        return {"raw": info,
+                "orders": [self._format_order(found[i]) for i in order_ids if i in found],
+                "errors": errors}
 
     # 提现、转账
     def withdraw(self, address, currency, amount):
@@ -12,8 +12,14 @@ Huobi 交易所客户端
 from .base_client import Client
 from .apis.huobi.API import HuobiAPI
 from .contract import PullQuotationSubscriber
+from .symbols import SymbolRegistry, SymbolCache
+from .order_index import OrderIndex
+from .concurrency import fan_out, place_orders, RateLimiter, MAX_WORKERS
 from .meta import exchange_api, quotation_provicer
 
+# 本地订单状态：撤单已被交易所受理，最终状态以 order_info 为准
+CANCEL_SUBMITTED = 'submit-cancel'
+
 
 @exchange_api('Huobi', configs=[
     {
@@ -33,17 +39,47 @@ from .meta import exchange_api, quotation_provicer
 class HuobiClient(PullQuotationSubscriber):
     """统一API客户端"""
 
-    def __init__(self, huobi_api_key=None, huobi_api_secret=None):
+    def __init__(self, huobi_api_key=None, huobi_api_secret=None,
+                 symbol_ttl=3600, max_terminal_orders=1000, order_rate=10):
         self.name = "Huobi"
         self.client = HuobiAPI(huobi_api_key, huobi_api_secret)
         if huobi_api_key is not None and huobi_api_secret is not None:
             self.accounts = self.client.get_accounts()
             self.spot_acc_id = self.accounts[0]['id']  # 现货账户id
-        self.order_ids = {"buy": [], "sell": [], "cancel": []}
+        # 本地订单索引，终结状态的订单只保留最近 max_terminal_orders 条；
+        # 下单返回字符串 id，order_info 返回整数 id，统一用字符串作键。
+        # 撤单被交易所受理后记为 submit-cancel，不再占用未完成订单，
+        # 只撤单、不查询订单的做市程序内存也不会增长
+        self.orders = OrderIndex(
+            terminal_states=('filled', 'canceled', 'partial-canceled', CANCEL_SUBMITTED),
+            max_terminal=max_terminal_orders)
+        self._symbol_cache = SymbolCache(self.get_exchange_symbols, symbol_ttl)
+        # 下单、撤单限速（次/秒），批量下单和批量撤单共用
+        self.order_limiter = RateLimiter(order_rate)
+
+    def _check_transform(self, symbol):
+        return self.get_symbol_registry().to_native(symbol)
+
+    @property
+    def order_ids(self):
+        """兼容旧接口：{"buy": 未完成买单, "sell": 未完成卖单, "cancel": 已提交撤单的订单}
+
+        cancel 中已受理的撤单来自终结订单保留区，最多 max_terminal_orders 条
+        """
+        return {"buy": self.orders.open_ids(side='buy'),
+                "sell": self.orders.open_ids(side='sell'),
+                "cancel": [o['id'] for o in self.orders.open_orders()
+                           if o.get('cancel_submitted')] +
+                          [o['id'] for o in self.orders.terminal_orders()
+                           if o['state'] == CANCEL_SUBMITTED]}
 
-    @staticmethod
-    def _check_transform(symbol):
-        return symbol.lower().replace('_', "").replace('/', "")
+    def get_symbol_registry(self):
+        """交易对注册表，首次调用时从交易所加载，之后按 TTL 在后台刷新"""
+        return self._symbol_cache.get()
+
+    def is_supported_symbol(self, symbol):
+        """是否支持该交易对"""
+        return self._symbol_cache.get().is_supported(symbol)
 
     """
     基础信息查询 API
@@ -62,14 +98,24 @@ class HuobiClient(PullQuotationSubscriber):
     # 获取当前所在交易所支持的交易对
     def get_exchange_symbols(self):
         raw = self.client.get_symbols()
-        data = {"raw": raw, "exchange": self.name}
-        symbols = []
-        for d in raw['data']:
-            symbol = d['base-currency'] + '_' + d['quote-currency']
-            symbols.append(symbol)
-        data['symbols'] = symbols
+        registry = self._symbol_cache.set(SymbolRegistry.from_huobi(self.name, raw['data']))
+        data = {"raw": raw, "exchange": self.name,
+                "symbols": list(registry.symbols)}
         return data
 
+    # 获取当前所在交易所支持的币种
+    def get_exchange_currencies(self):
+        """查询当前交易所支持的所有币种
+
+        :return:
+            {
+            "exchange": 交易所名称,
+            "currencies": ["usdt", "btc", ... ],
+            }
+        """
+        return {"exchange": self.name,
+                "currencies": list(self._symbol_cache.get().currencies)}
+
     """
     行情查询 API
     =====================================================================================
@@ -299,7 +345,8 @@ class HuobiClient(PullQuotationSubscriber):
                                       symbol=symbol, amount=amount,
                                       type="buy-market")
         if info['status'] == 'ok':
-            self.order_ids['buy'].append(info['data'])
+            self.orders.update(str(info['data']), symbol=symbol, side='buy',
+                               state='submitted', price=price, amount=amount)
             return info['data']
         else:
             print("下买单失败！")
@@ -326,7 +373,8 @@ class HuobiClient(PullQuotationSubscriber):
                                       symbol=symbol, amount=amount,
                                       type="sell-market")
         if info['status'] == 'ok':
-            self.order_ids['sell'].append(info['data'])
+            self.orders.update(str(info['data']), symbol=symbol, side='sell',
+                               state='submitted', price=price, amount=amount)
             return info['data']
         else:
             print("下买单失败！")
@@ -342,44 +390,71 @@ class HuobiClient(PullQuotationSubscriber):
             {"order_id": 订单id,
             "submitted": 是否取消成功，成功为 True}
         """
-        if order_id not in self.order_ids['buy'] \
-                and order_id not in self.order_ids['sell']:
+        if str(order_id) not in self.orders:
             raise ValueError('输入的 order_id 不在列表中，请检查！')
         data = {"order_id": order_id}
         info = self.client.cancel_order(order_id=order_id)
         if info['status'] == 'ok':
-            self.order_ids['cancel'].append(info['data'])
+            self.orders.update(str(order_id), state=CANCEL_SUBMITTED, cancel_submitted=True)
             data['submitted'] = True
         else:
             data['submitted'] = False
         return data
 
+    # 批量下单
+    def place_orders(self, orders, max_workers=MAX_WORKERS):
+        """批量下单，按 order_limiter 限速并发提交，单个订单失败不影响其他订单
+
+        :param orders: [{"symbol": 交易对, "side": "buy"/"sell", "price": 价格,
+                         "amount": 数量, "type_": 市价单（0） or 限价单（1）}, ...]
+        :return:
+            [{"order": 下单参数, "success": 是否成功, "order_id": 订单id, "error": 错误信息}, ...]
+        """
+        return place_orders(self, orders, limiter=self.order_limiter,
+                            max_workers=max_workers)
+
     # 批量取消多个订单
-    def cancel_orders(self, order_ids):
+    def cancel_orders(self, order_ids, max_workers=MAX_WORKERS):
         """批量取消多个订单
 
+        火币单次批量撤单不能超过50个订单，超过时自动分批，各批按限速并发提交。
+
         :param order_ids:  list/str 需要取消的订单列表，
-        如果order_ids='all', 则取消订单列表中的所有订单 火币限制不能超过50个订单
+        如果order_ids='all', 则取消订单列表中的所有订单
         :return:
             {
             "success_submitted": 成功提交撤单的订单列表,
-            "fail_submitted": 撤单提交失败的订单列表
+            "fail_submitted": 撤单提交失败的订单列表,
+            "errors": {订单id: 错误信息}，整批请求失败时批内每个订单的错误信息
             }
         """
-        info = self.client.batch_cancel_order(order_ids=order_ids)
-        if info['status'] == "ok":
-            success_submitted = info['data']['success']
-            self.order_ids['cancel'] = success_submitted
-            fail_submitted = info['data']['failed']
-
-            data = {
-                "success_submitted": success_submitted,
-                "fail_submitted": fail_submitted
-            }
+        if order_ids == 'all':
+            order_ids = self.orders.open_ids()
+        order_ids = list(order_ids)
+        batches = [order_ids[i:i + 50] for i in range(0, len(order_ids), 50)]
+
+        success_submitted, fail_submitted, errors = [], [], {}
+        for batch, info, error in fan_out(
+                lambda b: self.client.batch_cancel_order(order_ids=b),
+                batches, max_workers, self.order_limiter):
+            if error is None and info.get('status') == 'ok':
+                success_submitted.extend(info['data']['success'])
+                fail_submitted.extend(info['data']['failed'])
+            else:
+                message = str(error) if error is not None else str(info.get('err-msg', info))
+                for order_id in batch:
+                    fail_submitted.append({'order-id': order_id, 'err-msg': message})
+                    errors[order_id] = message
 
-            return data
-        else:
-            print(info)
+        for order_id in success_submitted:
+            if str(order_id) in self.orders:
+                self.orders.update(str(order_id), state=CANCEL_SUBMITTED, cancel_submitted=True)
+
+        return {
+            "success_submitted": success_submitted,
+            "fail_submitted": fail_submitted,
+            "errors": errors
+        }
 
     # 查询某个订单详情
     def get_order(self, order_id):
@@ -399,29 +474,92 @@ class HuobiClient(PullQuotationSubscriber):
         """
         info = self.client.order_info(order_id=order_id)
         if info['status'] == 'ok':
-            data = {'raw': info,
-                    "id": info['data']['id'],
-                    "price": info['data']['price'],
-                    "amount": info['data']['amount'],
-                    "deal_amount": info['data']['field-amount']
-                    }
-
-            # status
-            if info['data']['state'] == 'filled':
-                data['status'] = "closed"
-            elif info['data']['state'] == 'canceled':
-                data['status'] = "canceled"
-            else:
-                data['status'] = "pending"
+            data = self._format_order(info['data'])
+            data['raw'] = info
+            return data
 
-            # type
-            if "buy" in info['data']['type']:
-                data['type'] = "buy"
-            else:
-                data['type'] = "sell"
+    def _format_order(self, order):
+        data = {"id": order['id'],
+                "price": order['price'],
+                "amount": order['amount'],
+                "deal_amount": order['field-amount']
+                }
+
+        # status
+        if order['state'] == 'filled':
+            data['status'] = "closed"
+        elif order['state'] == 'canceled':
+            data['status'] = "canceled"
+        else:
+            data['status'] = "pending"
+
+        # type
+        if "buy" in order['type']:
+            data['type'] = "buy"
+        else:
+            data['type'] = "sell"
 
+        self.orders.update(str(order['id']), symbol=order['symbol'],
+                           side=data['type'], state=order['state'],
+                           price=data['price'], amount=data['amount'],
+                           deal_amount=data['deal_amount'])
         return data
 
+    # 批量查询多个订单详情
+    def get_orders(self, order_ids, symbol=None, max_workers=MAX_WORKERS):
+        """批量查询多个订单详情
+
+        按交易对分组，每个交易对调用一次 orders_list 取回最近的订单（交易对取自
+        参数 symbol 或本地订单索引），未取到的订单再并发调用 order_info 逐个查询。
+
+        :param order_ids: 需要查询的订单id列表
+        :param symbol: 交易对，不指定时使用本地订单索引中记录的交易对
+        :param max_workers: 最大并发数
+        :return:
+            {
+            "raw": orders_list 返回的原始信息列表,
+            "orders": [get_order 格式的订单（不含 raw）, ...]，与 order_ids 顺序一致,
+            "errors": {订单id: 错误信息}，查询失败的订单
+            }
+        """
+        order_ids = [str(i) for i in order_ids]
+        if symbol is not None:
+            symbol = self._check_transform(symbol)
+        groups = {}
+        for order_id in order_ids:
+            record = self.orders.get(order_id)
+            s = symbol or (record['symbol'] if record else None)
+            if s is not None:
+                groups.setdefault(s, set()).add(order_id)
+
+        states = 'pre-submitted,submitted,partial-filled,partial-canceled,filled,canceled'
+        raw = []
+        found = {}
+        for s, info, error in fan_out(
+                lambda s: self.client.orders_list(symbol=s, states=states, size=100),
+                list(groups), max_workers):
+            if error is not None or info.get('status') != 'ok':
+                continue
+            raw.append(info)
+            for order in info['data']:
+                if str(order['id']) in groups[s]:
+                    found[str(order['id'])] = order
+
+        errors = {}
+        missing = [i for i in order_ids if i not in found]
+        for order_id, info, error in fan_out(
+                lambda i: self.client.order_info(order_id=i), missing, max_workers):
+            if error is not None:
+                errors[order_id] = str(error)
+            elif info.get('status') != 'ok':
+                errors[order_id] = str(info.get('err-msg', info))
+            else:
+                found[order_id] = info['data']
+
+        return {"raw": raw,
+                "orders": [self._format_order(found[i]) for i in order_ids if i in found],
+                "errors": errors}
+
     # 提现、转账
     def withdraw(self, address, currency, amount, addr_tag=""):
         """提现、转账
@@ -0,0 +1,216 @@
+# -*- coding:utf-8 -*-
+"""
+定点数资产账本
+==============================================================
+余额和冻结余额以定点整数（1e-8 精度）存放在按币种编号索引的紧凑数组中，
+划转、冻结均为 O(1)，没有浮点累积误差；快照只是两段内存拷贝，可用于
+记录回测净值曲线。
+"""
+
+from array import array
+from collections.abc import MutableMapping
+
+from .contract import Asset, AssetException
+
+SCALE = 10 ** 8  # 定点精度，最小单位 1e-8
+
+
+def to_fixed(value):
+    """浮点/字符串数量转为定点整数"""
+    return int(round(float(value) * SCALE))
+
+
+def from_fixed(value):
+    """定点整数转为浮点数量"""
+    return value / SCALE
+
+
+class Ledger:
+    """按币种编号索引的定点数账本"""
+
+    __slots__ = ('_ids', '_currencies', '_balance', '_frozen')
+
+    def __init__(self, assets=None):
+        """
+        :param assets: 初始资产 {币种: 数量}
+        """
+        self._ids = {}
+        self._currencies = []
+        self._balance = array('q')
+        self._frozen = array('q')
+        if assets:
+            for currency, amount in assets.items():
+                self.deposit(currency, amount)
+
+    def currency_id(self, currency):
+        """返回币种编号，未登记的币种自动登记"""
+        cid = self._ids.get(currency)
+        if cid is None:
+            cid = len(self._currencies)
+            self._ids[currency] = cid
+            self._currencies.append(currency)
+            self._balance.append(0)
+            self._frozen.append(0)
+        return cid
+
+    @property
+    def currencies(self):
+        return list(self._currencies)
+
+    def balance(self, currency):
+        """可用余额"""
+        cid = self._ids.get(currency)
+        return 0.0 if cid is None else self._balance[cid] / SCALE
+
+    def frozen(self, currency):
+        """冻结余额"""
+        cid = self._ids.get(currency)
+        return 0.0 if cid is None else self._frozen[cid] / SCALE
+
+    def deposit(self, currency, amount):
+        """增加可用余额"""
+        self._balance[self.currency_id(currency)] += to_fixed(amount)
+
+    def withdraw(self, currency, amount):
+        """扣减可用余额"""
+        self._debit(self.currency_id(currency), to_fixed(amount), currency)
+
+    def trade(self, pay_currency, pay_amount, receive_currency, receive_amount,
+              from_frozen=False):
+        """成交：支付 pay_currency，收到 receive_currency
+
+        :param from_frozen: 是否从冻结余额中支付（挂单成交）
+        """
+        pay_id = self.currency_id(pay_currency)
+        receive_id = self.currency_id(receive_currency)
+        pay = to_fixed(pay_amount)
+        if from_frozen:
+            if self._frozen[pay_id] < pay:
+                raise AssetException('冻结资产不足', pay_currency)
+            self._frozen[pay_id] -= pay
+        else:
+            self._debit(pay_id, pay, pay_currency)
+        self._balance[receive_id] += to_fixed(receive_amount)
+
+    def reserve(self, currency, amount):
+        """冻结：可用余额转入冻结余额"""
+        cid = self.currency_id(currency)
+        value = to_fixed(amount)
+        self._debit(cid, value, currency)
+        self._frozen[cid] += value
+
+    def release(self, currency, amount):
+        """解冻：冻结余额转回可用余额"""
+        cid = self.currency_id(currency)
+        value = to_fixed(amount)
+        if self._frozen[cid] < value:
+            raise AssetException('冻结资产不足', currency)
+        self._frozen[cid] -= value
+        self._balance[cid] += value
+
+    def _debit(self, cid, value, currency):
+        if self._balance[cid] < value:
+            raise AssetException('资产不足', currency)
+        self._balance[cid] -= value
+
+    def snapshot(self):
+        """返回 (可用余额, 冻结余额) 定点数组的拷贝"""
+        return array('q', self._balance), array('q', self._frozen)
+
+    def value(self, prices, quote=None):
+        """按价格估值
+
+        :param prices: {币种: 以计价币种表示的价格}
+        :param quote: 计价币种，价格视为 1
+        :return: 账户总值（浮点）
+        """
+        total = 0
+        for cid, currency in enumerate(self._currencies):
+            amount = self._balance[cid] + self._frozen[cid]
+            if not amount:
+                continue
+            price = 1.0 if currency == quote else prices[currency]
+            total += amount * price
+        return total / SCALE
+
+    def views(self):
+        """返回与账本联动的 {币种: Asset} 映射，见 AssetsView"""
+        return AssetsView(self)
+
+    def assets(self):
+        """返回 {币种: Asset} 快照，修改返回值不影响账本"""
+        result = {}
+        for cid, currency in enumerate(self._currencies):
+            asset = Asset(currency, self._balance[cid] / SCALE)
+            asset.fronzen_balance = self._frozen[cid] / SCALE
+            result[currency] = asset
+        return result
+
+    def to_dict(self):
+        return {currency: asset.to_dict()
+                for currency, asset in self.assets().items()}
+
+
+class AssetView(Asset):
+    """账本中单个币种的 Asset 视图，读写 balance / fronzen_balance 直接作用于账本"""
+
+    __slots__ = ('_ledger', '_cid')
+
+    def __init__(self, ledger, currency):
+        self._ledger = ledger
+        self._cid = ledger.currency_id(currency)
+        self.symbol = currency
+
+    @property
+    def balance(self):
+        return self._ledger._balance[self._cid] / SCALE
+
+    @balance.setter
+    def balance(self, value):
+        self._ledger._balance[self._cid] = to_fixed(value)
+
+    @property
+    def fronzen_balance(self):
+        return self._ledger._frozen[self._cid] / SCALE
+
+    @fronzen_balance.setter
+    def fronzen_balance(self, value):
+        self._ledger._frozen[self._cid] = to_fixed(value)
+
+
+class AssetsView(MutableMapping):
+    """{币种: AssetView}，兼容原来直接修改 assets 字典的写法
+
+    assets[c].balance = x 修改账本余额；assets[c] = Asset(...) 用该 Asset 的
+    余额覆盖账本（币种不存在时登记）；账本的币种编号固定，不支持删除币种。
+    """
+
+    __slots__ = ('_ledger',)
+
+    def __init__(self, ledger):
+        self._ledger = ledger
+
+    def __getitem__(self, currency):
+        if currency not in self._ledger._ids:
+            raise KeyError(currency)
+        return AssetView(self._ledger, currency)
+
+    def __setitem__(self, currency, asset):
+        view = AssetView(self._ledger, currency)
+        view.balance = asset.balance
+        view.fronzen_balance = asset.fronzen_balance
+
+    def __delitem__(self, currency):
+        raise TypeError('账本不支持删除币种：%s' % currency)
+
+    def __contains__(self, currency):
+        return currency in self._ledger._ids
+
+    def __iter__(self):
+        return iter(list(self._ledger._currencies))
+
+    def __len__(self):
+        return len(self._ledger._currencies)
+
+    def __repr__(self):
+        return repr(self._ledger.to_dict())
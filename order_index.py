@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+"""
+本地订单索引
+==============================================================
+按订单 id 索引订单状态，O(1) 查询；已完成/已撤销的订单只保留最近
+max_terminal 条，长时间运行的做市程序内存不会无限增长。
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class OrderIndex:
+    """按订单 id 索引的本地订单表
+
+    每条订单记录为字典，至少包含 id、symbol、side、state 字段，其余字段
+    （price、amount、deal_amount、raw 等）由调用方自行写入。
+    """
+
+    def __init__(self, terminal_states=('filled', 'canceled', 'closed',
+                                        'rejected', 'expired'),
+                 max_terminal=1000):
+        """
+        :param terminal_states: 终结状态（不区分大小写），进入这些状态的订单转入有限保留区
+        :param max_terminal: 终结订单最多保留的数量
+        """
+        self.terminal_states = frozenset(s.lower() for s in terminal_states)
+        self.max_terminal = max_terminal
+        self._open = {}
+        self._terminal = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._open) + len(self._terminal)
+
+    def __contains__(self, order_id):
+        return order_id in self._open or order_id in self._terminal
+
+    def get(self, order_id):
+        """查询订单记录，不存在返回 None"""
+        order = self._open.get(order_id)
+        if order is None:
+            order = self._terminal.get(order_id)
+        return order
+
+    def is_open(self, order_id):
+        return order_id in self._open
+
+    def is_terminal_state(self, state):
+        return state is not None and state.lower() in self.terminal_states
+
+    def update(self, order_id, **fields):
+        """新增或更新订单，返回更新后的订单记录"""
+        with self._lock:
+            order = self._open.get(order_id)
+            if order is None:
+                order = self._terminal.get(order_id)
+            if order is None:
+                order = {'id': order_id, 'symbol': None, 'side': None, 'state': None}
+            else:
+                order = dict(order)
+            order.update(fields)
+
+            if self.is_terminal_state(order['state']):
+                # 先写入再删除，保证并发读取时订单不会短暂消失
+                self._terminal[order_id] = order
+                self._terminal.move_to_end(order_id)
+                self._open.pop(order_id, None)
+                while len(self._terminal) > self.max_terminal:
+                    self._terminal.popitem(last=False)
+            else:
+                self._open[order_id] = order
+                self._terminal.pop(order_id, None)
+        return order
+
+    def remove(self, order_id):
+        with self._lock:
+            order = self._open.pop(order_id, None)
+            terminal = self._terminal.pop(order_id, None)
+        return order or terminal
+
+    def open_orders(self, symbol=None, side=None):
+        """未完成订单列表"""
+        return [o for o in list(self._open.values())
+                if (symbol is None or o['symbol'] == symbol)
+                and (side is None or o['side'] == side)]
+
+    def terminal_orders(self, symbol=None, side=None):
+        """保留区中的终结订单列表，按进入终结状态的先后排列"""
+        return [o for o in list(self._terminal.values())
+                if (symbol is None or o['symbol'] == symbol)
+                and (side is None or o['side'] == side)]
+
+    def open_ids(self, symbol=None, side=None):
+        return [o['id'] for o in self.open_orders(symbol, side)]
+
+    def clear(self):
+        with self._lock:
+            self._open.clear()
+            self._terminal.clear()
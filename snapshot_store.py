@@ -0,0 +1,225 @@
+# -*- coding:utf-8 -*-
+"""
+行情最新值存储
+==============================================================
+很多使用方只关心"某交易对当前的 ticker / 盘口"，并不需要处理每一条推送。
+SnapshotStore 按 (交易所, 交易对, 频道) 只保存最新一条规范化后的数据和
+全局递增的序号，内存占用只与交易对数量有关，与推送频率无关：
+
+    store = SnapshotStore()
+    store.feed_binance(StreamRouter(client), ['eth_btc', 'bnb_btc'], registry=registry)
+
+    snap = store.get('Binance', 'eth_btc', TICKER)      # 不加锁，直接读取
+
+    seq = 0
+    while True:
+        store.wait_for_update(seq)                     # 阻塞到有新数据
+        for snap in store.changed_since(seq):
+            ...
+            seq = snap.seq
+
+读取不加锁：每次更新都用一个新的不可变 Snapshot 替换字典中的旧值，读到的
+总是某一次完整的更新。写入方可以有多个（各交易所的回调线程），取序号和
+发布在一把短锁内完成，序号和每个键的 Snapshot 都只会递增；只有存在等待者
+时才会获取条件变量通知。
+
+规范化格式（价格、数量均为浮点数，交易对为统一格式如 eth_btc）：
+    ticker  {"symbol", "high", "low", "sell", "buy", "last", "volume", "timestamp"}
+    book    {"symbol", "bids": [(price, amount), ...], "asks": [...], "timestamp"}
+    kline   {"symbol", "interval", "open", "high", "low", "close", "volume", "timestamp", "closed"}
+Huobi 的 detail 推送没有买一卖一价，buy / sell 为 None。
+"""
+
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+from .depth_aggregator import normalize_levels
+
+TICKER = 'ticker'
+BOOK = 'book'
+KLINE = 'kline'
+
+Snapshot = namedtuple('Snapshot', 'exchange symbol channel value seq received')
+
+
+class SnapshotStore:
+    """按 (交易所, 交易对, 频道) 保存最新的行情数据"""
+
+    def __init__(self):
+        self._slots = {}
+        self._counter = itertools.count(1)
+        # 取序号、写入和发布 self.seq 必须一起完成，否则并发写入时 seq 可能回退，
+        # 等待者会错过更新
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self.seq = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def update(self, exchange, symbol, channel, value):
+        """写入最新值
+
+        :return: 本次更新的序号
+        """
+        with self._write_lock:
+            seq = next(self._counter)
+            self._slots[(exchange, symbol, channel)] = Snapshot(exchange, symbol, channel,
+                                                                value, seq, time.time())
+            self.seq = seq
+        if self._waiting:
+            with self._cond:
+                self._cond.notify_all()
+        return seq
+
+    def get(self, exchange, symbol, channel=TICKER):
+        """最新的 Snapshot，没有数据时返回 None"""
+        return self._slots.get((exchange, symbol, channel))
+
+    def value(self, exchange, symbol, channel=TICKER):
+        """最新的规范化数据，没有数据时返回 None"""
+        snap = self._slots.get((exchange, symbol, channel))
+        return snap.value if snap is not None else None
+
+    def snapshots(self, exchange=None, symbol=None, channel=None):
+        """按条件筛选的全部 Snapshot"""
+        return [s for s in list(self._slots.values())
+                if (exchange is None or s.exchange == exchange)
+                and (symbol is None or s.symbol == symbol)
+                and (channel is None or s.channel == channel)]
+
+    def changed_since(self, seq):
+        """序号大于 seq 的 Snapshot，按序号排序"""
+        return sorted((s for s in list(self._slots.values()) if s.seq > seq),
+                      key=lambda s: s.seq)
+
+    def wait_for_update(self, seq, timeout=None, exchange=None, symbol=None, channel=None):
+        """等待出现序号大于 seq 的更新
+
+        :param seq: 上次看到的序号，0 表示任意更新
+        :param timeout: 超时（秒），None 表示一直等待
+        :param exchange, symbol, channel: 同时指定时只等待这一个键的更新
+        :return: 最新序号（指定键时为该键最新的 Snapshot），超时返回 None
+        """
+        key = (exchange, symbol, channel) if channel is not None else None
+
+        def current():
+            if key is None:
+                return self.seq if self.seq > seq else None
+            snap = self._slots.get(key)
+            return snap if snap is not None and snap.seq > seq else None
+
+        result = current()
+        if result is not None:
+            return result
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    result = current()
+                    if result is not None:
+                        return result
+                    remaining = deadline - time.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    # ------------------------------------------------------------ 数据源
+    def feed_binance(self, router, symbols, channels=(TICKER, BOOK), registry=None,
+                     depth=5, interval='1m'):
+        """通过 Binance StreamRouter 订阅行情并写入
+
+        :param router: apis.binance.streams.StreamRouter
+        :param symbols: 交易对列表，统一格式（需要 registry）或 Binance 格式均可
+        :param channels: ticker / book / kline
+        :param registry: SymbolRegistry，用于统一格式与 Binance 格式互转
+        :param depth: 盘口档数，5 / 10 / 20
+        :param interval: K 线周期
+        :return: 订阅的数据流名称列表
+        """
+        names = {}
+        for symbol in symbols:
+            native = registry.to_native(symbol) if registry is not None else symbol
+            unified = registry.to_unified(native) if registry is not None else symbol
+            names[native.lower()] = unified
+        suffixes = {TICKER: '@ticker', BOOK: '@depth%d' % depth, KLINE: '@kline_%s' % interval}
+        streams = [native + suffixes[c] for native in names for c in channels]
+
+        def on_event(stream, msg):
+            native, suffix = stream.split('@', 1)
+            symbol = names[native]
+            if suffix == 'ticker':
+                self.update('Binance', symbol, TICKER, binance_ticker(symbol, msg))
+            elif suffix.startswith('depth'):
+                self.update('Binance', symbol, BOOK, binance_book(symbol, msg))
+            else:
+                self.update('Binance', symbol, KLINE, binance_kline(symbol, msg))
+
+        router.subscribe(streams, on_event, with_stream=True)
+        return streams
+
+    def huobi_callback(self, registry=None):
+        """Huobi 推送（已解压的 dict）的回调，按 ch 写入 detail / depth / kline
+
+        :param registry: SymbolRegistry，用于把 Huobi 交易对转为统一格式
+        """
+        def on_message(msg):
+            ch = msg.get('ch')
+            if not ch or 'tick' not in msg:
+                return
+            parts = ch.split('.')
+            native = parts[1]
+            symbol = registry.to_unified(native) if registry is not None else native
+            kind = parts[2]
+            if kind == 'detail':
+                self.update('Huobi', symbol, TICKER, huobi_ticker(symbol, msg))
+            elif kind == 'depth':
+                self.update('Huobi', symbol, BOOK, huobi_book(symbol, msg))
+            elif kind == 'kline':
+                self.update('Huobi', symbol, KLINE, huobi_kline(symbol, parts[3], msg))
+
+        return on_message
+
+
+# ---------------------------------------------------------------- 规范化
+def binance_ticker(symbol, msg):
+    return {"symbol": symbol, "high": float(msg['h']), "low": float(msg['l']),
+            "sell": float(msg['a']), "buy": float(msg['b']), "last": float(msg['c']),
+            "volume": float(msg['v']), "timestamp": msg['E']}
+
+
+def binance_book(symbol, msg):
+    return {"symbol": symbol, "bids": normalize_levels(msg['bids']),
+            "asks": normalize_levels(msg['asks']), "timestamp": msg.get('E')}
+
+
+def binance_kline(symbol, msg):
+    k = msg['k']
+    return {"symbol": symbol, "interval": k['i'], "open": float(k['o']), "high": float(k['h']),
+            "low": float(k['l']), "close": float(k['c']), "volume": float(k['v']),
+            "timestamp": k['t'], "closed": k['x']}
+
+
+def huobi_ticker(symbol, msg):
+    tick = msg['tick']
+    return {"symbol": symbol, "high": tick['high'], "low": tick['low'], "sell": None,
+            "buy": None, "last": tick['close'], "volume": tick['amount'], "timestamp": msg['ts']}
+
+
+def huobi_book(symbol, msg):
+    tick = msg['tick']
+    return {"symbol": symbol, "bids": normalize_levels(tick['bids']),
+            "asks": normalize_levels(tick['asks']), "timestamp": msg['ts']}
+
+
+def huobi_kline(symbol, interval, msg):
+    tick = msg['tick']
+    return {"symbol": symbol, "interval": interval, "open": tick['open'], "high": tick['high'],
+            "low": tick['low'], "close": tick['close'], "volume": tick['amount'],
+            "timestamp": tick['id'] * 1000, "closed": None}
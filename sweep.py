@@ -0,0 +1,125 @@
+# -*- coding:utf-8 -*-
+"""
+回测参数扫描
+==============================================================
+回放用的行情数据只写一次内存映射文件，子进程以只读方式映射，
+不随任务 pickle；参数网格分发到进程池，结果按完成顺序逐条返回。
+
+用法：
+
+    def backtest(data, params):
+        # data: {名称: 只读 numpy memmap}
+        client = BackTestClient('BackTest', assets=params['assets'])
+        ...
+        return {"equity": ...}
+
+    with SweepRunner({"close": close, "open": open_}) as runner:
+        for params, metrics in runner.run(backtest, {"assets": [...], "n": [5, 10]}):
+            print(params, metrics)
+
+task 必须是模块级函数（可被 pickle）。
+"""
+
+import functools
+import itertools
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+
+
+def expand_grid(param_grid):
+    """把 {参数名: 取值列表} 展开为参数字典列表"""
+    if isinstance(param_grid, dict):
+        keys = list(param_grid.keys())
+        return [dict(zip(keys, values))
+                for values in itertools.product(*(param_grid[k] for k in keys))]
+    return list(param_grid)
+
+
+class SweepRunner:
+    """基于内存映射共享行情数据的参数扫描进程池"""
+
+    def __init__(self, market_data, processes=None, workdir=None):
+        """
+        :param market_data: {名称: 数组}，回放用的行情数据
+        :param processes: 进程数，默认 CPU 核数
+        :param workdir: 内存映射文件目录，默认临时目录
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self._own_dir = workdir is None
+        self.workdir = tempfile.mkdtemp(prefix='sweep_') if workdir is None else workdir
+        self.files = {}
+        for name, values in market_data.items():
+            path = os.path.join(self.workdir, name + '.npy')
+            np.save(path, np.ascontiguousarray(values))
+            self.files[name] = path
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = Pool(self.processes, initializer=_init_worker,
+                              initargs=(self.files,))
+        return self._pool
+
+    def _chunksize(self, count):
+        # 每个进程约分到 4 批，兼顾负载均衡和派发开销
+        return max(1, count // (self.processes * 4))
+
+    def run(self, task, param_grid, chunksize=None):
+        """扫描参数网格，按完成顺序逐条返回结果
+
+        :param task: 模块级函数 task(data, params) -> 统计指标
+        :param param_grid: {参数名: 取值列表}，或参数字典列表
+        :param chunksize: 每次派发给子进程的任务数，默认自动计算
+        :return: 生成器，依次产出 (params, metrics)
+        """
+        params_list = expand_grid(param_grid)
+        chunksize = chunksize or self._chunksize(len(params_list))
+        func = functools.partial(_run_indexed, task)
+        results = self._get_pool().imap_unordered(
+            func, enumerate(params_list), chunksize=chunksize)
+        for index, metrics in results:
+            yield params_list[index], metrics
+
+    def map(self, task, param_grid, chunksize=None):
+        """同 run，但等待全部完成后按参数展开顺序返回列表"""
+        params_list = expand_grid(param_grid)
+        metrics = [None] * len(params_list)
+        for index, result in self._get_pool().imap_unordered(
+                functools.partial(_run_indexed, task), enumerate(params_list),
+                chunksize=chunksize or self._chunksize(len(params_list))):
+            metrics[index] = result
+        return list(zip(params_list, metrics))
+
+    def close(self):
+        """关闭进程池并删除内存映射文件"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._own_dir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# 子进程内的只读行情数据，进程初始化时映射一次
+_worker_data = None
+
+
+def _init_worker(files):
+    global _worker_data
+    _worker_data = {name: np.load(path, mmap_mode='r')
+                    for name, path in files.items()}
+
+
+def _run_indexed(task, item):
+    index, params = item
+    return index, task(_worker_data, params)
@@ -0,0 +1,240 @@
+# -*- coding:utf-8 -*-
+"""
+交易对注册表
+==============================================================
+统一交易对格式为 基础币种_计价币种（小写），如 btc_usdt、eth_btc。
+注册表根据交易所返回的交易对元数据一次性构建，包含：
+    统一格式 -> 交易所格式、交易所格式 -> 统一格式 的双向映射，
+    基础币种/计价币种拆分，价格/数量精度。
+查询均为字典查找，未知交易对在发起网络请求之前就会被拒绝。
+SymbolCache 按 TTL 在后台线程刷新注册表，读取时不做任何检查。
+"""
+
+import threading
+
+from .contract import SymbolException
+
+
+def step_to_precision(step):
+    """把 "0.00100000" 这样的最小变动单位转换为小数位数 3"""
+    step = str(step).rstrip('0')
+    if '.' not in step:
+        return 0
+    return len(step.split('.')[1])
+
+
+class SymbolInfo:
+    """单个交易对的信息"""
+
+    __slots__ = ('symbol', 'native', 'base', 'quote',
+                 'price_precision', 'amount_precision')
+
+    def __init__(self, symbol, native, base, quote,
+                 price_precision=None, amount_precision=None):
+        self.symbol = symbol
+        self.native = native
+        self.base = base
+        self.quote = quote
+        self.price_precision = price_precision
+        self.amount_precision = amount_precision
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SymbolRegistry:
+    """单个交易所的交易对注册表"""
+
+    MAX_MISSES = 4096   # 缓存的未知写法数量上限
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self._infos = {}     # 统一格式 -> SymbolInfo
+        self._aliases = {}   # 各种写法 -> SymbolInfo
+        self._natives = {}   # 交易所格式 -> SymbolInfo
+        self._misses = set()  # is_supported 查不到的写法，避免每次都做 lower / replace
+        self._order = []
+        self.symbols = ()
+        self.symbol_set = frozenset()
+        self.currency_set = frozenset()
+        self.currencies = ()
+
+    def add(self, base, quote, native, price_precision=None, amount_precision=None):
+        """登记一个交易对
+
+        :param base: 基础币种
+        :param quote: 计价币种
+        :param native: 交易所格式的交易对，如 BTCUSDT、btcusdt
+        """
+        base = base.lower()
+        quote = quote.lower()
+        symbol = base + '_' + quote
+        info = SymbolInfo(symbol, native, base, quote,
+                          price_precision, amount_precision)
+        if symbol not in self._infos:
+            self._order.append(symbol)
+        self._infos[symbol] = info
+        self._misses.clear()
+        self._natives[native] = info
+        for alias in (symbol, base + '/' + quote, native):
+            self._aliases[alias] = info
+            self._aliases[alias.lower()] = info
+            self._aliases[alias.upper()] = info
+        return info
+
+    def freeze(self):
+        """登记完成后生成交易对和币种集合
+
+        symbols / currencies 为元组，注册表在 SymbolCache 中共享，调用方不能修改
+        """
+        self.symbols = tuple(self._order)
+        self.symbol_set = frozenset(self.symbols)
+        currencies = set()
+        for info in self._infos.values():
+            currencies.add(info.base)
+            currencies.add(info.quote)
+        self.currency_set = frozenset(currencies)
+        self.currencies = tuple(sorted(currencies))
+        return self
+
+    def __len__(self):
+        return len(self._infos)
+
+    def __contains__(self, symbol):
+        return self.find(symbol) is not None
+
+    def find(self, symbol):
+        """查找交易对，支持 btc_usdt、BTC/USDT、交易所格式等写法，未找到返回 None"""
+        info = self._aliases.get(symbol)
+        if info is None and isinstance(symbol, str):
+            info = self._aliases.get(symbol.lower().replace('/', '_'))
+        return info
+
+    def get(self, symbol):
+        """查找交易对，未找到时抛出 SymbolException"""
+        info = self.find(symbol)
+        if info is None:
+            raise SymbolException('%s 不支持该交易对' % self.exchange, symbol)
+        return info
+
+    def to_native(self, symbol):
+        """统一格式 -> 交易所格式"""
+        return self.get(symbol).native
+
+    def to_unified(self, native):
+        """交易所格式 -> 统一格式"""
+        info = self._natives.get(native)
+        if info is None:
+            raise SymbolException('%s 不支持该交易对' % self.exchange, native)
+        return info.symbol
+
+    def split(self, symbol):
+        """返回 (基础币种, 计价币种)"""
+        info = self.get(symbol)
+        return info.base, info.quote
+
+    def is_supported(self, symbol):
+        if symbol in self.symbol_set:
+            return True
+        if symbol in self._misses:
+            return False
+        if self.find(symbol) is not None:
+            return True
+        if len(self._misses) >= self.MAX_MISSES:
+            self._misses.clear()
+        self._misses.add(symbol)
+        return False
+
+    @classmethod
+    def from_binance(cls, exchange, symbols):
+        """由 BinanceAPI.get_exchange_info()['symbols'] 构建"""
+        registry = cls(exchange)
+        for s in symbols:
+            filters = {f['filterType']: f for f in s.get('filters', [])}
+            price_precision = amount_precision = None
+            if 'PRICE_FILTER' in filters:
+                price_precision = step_to_precision(filters['PRICE_FILTER']['tickSize'])
+            if 'LOT_SIZE' in filters:
+                amount_precision = step_to_precision(filters['LOT_SIZE']['stepSize'])
+            registry.add(s['baseAsset'], s['quoteAsset'], s['symbol'],
+                         price_precision, amount_precision)
+        return registry.freeze()
+
+    @classmethod
+    def from_huobi(cls, exchange, symbols):
+        """由 HuobiAPI.get_symbols()['data'] 构建"""
+        registry = cls(exchange)
+        for d in symbols:
+            base = d['base-currency']
+            quote = d['quote-currency']
+            registry.add(base, quote, d.get('symbol', base + quote),
+                         d.get('price-precision'), d.get('amount-precision'))
+        return registry.freeze()
+
+    @classmethod
+    def from_gate(cls, exchange, pairs):
+        """由 GateAPI.marketinfo()['pairs'] 构建
+
+        :param pairs: [{"eth_btc": {"decimal_places": 6, "min_amount": 0.0001, "fee": 0.2}}, ...]
+        """
+        registry = cls(exchange)
+        for item in pairs:
+            for native, info in item.items():
+                base, quote = native.split('_')
+                registry.add(base, quote, native, info.get('decimal_places'))
+        return registry.freeze()
+
+
+class SymbolCache:
+    """交易对注册表缓存
+
+    首次读取时同步加载，之后每隔 ttl 秒由后台定时器刷新；刷新期间及刷新失败时
+    继续使用旧的注册表，读取只是一次属性访问。
+    """
+
+    def __init__(self, loader, ttl=3600):
+        """
+        :param loader: 加载函数，负责拉取交易所数据并调用 set() 写入新的注册表
+        :param ttl: 刷新间隔（秒），0 或 None 表示不自动刷新
+        """
+        self._loader = loader
+        self.ttl = ttl
+        self.registry = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        registry = self.registry
+        if registry is None:
+            with self._lock:
+                if self.registry is None:
+                    self._loader()
+            registry = self.registry
+        return registry
+
+    def set(self, registry):
+        """写入新的注册表，并安排下一次后台刷新"""
+        self.registry = registry
+        self._schedule()
+        return registry
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.ttl:
+            self._timer = threading.Timer(self.ttl, self._refresh)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _refresh(self):
+        try:
+            self._loader()
+        except Exception as e:
+            print("交易对注册表刷新失败：%s" % e)
+            self._schedule()
+
+    def stop(self):
+        """停止后台刷新"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""测试用的 websocket 引擎替身：不建立网络连接，由测试直接推送消息、模拟重连"""
+
+import json
+
+
+class FakeConnection:
+
+    def __init__(self, engine, url, on_message, on_open=None, on_close=None, name=None, **kwargs):
+        self.engine = engine
+        self.url = url
+        self.name = name or url
+        self.on_message = on_message
+        self.on_open = on_open
+        self.on_close = on_close
+        self.connected = False
+        self.connected_url = None
+        self.connects = 0
+        self.messages = 0
+        self.closed = False
+        self.sent = []
+
+    def open(self):
+        """模拟（重）连接成功"""
+        self.connected = True
+        self.connected_url = self.url
+        self.connects += 1
+        if self.on_open is not None:
+            self.on_open(self)
+
+    def drop(self):
+        """模拟连接断开"""
+        self.connected = False
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def push(self, message):
+        self.messages += 1
+        self.on_message(message if isinstance(message, (str, bytes)) else json.dumps(message))
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+    def close(self):
+        self.closed = True
+        self.connected = False
+
+
+class FakeEngine:
+
+    def __init__(self):
+        self.connections = []
+
+    def connect(self, url, on_message, **kwargs):
+        conn = FakeConnection(self, url, on_message, **kwargs)
+        self.connections.append(conn)
+        return conn
+
+    def start(self):
+        return self
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from ..arbitrage import ArbitrageScanner
+
+
+def test_add_exchange_again_does_not_duplicate_cycles():
+    scanner = ArbitrageScanner(default_fee=0)
+    scanner.add_exchange('A', ['eth_btc', 'btc_usdt', 'eth_usdt'])
+    assert scanner.cycle_count == 2
+    scanner.add_exchange('A', ['ETH_BTC', 'btc_usdt', 'eth_usdt'])
+    assert scanner.cycle_count == 2
+    # 新增的交易对不构成新的三角环路
+    scanner.add_exchange('A', ['bnb_btc'])
+    assert scanner.cycle_count == 2
+    scanner.add_exchange('B', ['eth_btc'])
+    assert scanner.cycle_count == 4
+
+
+def test_uppercase_and_unseparated_symbols_match():
+    scanner = ArbitrageScanner(default_fee=0)
+    scanner.add_exchange('A', ['eth_btc'])
+    scanner.add_exchange('B', ['eth_btc'])
+    assert scanner.on_book('A', 'ETH_BTC', 0.11, 1, 0.111, 1) == []
+    found = scanner.on_book('B', 'ETHBTC', 0.099, 1, 0.1, 1)
+    assert [o['path'] for o in found] == [[('B', 'eth_btc', 'buy'), ('A', 'eth_btc', 'sell')]]
+    assert scanner.on_book('B', 'XRPBTC', 0.1, 1, 0.2, 1) == []
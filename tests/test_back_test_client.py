@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from ..back_text_client import BackTestClient
+from ..contract import Asset
+
+
+def test_assets_write_through_to_the_ledger():
+    client = BackTestClient('BackTest', {'btc': 1, 'usdt': 100})
+    client.assets['btc'].balance = 2
+    client.get_assets()['usdt'].fronzen_balance = 10
+    assert client.ledger.balance('btc') == 2
+    assert client.ledger.frozen('usdt') == 10
+
+    # 赋值 Asset 覆盖账本余额，币种不存在时登记
+    client.assets['eth'] = Asset('eth', 5)
+    assert 'eth' in client.assets
+    assert client.assets['eth'].balance == 5
+
+    client.buy('eth/btc', 0.5, 2)
+    assert client.assets['eth'].balance == 7
+    assert client.assets['btc'].balance == 1
+    with pytest.raises(TypeError):
+        del client.assets['btc']
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from ..apis.binance.depthcache import DepthCacheManager
+from ..benchmarks.bench_depthcache import (ReferenceBook, Scenario, check, run_manager,
+                                           synthetic_events)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_replay_with_gaps_and_lagging_snapshots_matches_reference():
+    events = list(synthetic_events(3000, levels=100))
+    scenario = Scenario(events, gap_rate=0.01, seed=3)
+    assert scenario.gaps > 5
+    seconds, manager, client = run_manager(scenario, lag=2)
+    assert check(manager, scenario) == []
+    assert client.stale_served == 2 * scenario.gaps
+
+
+class SlowClient(object):
+    """REST stand-in: snapshots of the live book that take a while and may lag"""
+
+    def __init__(self, delay=0.0):
+        self.truth = ReferenceBook()
+        self.lock = threading.Lock()
+        self.delay = delay
+        self.stale = []
+        self.calls = 0
+
+    def apply(self, msg):
+        with self.lock:
+            self.truth.apply(msg)
+
+    def get_order_book(self, symbol, limit=100):
+        self.calls += 1
+        time.sleep(self.delay)
+        with self.lock:
+            return self.stale.pop(0) if self.stale else self.truth.snapshot()
+
+
+class Manager(DepthCacheManager):
+    _resync_delay = 0.01
+
+    def _start_socket(self):
+        pass
+
+
+def synced(manager, client):
+    with client.lock:
+        return (manager._last_update_id == client.truth.last_update_id and
+                [manager.get_depth_cache().get_bids(),
+                 manager.get_depth_cache().get_asks()] == list(client.truth.levels()))
+
+
+def test_resync_runs_off_the_socket_thread():
+    events = list(synthetic_events(400, levels=50))
+    client = SlowClient()
+    for msg in events[:10]:
+        client.apply(msg)
+    manager = Manager(client, 'ETHBTC', refresh_interval=0)
+    for msg in events[10:100]:
+        client.apply(msg)
+        manager._depth_event(msg)
+    assert synced(manager, client)
+
+    # drop a few events, the next snapshots are slow and the first two still miss them
+    client.stale = [client.truth.snapshot()] * 2
+    for msg in events[100:105]:
+        client.apply(msg)
+    client.delay = 0.2
+    slowest = 0
+    for msg in events[105:]:
+        client.apply(msg)
+        start = time.time()
+        manager._depth_event(msg)
+        slowest = max(slowest, time.time() - start)
+    assert slowest < 0.05
+    assert wait_for(lambda: synced(manager, client))
+    assert client.calls == 4
+
+
+def test_resync_gives_up_and_backs_off():
+    events = list(synthetic_events(60, levels=50))
+    client = SlowClient()
+    for msg in events[:10]:
+        client.apply(msg)
+    manager = Manager(client, 'ETHBTC', refresh_interval=0)
+    manager._resync_attempts = 3
+    stale = client.truth.snapshot()
+    client.stale = [stale] * 10
+    for msg in events[10:12]:
+        client.apply(msg)
+    client.apply(events[12])
+    manager._depth_event(events[12])
+    assert wait_for(lambda: not manager._fetching)
+    assert client.calls == 1 + 3
+    assert manager._last_update_id is None
+
+    # within the backoff new events are only buffered
+    for msg in events[13:20]:
+        client.apply(msg)
+        manager._depth_event(msg)
+    time.sleep(0.05)
+    assert client.calls == 4
+
+    # once it expires the next event resyncs
+    client.stale = []
+    manager._retry_at = 0
+    for msg in events[20:]:
+        client.apply(msg)
+        manager._depth_event(msg)
+    assert wait_for(lambda: synced(manager, client))
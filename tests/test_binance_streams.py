@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+from ..apis.binance.streams import StreamRouter
+from .fakes import FakeEngine
+
+
+def event(stream, n):
+    return {'stream': stream, 'data': {'e': 'trade', 's': stream, 't': n}}
+
+
+def test_moved_stream_is_delivered_once():
+    engine = FakeEngine()
+    router = StreamRouter(streams_per_connection=2, engine=engine, dispatcher=False)
+    got = []
+    router.subscribe(['a@trade', 'b@trade', 'c@trade', 'd@trade'], lambda e: got.append(e['t']))
+    old, new = engine.connections
+    old.open()
+    new.open()
+    assert old.url.endswith('streams=a@trade/b@trade')
+    assert new.url.endswith('streams=c@trade/d@trade')
+
+    # one shard is enough for b and d: b moves to the shard of d
+    router.unsubscribe(['a@trade', 'c@trade'])
+    subscribe = [m for m in new.sent if m['method'] == 'SUBSCRIBE']
+    assert [m['params'] for m in subscribe] == [['b@trade']]
+    assert not old.closed
+
+    # before the ack both connections carry b, only the old one is delivered
+    old.push(event('b@trade', 1))
+    new.push(event('b@trade', 1))
+    assert got == [1]
+
+    new.push({'result': None, 'id': subscribe[0]['id']})
+    assert old.closed
+    old.push(event('b@trade', 2))
+    new.push(event('b@trade', 2))
+    new.push(event('d@trade', 3))
+    assert got == [1, 2, 3]
+    assert [s['streams'] for s in router.stats()] == [2]
+    router.close()
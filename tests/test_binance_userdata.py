@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from ..apis.binance import userdata, websockets
+from .fakes import FakeEngine
+
+
+class FakeClient(object):
+    """Binance REST stand-in holding the exchange side state"""
+
+    def __init__(self):
+        self.orders = {}
+        self.balances = {'BTC': ('1.0', '0.0')}
+        self.account_time = 1000
+        self.time_sync = None
+
+    def stream_get_listen_key(self):
+        return 'k' * 60
+
+    def stream_close(self, listenKey):
+        pass
+
+    def get_open_orders(self):
+        return [dict(o) for o in self.orders.values() if o['status'] in ('NEW', 'PARTIALLY_FILLED')]
+
+    def get_order(self, symbol, orderId):
+        return dict(self.orders[orderId])
+
+    def get_account(self):
+        return {'updateTime': self.account_time,
+                'balances': [{'asset': a, 'free': f, 'locked': l}
+                             for a, (f, l) in self.balances.items()]}
+
+
+def order(order_id, status, update_time):
+    return {'symbol': 'ETHBTC', 'orderId': order_id, 'clientOrderId': 'c%d' % order_id,
+            'price': '0.1', 'origQty': '1', 'executedQty': '1' if status == 'FILLED' else '0',
+            'status': status, 'timeInForce': 'GTC', 'type': 'LIMIT', 'side': 'BUY',
+            'stopPrice': '0', 'time': 100, 'updateTime': update_time}
+
+
+def execution_report(order_id, status, event_time):
+    return {'e': 'executionReport', 'E': event_time, 's': 'ETHBTC', 'i': order_id,
+            'c': 'c%d' % order_id, 'p': '0.1', 'q': '1', 'z': '1' if status == 'FILLED' else '0',
+            'X': status, 'f': 'GTC', 'o': 'LIMIT', 'S': 'BUY', 'P': '0', 'O': 100, 'T': event_time}
+
+
+def make_cache(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(websockets, 'shared_engine', lambda: engine)
+    monkeypatch.setattr(websockets, 'shared_dispatcher', lambda: False)
+    client = FakeClient()
+    client.orders[1] = order(1, 'NEW', 200)
+    cache = userdata.UserDataCache(client)
+    cache.start()
+    conn = engine.connections[0]
+    conn.open()
+    return cache, client, conn
+
+
+def wait_reconcile(cache):
+    thread = cache._reconcile_thread
+    assert thread is not None
+    thread.join(5)
+
+
+def test_reconnect_repairs_missed_events(monkeypatch):
+    cache, client, conn = make_cache(monkeypatch)
+    assert cache.get_order(1)['status'] == 'NEW'
+
+    # the order fills and the balance changes while the socket is down
+    conn.drop()
+    client.orders[1] = order(1, 'FILLED', 300)
+    client.balances['BTC'] = ('0.9', '0.0')
+    client.account_time = 2000
+    assert cache._reconcile_thread is None
+
+    conn.open()
+    wait_reconcile(cache)
+    assert cache.get_order(1)['status'] == 'FILLED'
+    assert cache.get_open_orders() == []
+    assert cache.get_account()['balances'] == [{'asset': 'BTC', 'free': '0.9', 'locked': '0.0'}]
+    cache.close()
+
+
+def test_rest_does_not_overwrite_newer_stream_event(monkeypatch):
+    cache, client, conn = make_cache(monkeypatch)
+    # REST read before the fill, applied after the stream event
+    stale = order(1, 'NEW', 250)
+    conn.push(execution_report(1, 'FILLED', 300))
+    cache._apply_order(stale, cache._rest_time(stale), rest=True)
+    assert cache.get_order(1)['status'] == 'FILLED'
+
+    # the same update seen from REST does not replace the stream record
+    same = order(1, 'FILLED', 300)
+    cache._apply_order(same, cache._rest_time(same), rest=True)
+    assert cache.get_order(1)['status'] == 'FILLED'
+    assert cache.get_order(1)['clientOrderId'] == 'c1'
+    cache.close()
+
+
+def test_rest_balance_older_than_stream_is_ignored(monkeypatch):
+    cache, client, conn = make_cache(monkeypatch)
+    conn.push({'e': 'outboundAccountPosition', 'E': 3001, 'u': 3000,
+               'B': [{'a': 'BTC', 'f': '0.5', 'l': '0.1'}]})
+    client.account_time = 2500
+    cache.reconcile()
+    assert cache.get_account()['balances'] == [{'asset': 'BTC', 'free': '0.5', 'locked': '0.1'}]
+    cache.close()
+
+
+def test_concurrent_rest_and_stream_keep_latest(monkeypatch):
+    cache, client, conn = make_cache(monkeypatch)
+    stop = time.time() + 0.3
+
+    def rest():
+        while time.time() < stop:
+            stale = order(1, 'NEW', 250)
+            cache._apply_order(stale, cache._rest_time(stale), rest=True)
+
+    thread = threading.Thread(target=rest)
+    thread.start()
+    conn.push(execution_report(1, 'FILLED', 300))
+    thread.join()
+    assert cache.get_order(1)['status'] == 'FILLED'
+    cache.close()
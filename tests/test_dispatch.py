@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from ..apis.binance.websockets import BinanceSocketManager
+from ..apis.dispatch import Dispatcher, DROP_OLDEST, KEEP_ALL
+
+
+def test_on_handled_runs_after_the_callback_in_the_worker():
+    dispatcher = Dispatcher(name='test dispatch')
+    handled = threading.Event()
+    seen = {}
+
+    def callback(item):
+        time.sleep(0.05)
+
+    def on_handled(item, received):
+        # 收到到处理完毕的延迟包含回调本身的耗时
+        seen['lag'] = time.time() - received
+        seen['thread'] = threading.current_thread().name
+        handled.set()
+
+    queue = dispatcher.queue('test', callback, on_handled=on_handled)
+    queue.put('x', received=time.time())
+    assert handled.wait(2)
+    assert seen['lag'] >= 0.05
+    assert seen['thread'].startswith('test dispatch')
+    dispatcher.stop()
+
+
+def test_keep_all_never_drops():
+    dispatcher = Dispatcher(name='test dispatch')
+    release, done = threading.Event(), threading.Event()
+    got = []
+    total = 3000
+
+    def callback(item):
+        release.wait(2)
+        got.append(item)
+        if len(got) == total:
+            done.set()
+
+    keep = dispatcher.queue('user data', callback, KEEP_ALL)
+    drop = dispatcher.queue('trades', lambda item: None, DROP_OLDEST, maxlen=10)
+    for i in range(total):
+        keep.put(i)
+        drop.put(i)
+    release.set()
+    assert done.wait(5)
+    assert got == list(range(total)) and keep.dropped == 0
+    assert drop.dropped > 0
+    dispatcher.stop()
+
+
+def test_user_data_stream_keeps_every_event():
+    assert BinanceSocketManager.dispatch_policy('k' * 60) == KEEP_ALL
+    assert BinanceSocketManager.dispatch_policy('ethbtc@trade') == DROP_OLDEST
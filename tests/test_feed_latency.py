@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from ..apis.feed_latency import FeedLatency
+from ..apis.gate.websockets import GateSocketManager
+from ..apis.timesync import TimeSync
+from .fakes import FakeEngine
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_latency_starts_time_sync_and_removes_clock_offset():
+    # 服务器时钟比本机快 5 秒，没有 api key 的客户端也要扣除这一偏差
+    sync = TimeSync(lambda: time.time() * 1000 + 5000, name='latency')
+    assert not sync.running
+    latency = FeedLatency('Test', sync)
+    assert wait_for(lambda: sync.samples > 0)
+    latency.on_receive('ethbtc@trade', time.time() * 1000 + 5000 - 20)
+    assert 0 <= latency.streams()[0].lag < 100
+    sync.stop()
+
+
+def gate_trade(trade_id, at):
+    return {'id': trade_id, 'time': at, 'price': '1.0', 'amount': '2.0', 'type': 'buy'}
+
+
+def test_gate_trade_stream_reports_exchange_lag():
+    engine = FakeEngine()
+    gm = GateSocketManager(engine=engine, dispatcher=False)
+    got = []
+    gm.start_trade_socket('eth_btc', got.append)
+    conn = engine.connections[0]
+    conn.open()
+    now = time.time()
+    # 订阅后先推送历史成交，不计算延迟
+    conn.push({'method': 'trades.update', 'params': ['ETH_BTC', [gate_trade(1, now - 3600)]]})
+    assert gm.latency.streams()[0].lag is None
+    conn.push({'method': 'trades.update', 'params': ['ETH_BTC', [gate_trade(3, now - 0.05),
+                                                                 gate_trade(2, now - 0.1)]]})
+    lag = gm.latency.streams()[0].lag
+    assert 40 <= lag < 1000
+    assert [t['id'] for t in got] == [1, 2, 3]
+    handled = gm.latency.snapshot()['eth_btc@trade']['receive_to_callback']
+    # 每笔成交单独回调，各记录一次
+    assert handled['count'] == 3
+    gm.close()
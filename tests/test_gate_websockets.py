@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from ..apis.gate.websockets import GateSocketManager
+from .fakes import FakeEngine
+
+
+def depth(clean, bids=(), asks=()):
+    return {'method': 'depth.update',
+            'params': [clean, {'bids': [list(b) for b in bids], 'asks': [list(a) for a in asks]},
+                       'ETH_BTC'],
+            'id': None}
+
+
+def test_depth_book_keeps_only_the_subscribed_levels():
+    engine = FakeEngine()
+    gm = GateSocketManager(engine=engine, dispatcher=False)
+    got = []
+    gm.start_depth_socket('eth_btc', got.append, limit=2)
+    conn = engine.connections[0]
+    conn.open()
+    conn.push(depth(True, bids=[('3', '1'), ('2', '1'), ('1', '1')],
+                    asks=[('5', '1'), ('6', '1'), ('7', '1')]))
+    assert got[-1]['bids'] == [(3.0, 1.0), (2.0, 1.0)]
+    assert got[-1]['asks'] == [(5.0, 1.0), (6.0, 1.0)]
+
+    # a better bid pushes 2 out of the window, Gate sends nothing more about it
+    conn.push(depth(False, bids=[('4', '1')]))
+    assert got[-1]['bids'] == [(4.0, 1.0), (3.0, 1.0)]
+    # the level outside the window is gone, not shown with a stale amount
+    conn.push(depth(False, bids=[('4', '0')], asks=[('5', '0'), ('8', '1')]))
+    assert got[-1]['bids'] == [(3.0, 1.0)]
+    assert got[-1]['asks'] == [(6.0, 1.0), (8.0, 1.0)]
+
+    # a new snapshot replaces the book
+    conn.push(depth(True, bids=[('2.5', '2')], asks=[('5.5', '2')]))
+    assert got[-1]['bids'] == [(2.5, 2.0)]
+    assert got[-1]['asks'] == [(5.5, 2.0)]
+    gm.close()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from ..apis.huobi import depthcache
+from ..apis.huobi.depthcache import DepthCacheManager
+
+
+class FakeManager:
+    """HuobiSocketManager 替身，记录发出的快照请求"""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.requests = []
+
+    def subscribe(self, topics, callback):
+        for topic in topics:
+            self.callbacks[topic] = callback
+
+    def request(self, topic):
+        self.requests.append(topic)
+        return True
+
+    def stop_socket(self, topic):
+        self.callbacks.pop(topic, None)
+
+
+def tick(seq, prev, bids=(), asks=()):
+    return {'ch': 'market.ethusdt.mbp.150',
+            'tick': {'seqNum': seq, 'prevSeqNum': prev, 'bids': list(bids), 'asks': list(asks)}}
+
+
+def test_rest_fallback_runs_off_the_dispatcher_and_drops_older_ticks(monkeypatch):
+    release = threading.Event()
+
+    def get_depth(symbol, type_):
+        release.wait(2)
+        return {'status': 'ok', 'tick': {'bids': [[100, 1]], 'asks': [[101, 1]]}}
+
+    monkeypatch.setattr(depthcache.HuobiAPI, 'get_depth', staticmethod(get_depth))
+    manager = FakeManager()
+    dcm = DepthCacheManager('ethusdt', manager=manager, refresh_interval=0, snapshot_timeout=0)
+    assert len(manager.requests) == 1
+    time.sleep(0.01)
+
+    # 缓存的增量早于 REST 快照，快照中 99 已被删除
+    start = time.time()
+    dcm._on_message(tick(1, 0, bids=[[99, 5]]))
+    dcm._on_message(tick(2, 1, asks=[[102, 1]]))
+    assert time.time() - start < 0.05
+    assert not dcm.wait(0)
+
+    release.set()
+    assert dcm.wait(2)
+    book = dcm.get_depth_cache()
+    assert book.get_bids() == [[100.0, 1.0]]
+    assert book.get_asks() == [[101.0, 1.0], [102.0, 1.0]]
+    # REST 快照建立后立即请求对齐的快照
+    assert not dcm.synced and len(manager.requests) == 2
+
+    dcm._on_message({'rep': 'market.ethusdt.mbp.150',
+                     'data': {'seqNum': 2, 'bids': [[100, 1]], 'asks': [[101, 1], [102, 1]]}})
+    dcm._on_message(tick(3, 2, bids=[[100.5, 1]]))
+    assert dcm.synced
+    assert book.get_best_bid() == [100.5, 1.0]
+    dcm.close()
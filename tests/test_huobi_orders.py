@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from ..huobi_client import HuobiClient, CANCEL_SUBMITTED
+
+
+class FakeHuobiAPI(object):
+
+    def __init__(self):
+        self.next_id = 1000
+
+    def orders(self, **kwargs):
+        self.next_id += 1
+        # 下单接口返回字符串 id
+        return {'status': 'ok', 'data': str(self.next_id)}
+
+    def cancel_order(self, order_id):
+        return {'status': 'ok', 'data': str(order_id)}
+
+    def batch_cancel_order(self, order_ids):
+        return {'status': 'ok', 'data': {'success': list(order_ids), 'failed': []}}
+
+    def order_info(self, order_id):
+        return {'status': 'ok', 'data': {'id': int(order_id), 'symbol': 'ethusdt', 'price': '1.0',
+                                         'amount': '1.0', 'field-amount': '0.0',
+                                         'state': 'canceled', 'type': 'buy-limit'}}
+
+
+def make_client(max_terminal=50):
+    client = HuobiClient(max_terminal_orders=max_terminal)
+    client.client = FakeHuobiAPI()
+    client.spot_acc_id = 1
+    client._check_transform = lambda symbol: symbol
+    return client
+
+
+def test_cancel_and_replace_keeps_orders_bounded():
+    client = make_client()
+    for i in range(500):
+        order_id = client.buy('ethusdt', 1.0, 1.0)
+        assert client.cancel_order(order_id)['submitted']
+        assert client.orders.get(order_id)['state'] == CANCEL_SUBMITTED
+    assert len(client.orders) <= 50
+    assert client.orders.open_ids() == []
+    ids = client.order_ids
+    assert ids['buy'] == [] and len(ids['cancel']) <= 50
+
+
+def test_batch_cancel_keeps_orders_bounded():
+    client = make_client()
+    for i in range(20):
+        for _ in range(10):
+            client.sell('ethusdt', 1.0, 1.0)
+        client.cancel_orders('all')
+    assert len(client.orders) <= 50
+    assert client.orders.open_ids() == []
+
+
+def test_order_info_after_cancel_uses_exchange_state():
+    client = make_client()
+    order_id = client.buy('ethusdt', 1.0, 1.0)
+    client.cancel_order(order_id)
+    # order_info 返回整数 id，与下单返回的字符串 id 是同一订单
+    client.get_order(order_id)
+    assert len(client.orders) == 1
+    assert client.orders.get(order_id)['state'] == 'canceled'
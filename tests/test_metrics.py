@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+
+from ..apis.metrics import Registry
+
+
+def test_concurrent_updates_are_not_lost():
+    registry = Registry()
+    threads, rounds = 8, 5000
+    key = ('Binance', 'ethbtc@trade')
+
+    def work():
+        # 每个线程各自取 family，同名只创建一次
+        counter = registry.counter('messages', ('exchange', 'stream'))
+        histogram = registry.histogram('latency', ('exchange', 'stream'))
+        for i in range(rounds):
+            counter.inc(key)
+            histogram.observe(key, i % 100)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert registry.get('messages').get(key) == threads * rounds
+    (_, h), = registry.get('latency').items()
+    assert h.count == sum(h.counts) == threads * rounds
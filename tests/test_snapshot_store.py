@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+
+from .. import snapshot_store
+from ..snapshot_store import SnapshotStore, TICKER
+
+
+def test_concurrent_writers_publish_seq_monotonically():
+    store = SnapshotStore()
+    writers, updates = 4, 5000
+    total = writers * updates
+    seen = []
+    backwards = []
+    stop = threading.Event()
+
+    def write(n):
+        for i in range(updates):
+            store.update('Test', 'pair_%d' % n, TICKER, i)
+
+    def watch():
+        # 每次等到的序号都必须大于上一次，且最终能等到最后一次更新
+        seq = 0
+        while seq < total and not stop.is_set():
+            result = store.wait_for_update(seq, timeout=2)
+            if result is None:
+                break
+            seen.append(result)
+            seq = result
+
+    def sample():
+        last = 0
+        while not stop.is_set():
+            seq = store.seq
+            if seq < last:
+                backwards.append((last, seq))
+            last = seq
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    watcher.join(5)
+    stop.set()
+    sampler.join()
+    assert backwards == []
+    assert store.seq == total
+    assert seen and seen[-1] == total
+    assert all(a < b for a, b in zip(seen, seen[1:]))
+    for n in range(writers):
+        assert store.value('Test', 'pair_%d' % n) == updates - 1
+
+
+def test_slow_writer_does_not_roll_seq_back(monkeypatch):
+    # 写入方 A 取到序号后被挂起，B 在此期间写入；A 不能用较小的序号覆盖 B 发布的序号
+    store = SnapshotStore()
+    a_inside, b_done = threading.Event(), threading.Event()
+    real_time = snapshot_store.time.time
+
+    class SlowTime:
+        @staticmethod
+        def time():
+            if threading.current_thread().name == 'writer a' and not a_inside.is_set():
+                a_inside.set()
+                b_done.wait(0.5)
+            return real_time()
+
+    monkeypatch.setattr(snapshot_store, 'time', SlowTime)
+    a = threading.Thread(target=store.update, args=('Test', 'a', TICKER, 1), name='writer a')
+    b = threading.Thread(target=store.update, args=('Test', 'b', TICKER, 1), name='writer b')
+    a.start()
+    assert a_inside.wait(2)
+    b.start()
+    b.join(1)
+    b_done.set()
+    a.join(2)
+    b.join(2)
+    assert store.seq == 2
+    assert store.wait_for_update(1, timeout=0.1) == 2
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import requests
+
+from ..apis.bigone import API as bigone_api
+from ..apis.binance.API import BinanceAPI
+from ..apis.gate.API import GateAPI
+from ..apis.huobi import API as huobi_api, hb_util
+from ..benchmarks.standins import StandInHTTPServer, all_routes, point_clients_at
+
+
+def test_point_clients_at_keeps_base_url_form(monkeypatch):
+    # point_clients_at 直接改模块属性，先交给 monkeypatch 记录原值，测试后恢复
+    monkeypatch.setattr(BinanceAPI, 'API_URL', BinanceAPI.API_URL)
+    monkeypatch.setattr(hb_util, 'MARKET_URL', hb_util.MARKET_URL)
+    monkeypatch.setattr(hb_util, 'TRADE_URL', hb_util.TRADE_URL)
+    monkeypatch.setattr(huobi_api, 'MARKET_URL', huobi_api.MARKET_URL)
+    monkeypatch.setattr(GateAPI, 'URL', GateAPI.URL)
+    monkeypatch.setattr(bigone_api, 'BASE_URL', bigone_api.BASE_URL)
+    assert bigone_api.BASE_URL.endswith('/')
+
+    with StandInHTTPServer() as server:
+        point_clients_at(server.url)
+        assert bigone_api.BASE_URL == server.url + '/'
+        assert requests.get(BinanceAPI.API_URL + '/v1/ping', timeout=5).json() == {}
+
+
+def test_every_route_is_served():
+    with StandInHTTPServer() as server:
+        for path in all_routes():
+            assert requests.get(server.url + path, timeout=5).status_code == 200, path
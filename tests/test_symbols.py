@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+from ..symbols import SymbolRegistry
+
+
+def test_registry_lists_are_read_only():
+    registry = SymbolRegistry('Binance')
+    registry.add('eth', 'btc', 'ETHBTC')
+    registry.add('bnb', 'btc', 'BNBBTC')
+    registry.freeze()
+    assert registry.symbols == ('eth_btc', 'bnb_btc')
+    assert registry.currencies == ('bnb', 'btc', 'eth')
+    assert isinstance(registry.symbols, tuple) and isinstance(registry.currencies, tuple)
+
+
+def test_misses_are_cached_and_bounded():
+    registry = SymbolRegistry('Binance')
+    registry.MAX_MISSES = 3
+    registry.add('eth', 'btc', 'ETHBTC')
+    registry.freeze()
+    assert registry.is_supported('ETHBTC')
+    assert not registry.is_supported('XRPBTC')
+    assert 'XRPBTC' in registry._misses
+    for symbol in ('A', 'B', 'C', 'D'):
+        registry.is_supported(symbol)
+    assert len(registry._misses) <= registry.MAX_MISSES
+
+    # 之后登记的交易对不受缓存影响
+    registry.add('xrp', 'btc', 'XRPBTC')
+    registry.freeze()
+    assert registry.is_supported('XRPBTC')
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from ..apis.timesync import TimeSync
+
+
+def sync_threads(name):
+    return [t for t in threading.enumerate() if t.name == 'TimeSync-' + name and t.is_alive()]
+
+
+def test_stop_then_start_leaves_one_thread():
+    sync = TimeSync(lambda: time.time() * 1000, interval=0.01, name='restart')
+    for _ in range(20):
+        sync.start()
+        sync.stop()
+        sync.start()
+    time.sleep(0.05)
+    assert len(sync_threads('restart')) == 1
+    sync.stop()
+    assert sync_threads('restart') == []
+
+
+def test_concurrent_start_creates_one_thread():
+    sync = TimeSync(lambda: time.time() * 1000, interval=0.01, name='concurrent')
+    threads = [threading.Thread(target=sync.start) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(sync_threads('concurrent')) == 1
+    assert sync.samples >= 1
+    sync.stop()
+
+
+def test_offset_follows_server_clock():
+    sync = TimeSync(lambda: time.time() * 1000 + 5000, name='offset')
+    sync.sample()
+    assert abs(sync.offset - 5000) < 50
+    assert abs(sync.now_ms() - (time.time() * 1000 + 5000)) < 50
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+import websockets
+
+from ..apis.wsengine import WebSocketEngine
+
+
+def test_send_waits_while_peer_does_not_read():
+    engine = WebSocketEngine(name='test engine').start()
+
+    async def handler(ws):
+        # 从不读取，服务器的接收队列满后停止从 socket 读取
+        await asyncio.Future()
+
+    async def serve():
+        return await websockets.serve(handler, '127.0.0.1', 0, max_queue=1)
+
+    server = asyncio.run_coroutine_threadsafe(serve(), engine.loop).result(5)
+    port = list(server.sockets)[0].getsockname()[1]
+    opened = threading.Event()
+    conn = engine.connect('ws://127.0.0.1:%d' % port, lambda message: None,
+                          on_open=lambda c: opened.set(), write_limit=2 ** 16)
+    assert conn.options['write_limit'] == 2 ** 16
+    assert opened.wait(5)
+    try:
+        # 随机数据不能被压缩，内核缓冲区写满后写缓冲区超过 write_limit
+        payload = os.urandom(2 ** 16)
+        blocked = None
+        for _ in range(2 ** 12):
+            future = conn.send(payload)
+            try:
+                future.result(0.5)
+            except concurrent.futures.TimeoutError:
+                blocked = future
+                break
+        assert blocked is not None and not blocked.done()
+    finally:
+        server.close()
+        engine.stop(timeout=1)
@@ -0,0 +1,148 @@
+# -*- coding:utf-8 -*-
+"""
+向量化回测
+==============================================================
+只依赖K线数据的策略不需要逐笔回调 buy/sell，直接用数组运算计算
+成交、手续费、净值曲线和回撤，适合大批量参数扫描。
+
+仓位约定：
+    position[i] 为第 i 根K线收盘后希望持有的仓位（占净值比例，0~1），
+    在第 i+1 根K线开盘价成交，避免使用未来数据。
+"""
+
+import functools
+
+import numpy as np
+
+from .sweep import SweepRunner
+
+
+class VectorBackTest:
+    """基于列式 OHLCV 数组的向量化回测"""
+
+    def __init__(self, open_, high, low, close, volume=None, fee=0.002,
+                 init_balance=1.0):
+        """
+        :param open_: 开盘价数组
+        :param high: 最高价数组
+        :param low: 最低价数组
+        :param close: 收盘价数组
+        :param volume: 成交量数组，可选
+        :param fee: 手续费率，按成交额计算，默认 0.002
+        :param init_balance: 初始净值（计价币种）
+        """
+        self.open = np.asarray(open_, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        if volume is None:
+            volume = np.zeros_like(self.close)
+        self.volume = np.asarray(volume, dtype=np.float64)
+        self.fee = fee
+        self.init_balance = init_balance
+
+        size = len(self.close)
+        for name in ('open', 'high', 'low', 'volume'):
+            if len(getattr(self, name)) != size:
+                raise ValueError('%s 与 close 长度不一致' % name)
+
+    @classmethod
+    def from_klines(cls, klines, **kwargs):
+        """由 get_kline 返回的 klines 列表构造
+
+        :param klines: [{"time":..., "open":..., "high":..., "low":..., "close":..., "volume":...}, ...]
+        """
+        columns = {}
+        for key in ('open', 'high', 'low', 'close', 'volume'):
+            columns[key] = np.fromiter((float(k[key]) for k in klines),
+                                       dtype=np.float64, count=len(klines))
+        return cls(columns['open'], columns['high'], columns['low'],
+                   columns['close'], columns['volume'], **kwargs)
+
+    def run(self, position):
+        """按目标仓位数组回测
+
+        :param position: 目标仓位数组，与K线等长，取值 0~1
+        :return:
+            {
+            "equity": 每根K线收盘时的净值,
+            "drawdown": 每根K线收盘时的回撤（比例）,
+            "fills": 成交价数组，未成交为 nan,
+            "fees": 每根K线支付的手续费,
+            "final_equity": 最终净值,
+            "total_return": 总收益率,
+            "max_drawdown": 最大回撤,
+            "turnover": 累计换手（占净值比例）,
+            "total_fee": 累计手续费,
+            "trades": 成交次数
+            }
+        """
+        position = np.clip(np.asarray(position, dtype=np.float64), 0.0, 1.0)
+        if len(position) != len(self.close):
+            raise ValueError('position 与K线长度不一致')
+
+        # held[i]: 第 i 根K线开盘成交后持有的仓位
+        held = np.empty_like(position)
+        held[0] = 0.0
+        held[1:] = position[:-1]
+        prev_held = np.empty_like(held)
+        prev_held[0] = 0.0
+        prev_held[1:] = held[:-1]
+
+        prev_close = np.empty_like(self.close)
+        prev_close[0] = self.open[0]
+        prev_close[1:] = self.close[:-1]
+
+        gap = prev_held * (self.open / prev_close - 1.0)
+        turn = np.abs(held - prev_held)
+        bar = held * (self.close / self.open - 1.0)
+
+        open_equity = self.init_balance * np.cumprod(
+            (1.0 + gap) * np.concatenate(([1.0], ((1.0 - self.fee * turn) * (1.0 + bar))[:-1])))
+        fees = open_equity * self.fee * turn
+        equity = (open_equity - fees) * (1.0 + bar)
+
+        peak = np.maximum.accumulate(equity)
+        drawdown = 1.0 - equity / peak
+
+        traded = turn > 0
+        fills = np.where(traded, self.open, np.nan)
+
+        return {
+            "equity": equity,
+            "drawdown": drawdown,
+            "fills": fills,
+            "fees": fees,
+            "final_equity": float(equity[-1]),
+            "total_return": float(equity[-1] / self.init_balance - 1.0),
+            "max_drawdown": float(drawdown.max()),
+            "turnover": float(turn.sum()),
+            "total_fee": float(fees.sum()),
+            "trades": int(traded.sum()),
+        }
+
+    def sweep(self, strategy, param_grid, processes=None, chunksize=None):
+        """在进程池中扫描参数组合，K线数组通过内存映射共享给子进程
+
+        :param strategy: 模块级函数 strategy(bt, **params) -> position 数组（需可 pickle）
+        :param param_grid: {参数名: 取值列表}，或参数字典列表
+        :param processes: 进程数，默认 CPU 核数
+        :param chunksize: 每次派发给子进程的任务数，默认自动计算
+        :return: [(params, 统计指标), ...]，顺序与 param_grid 展开顺序一致
+        """
+        columns = {'open': self.open, 'high': self.high, 'low': self.low,
+                   'close': self.close, 'volume': self.volume}
+        task = functools.partial(_sweep_task, strategy, self.fee, self.init_balance)
+        with SweepRunner(columns, processes=processes) as runner:
+            return runner.map(task, param_grid, chunksize=chunksize)
+
+
+_SUMMARY_KEYS = ('final_equity', 'total_return', 'max_drawdown',
+                 'turnover', 'total_fee', 'trades')
+
+
+def _sweep_task(strategy, fee, init_balance, data, params):
+    bt = VectorBackTest(data['open'], data['high'], data['low'], data['close'],
+                        data['volume'], fee=fee, init_balance=init_balance)
+    result = bt.run(strategy(bt, **params))
+    return {k: result[k] for k in _SUMMARY_KEYS}